@@ -0,0 +1,301 @@
+"""Offline end-to-end benchmarks for the text-to-SQL pipeline.
+
+The sample sales database from ``tests/create_complex_db.py`` is generated at
+the requested scale and every pipeline stage is timed separately. SQL comes
+from :class:`ReplayGenerator`, which replays canned queries, so no model is
+loaded and timings are reproducible. Results are written as JSON::
+
+    python -m benchmarks.run_benchmarks --scale 1000 --extra-tables 200 \\
+        --repeats 5 --output bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from tests.create_complex_db import create_complex_db
+from text2sql_agent.agent import agent_loop
+from text2sql_agent.answers import answer_from_results
+from text2sql_agent.database import DatabaseContext, load_database
+from text2sql_agent.execution import execute_sql
+from text2sql_agent.parsing import clear_parse_cache
+from text2sql_agent.prompts import build_prompt
+from text2sql_agent.retrieval import SchemaIndex
+from text2sql_agent.schema import TableSchema, extract_schema
+from text2sql_agent.validation import validate_sql
+
+FORMAT_VERSION = 1
+STAGES = (
+    "load_database",
+    "extract_schema",
+    "build_prompt",
+    "validate_sql",
+    "execute_sql",
+    "answer_from_results",
+    "agent_loop",
+)
+
+# Questions about the sales tables and the SQL a model should answer with.
+CANNED_QUERIES: Tuple[Tuple[str, str], ...] = (
+    ("How many customers are there?", "SELECT COUNT(*) AS customers FROM customers"),
+    (
+        "List the names of products in the 'Electronics' category.",
+        "SELECT name FROM products WHERE category = 'Electronics' ORDER BY name",
+    ),
+    (
+        "What is the total revenue per country?",
+        "SELECT c.country, SUM(oi.quantity * oi.unit_price) AS revenue "
+        "FROM customers c JOIN orders o ON o.customer_id = c.customer_id "
+        "JOIN order_items oi ON oi.order_id = o.order_id "
+        "GROUP BY c.country ORDER BY revenue DESC",
+    ),
+    (
+        "How many orders are in each status?",
+        "SELECT status, COUNT(*) AS orders FROM orders GROUP BY status ORDER BY status",
+    ),
+    (
+        "Who are the top 5 customers by spend?",
+        "SELECT c.name, SUM(oi.quantity * oi.unit_price) AS spend "
+        "FROM customers c JOIN orders o USING (customer_id) "
+        "JOIN order_items oi USING (order_id) "
+        "GROUP BY c.name ORDER BY spend DESC LIMIT 5",
+    ),
+    (
+        "Which order items belong to cancelled orders?",
+        "SELECT oi.* FROM order_items oi JOIN orders o ON o.order_id = oi.order_id "
+        "WHERE o.status = 'Cancelled'",
+    ),
+)
+
+
+class ReplayGenerator:
+    """A deterministic generator returning canned SQL for known questions.
+
+    The question is read back from the ``Question:`` line of the prompt.
+    Unknown questions raise ``KeyError`` so a benchmark never silently
+    measures an error path.
+    """
+
+    def __init__(self, queries: Mapping[str, str]):
+        self.queries = dict(queries)
+        self.calls = 0
+
+    def __call__(self, prompt: str) -> str:
+        self.calls += 1
+        for line in reversed(prompt.splitlines()):
+            if line.startswith("Question:"):
+                return self.queries[line[len("Question:"):].strip()]
+        raise KeyError("Prompt does not contain a question")
+
+
+def _percentile(values: Sequence[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """Return count, mean and percentile statistics of ``samples`` in seconds."""
+
+    return {
+        "count": len(samples),
+        "total": sum(samples),
+        "mean": statistics.fmean(samples),
+        "min": min(samples),
+        "p50": statistics.median(samples),
+        "p95": _percentile(samples, 0.95),
+        "max": max(samples),
+    }
+
+
+def _timed(samples: List[float], func: Callable[[], object]) -> object:
+    start = time.perf_counter()
+    result = func()
+    samples.append(time.perf_counter() - start)
+    return result
+
+
+def _version(package: str) -> Optional[str]:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _environment() -> Dict[str, object]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": {
+            name: _version(name)
+            for name in ("text2sql-agent", "duckdb", "sqlglot", "pandas", "pyarrow")
+        },
+    }
+
+
+def _dataset_name(scale: int, extra_tables: int, seed: int) -> str:
+    return f"sales_s{scale}_t{extra_tables}_seed{seed}.db"
+
+
+def prepare_dataset(
+    data_dir: Path, scale: int, extra_tables: int, seed: int, rebuild: bool = False
+) -> Path:
+    """Generate (or reuse) the SQLite database for the given parameters."""
+
+    path = data_dir / _dataset_name(scale, extra_tables, seed)
+    if rebuild or not path.exists():
+        tmp_path = path.with_suffix(".tmp")
+        # Progress messages go to stderr so JSON on stdout stays parseable.
+        with contextlib.redirect_stdout(sys.stderr):
+            create_complex_db(
+                str(tmp_path),
+                scale=scale,
+                extra_tables=extra_tables,
+                seed=seed,
+                overwrite=True,
+            )
+        tmp_path.replace(path)
+    return path
+
+
+def _row_counts(context: DatabaseContext) -> Dict[str, int]:
+    return {
+        table.name: context.connection.execute(
+            f"SELECT COUNT(*) FROM {table.fqn}"
+        ).fetchone()[0]
+        for table in context.tables
+    }
+
+
+def run_benchmarks(
+    scale: int = 1,
+    extra_tables: int = 0,
+    repeats: int = 3,
+    seed: int = 0,
+    data_dir: Path = Path("benchmarks/data"),
+    rebuild: bool = False,
+    use_index: bool = False,
+    queries: Sequence[Tuple[str, str]] = CANNED_QUERIES,
+) -> Dict[str, object]:
+    """Time every pipeline stage ``repeats`` times and return a JSON-ready report.
+
+    Stages run cold: the schema, parse and result caches are bypassed so the
+    numbers reflect the work itself rather than cache hits.
+    """
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    reused = not rebuild and (data_dir / _dataset_name(scale, extra_tables, seed)).exists()
+    generate_start = time.perf_counter()
+    db_path = prepare_dataset(data_dir, scale, extra_tables, seed, rebuild)
+    generate_seconds = time.perf_counter() - generate_start
+
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    generator = ReplayGenerator(dict(queries))
+    failures: List[Dict[str, str]] = []
+    context: Optional[DatabaseContext] = None
+    schema: Dict[str, TableSchema] = {}
+
+    for _ in range(repeats):
+        if context is not None:
+            context.connection.close()
+        context = _timed(samples["load_database"], lambda: load_database(db_path))
+        schema = _timed(
+            samples["extract_schema"], lambda: extract_schema(context, use_cache=False)
+        )
+        index = SchemaIndex.build(schema) if use_index else None
+        for question, sql in queries:
+            _timed(samples["build_prompt"], lambda: build_prompt(question, schema, index=index))
+            clear_parse_cache()
+            valid, error = _timed(samples["validate_sql"], lambda: validate_sql(sql, schema))
+            if not valid:
+                failures.append({"question": question, "stage": "validate_sql", "error": error})
+                continue
+            results = _timed(
+                samples["execute_sql"], lambda: execute_sql(context.connection, sql)
+            )
+            _timed(samples["answer_from_results"], lambda: answer_from_results(sql, results))
+            clear_parse_cache()
+            response = _timed(
+                samples["agent_loop"],
+                lambda: agent_loop(question, schema, context, generator, schema_index=index),
+            )
+            if response.error_messages:
+                failures.append(
+                    {
+                        "question": question,
+                        "stage": "agent_loop",
+                        "error": response.error_messages[-1],
+                    }
+                )
+
+    assert context is not None
+    row_counts = _row_counts(context)
+    context.connection.close()
+    return {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": _environment(),
+        "parameters": {
+            "scale": scale,
+            "extra_tables": extra_tables,
+            "repeats": repeats,
+            "seed": seed,
+            "use_index": use_index,
+            "queries": len(queries),
+        },
+        "dataset": {
+            "path": str(db_path),
+            "file_bytes": db_path.stat().st_size,
+            "tables": len(row_counts),
+            "rows": sum(row_counts.values()),
+            "reused": reused,
+            "generate_seconds": generate_seconds,
+        },
+        "stages": {stage: summarize(values) for stage, values in samples.items() if values},
+        "failures": failures,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the text-to-SQL pipeline offline")
+    parser.add_argument("--scale", type=int, default=1, help="Row count multiplier (1 = 100 orders)")
+    parser.add_argument("--extra-tables", type=int, default=0, help="Filler tables to add")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=Path("benchmarks/data"))
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate the dataset")
+    parser.add_argument(
+        "--index", action="store_true", help="Select tables with a SchemaIndex for prompts"
+    )
+    parser.add_argument("--output", type=Path, help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        scale=args.scale,
+        extra_tables=args.extra_tables,
+        repeats=args.repeats,
+        seed=args.seed,
+        data_dir=args.data_dir,
+        rebuild=args.rebuild,
+        use_index=args.index,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+    return 1 if report["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
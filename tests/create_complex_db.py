@@ -1,12 +1,46 @@
+import argparse
 import sqlite3
 import random
 from datetime import datetime, timedelta
 import os
 
-def create_complex_db():
-    db_path = "tests/data/complex_sales.db"
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    
+_BATCH_SIZE = 50_000
+
+
+def _batched(rows, size=_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def create_complex_db(
+    db_path="tests/data/complex_sales.db",
+    scale=1,
+    extra_tables=0,
+    extra_table_rows=100,
+    seed=None,
+    overwrite=False,
+):
+    """Create the sample sales database.
+
+    ``scale`` multiplies the default 50 customers, 20 products and 100 orders,
+    so ``scale=10_000`` yields one million orders. ``extra_tables`` adds
+    unrelated ``metric_<n>`` tables to simulate wide schemas. A ``seed`` makes
+    the data reproducible.
+    """
+
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    if overwrite and os.path.exists(db_path):
+        os.remove(db_path)
+    rng = random.Random(seed)
+    # A fixed reference date keeps seeded datasets identical between runs.
+    today = datetime(2024, 1, 1) if seed is not None else datetime.now()
+
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
@@ -57,64 +91,118 @@ def create_complex_db():
     countries = ['USA', 'UK', 'Canada', 'Germany', 'France']
     categories = ['Electronics', 'Clothing', 'Books', 'Home', 'Toys']
     statuses = ['Pending', 'Shipped', 'Delivered', 'Cancelled']
+    num_customers = 50 * scale
+    num_products = 20 * scale
+    num_orders = 100 * scale
 
     # 1. Customers
-    customers = []
-    for i in range(1, 51):
-        customers.append((
-            i, 
-            f"Customer {i}", 
-            f"customer{i}@example.com", 
-            (datetime.now() - timedelta(days=random.randint(0, 365))).strftime('%Y-%m-%d'),
-            random.choice(countries)
-        ))
-    cursor.executemany("INSERT OR IGNORE INTO customers VALUES (?, ?, ?, ?, ?)", customers)
+    customers = (
+        (
+            i,
+            f"Customer {i}",
+            f"customer{i}@example.com",
+            (today - timedelta(days=rng.randint(0, 365))).strftime('%Y-%m-%d'),
+            rng.choice(countries)
+        )
+        for i in range(1, num_customers + 1)
+    )
+    for batch in _batched(customers):
+        cursor.executemany("INSERT OR IGNORE INTO customers VALUES (?, ?, ?, ?, ?)", batch)
 
     # 2. Products
+    prices = {}
     products = []
-    for i in range(1, 21):
+    for i in range(1, num_products + 1):
+        price = round(rng.uniform(10.0, 500.0), 2)
+        prices[i] = price
         products.append((
             i,
             f"Product {i}",
-            random.choice(categories),
-            round(random.uniform(10.0, 500.0), 2),
-            random.randint(0, 100)
+            rng.choice(categories),
+            price,
+            rng.randint(0, 100)
         ))
-    cursor.executemany("INSERT OR IGNORE INTO products VALUES (?, ?, ?, ?, ?)", products)
+    for batch in _batched(products):
+        cursor.executemany("INSERT OR IGNORE INTO products VALUES (?, ?, ?, ?, ?)", batch)
 
     # 3. Orders & Items
-    orders = []
-    order_items = []
     item_id_counter = 1
-    
-    for i in range(1, 101):
-        order_date = (datetime.now() - timedelta(days=random.randint(0, 60))).strftime('%Y-%m-%d')
-        customer_id = random.randint(1, 50)
-        orders.append((i, customer_id, order_date, random.choice(statuses)))
-        
-        # Items for this order
-        num_items = random.randint(1, 5)
-        for _ in range(num_items):
-            product_id = random.randint(1, 20)
-            product = products[product_id-1]
-            price = product[3]
-            quantity = random.randint(1, 3)
-            
-            order_items.append((
-                item_id_counter,
-                i,
-                product_id,
-                quantity,
-                price
-            ))
-            item_id_counter += 1
 
-    cursor.executemany("INSERT OR IGNORE INTO orders VALUES (?, ?, ?, ?)", orders)
-    cursor.executemany("INSERT OR IGNORE INTO order_items VALUES (?, ?, ?, ?, ?)", order_items)
+    def orders_and_items():
+        nonlocal item_id_counter
+        for i in range(1, num_orders + 1):
+            order_date = (today - timedelta(days=rng.randint(0, 60))).strftime('%Y-%m-%d')
+            customer_id = rng.randint(1, num_customers)
+            items = []
+            # Items for this order
+            num_items = rng.randint(1, 5)
+            for _ in range(num_items):
+                product_id = rng.randint(1, num_products)
+                quantity = rng.randint(1, 3)
+                items.append((
+                    item_id_counter,
+                    i,
+                    product_id,
+                    quantity,
+                    prices[product_id]
+                ))
+                item_id_counter += 1
+            yield (i, customer_id, order_date, rng.choice(statuses)), items
+
+    for batch in _batched(orders_and_items(), size=_BATCH_SIZE // 5):
+        cursor.executemany(
+            "INSERT OR IGNORE INTO orders VALUES (?, ?, ?, ?)", [order for order, _ in batch]
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO order_items VALUES (?, ?, ?, ?, ?)",
+            [item for _, items in batch for item in items],
+        )
+
+    # 4. Unrelated wide-schema filler tables
+    for table in range(1, extra_tables + 1):
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS metric_{table} (
+            metric_{table}_id INTEGER PRIMARY KEY,
+            label TEXT,
+            value REAL,
+            recorded_at DATE
+        )
+        """)
+        rows = [
+            (
+                i,
+                f"Metric {table}.{i}",
+                round(rng.uniform(0.0, 1000.0), 3),
+                (today - timedelta(days=rng.randint(0, 365))).strftime('%Y-%m-%d'),
+            )
+            for i in range(1, extra_table_rows + 1)
+        ]
+        cursor.executemany(f"INSERT OR IGNORE INTO metric_{table} VALUES (?, ?, ?, ?)", rows)
 
     conn.commit()
     conn.close()
     print(f"Created complex database at {db_path}")
+    return db_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the sample sales database")
+    parser.add_argument("--path", default="tests/data/complex_sales.db")
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier for row counts")
+    parser.add_argument("--extra-tables", type=int, default=0, help="Filler tables to add")
+    parser.add_argument("--extra-table-rows", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--overwrite", action="store_true", help="Replace an existing file")
+    args = parser.parse_args(argv)
+    create_complex_db(
+        args.path,
+        scale=args.scale,
+        extra_tables=args.extra_tables,
+        extra_table_rows=args.extra_table_rows,
+        seed=args.seed,
+        overwrite=args.overwrite,
+    )
+
 
 if __name__ == "__main__":
-    create_complex_db()
+    main()
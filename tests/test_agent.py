@@ -1,12 +1,16 @@
 from __future__ import annotations
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pandas as pd
 import pytest
 
-from text2sql_agent.agent import AgentResponse, agent_loop
+from text2sql_agent import agent
+from text2sql_agent.agent import AgentError, AgentResponse, agent_loop
 from text2sql_agent.database import load_database
+from text2sql_agent.execution import QueryLimits, execute_preview
 from text2sql_agent.schema import extract_schema
 
 
@@ -70,3 +74,225 @@ def test_agent_loop_retries_on_error(tmp_path: Path) -> None:
     assert any("failed" in err.lower() for err in response.error_messages)
     assert len(response.rows) == 1
     assert response.rows[0]["avg_amount"] == pytest.approx(116.6666666, rel=1e-6)
+
+
+def test_agent_loop_reports_attempts_when_it_gives_up(tmp_path: Path) -> None:
+    context = load_database(_prepare_orders(tmp_path))
+    schema = extract_schema(context)
+
+    with pytest.raises(AgentError) as raised:
+        agent_loop("Average amount?", schema, context, DummyGenerator(["SELECT FROM orders"]))
+
+    assert raised.value.attempts == 3
+    assert len(raised.value.errors) == 3
+
+
+def _prepare_large(tmp_path: Path, rows: int = 2000) -> Path:
+    df = pd.DataFrame({"id": range(rows), "value": [i % 7 for i in range(rows)]})
+    csv_path = tmp_path / "events.csv"
+    df.to_csv(csv_path, index=False)
+    return csv_path
+
+
+@pytest.mark.parametrize("count", ["stream", "wrap"])
+def test_execute_preview_counts_without_materializing(tmp_path: Path, count: str) -> None:
+    context = load_database(_prepare_large(tmp_path))
+    preview = execute_preview(
+        context.connection, "SELECT * FROM events ORDER BY id;", preview_rows=3, count=count
+    )
+
+    assert preview.total_rows == 2000
+    assert preview.rows["id"].tolist() == [0, 1, 2]
+
+
+def test_agent_loop_returns_preview_and_row_count(tmp_path: Path) -> None:
+    context = load_database(_prepare_large(tmp_path))
+    schema = extract_schema(context)
+    generator = DummyGenerator(["SELECT * FROM events ORDER BY id"])
+
+    response = agent_loop("List all events", schema, context, generator)
+
+    assert response.row_count == 2000
+    assert len(response.rows) == 5
+    assert response.dataframe is None
+    assert "returned 2000 rows" in response.answer
+    assert response.to_dict()["row_count"] == 2000
+
+
+def test_agent_loop_materializes_on_request(tmp_path: Path) -> None:
+    context = load_database(_prepare_large(tmp_path))
+    schema = extract_schema(context)
+    generator = DummyGenerator(["SELECT * FROM events"])
+
+    response = agent_loop("List all events", schema, context, generator, materialize=True)
+
+    assert response.row_count == 2000
+    assert len(response.dataframe) == 2000
+    assert len(response.rows) == 5
+
+
+def test_agent_loop_retries_after_timeout(tmp_path: Path) -> None:
+    context = load_database(_prepare_orders(tmp_path))
+    context.limits = QueryLimits(timeout=0.2, max_cartesian_rows=None)
+    schema = extract_schema(context)
+    generator = DummyGenerator(
+        [
+            "SELECT COUNT(*) FROM orders, range(100000000) AS a, range(100000) AS b",
+            "SELECT COUNT(*) AS total FROM orders",
+        ]
+    )
+
+    response = agent_loop("How many orders?", schema, context, generator)
+
+    assert response.attempts == 2
+    assert "timed out" in response.error_messages[0]
+    assert response.rows == [{"total": 3}]
+
+
+def test_agent_loop_feeds_schema_suggestions_into_retry(tmp_path: Path) -> None:
+    context = load_database(_prepare_orders(tmp_path))
+    schema = extract_schema(context)
+    prompts: list[str] = []
+    outputs = iter(
+        ["SELECT SUM(amout) AS total FROM orders", "SELECT SUM(amount) AS total FROM orders"]
+    )
+
+    def generator(prompt: str) -> str:
+        prompts.append(prompt)
+        return next(outputs)
+
+    response = agent_loop("Total amount?", schema, context, generator)
+
+    assert response.attempts == 2
+    assert "Did you mean: amount?" in response.error_messages[0]
+    assert "Did you mean: amount?" in prompts[1]
+
+
+class CandidateGenerator:
+    def __init__(self, rounds: list[list[str]]):
+        self.rounds = iter(rounds)
+        self.requested: list[int] = []
+
+    def __call__(self, prompt: str) -> str:  # pragma: no cover - candidates is used
+        raise AssertionError("expected a candidates() call")
+
+    def candidates(self, prompt: str, n: int) -> list[str]:
+        self.requested.append(n)
+        return next(self.rounds)
+
+
+def test_agent_loop_runs_candidates_in_parallel(tmp_path: Path) -> None:
+    context = load_database(_prepare_orders(tmp_path))
+    schema = extract_schema(context)
+    generator = CandidateGenerator(
+        [
+            [
+                "SELECT FROM orders",
+                "SELECT COUNT(*) AS total FROM ordrs",
+                "SELECT COUNT(*) AS total FROM orders",
+            ]
+        ]
+    )
+
+    response = agent_loop("How many orders?", schema, context, generator, candidates=3)
+
+    assert generator.requested == [3]
+    assert response.attempts == 1
+    assert response.rows == [{"total": 3}]
+
+
+def test_agent_loop_votes_between_candidates(tmp_path: Path) -> None:
+    context = load_database(_prepare_orders(tmp_path))
+    schema = extract_schema(context)
+    generator = CandidateGenerator(
+        [
+            [
+                "SELECT MAX(amount) AS answer FROM orders",
+                "SELECT SUM(amount) AS answer FROM orders",
+                "SELECT SUM(amount) AS answer FROM orders WHERE amount > 0",
+            ]
+        ]
+    )
+
+    response = agent_loop(
+        "Total amount?", schema, context, generator, candidates=3, selection="vote"
+    )
+
+    assert response.rows == [{"answer": 350.0}]
+    assert response.sql == "SELECT SUM(amount) AS answer FROM orders"
+
+
+def test_agent_loop_candidate_rounds_feed_errors_back(tmp_path: Path) -> None:
+    context = load_database(_prepare_orders(tmp_path))
+    schema = extract_schema(context)
+    generator = CandidateGenerator(
+        [["SELECT amout FROM orders"], ["SELECT amount FROM orders ORDER BY amount"]]
+    )
+
+    response = agent_loop(
+        "Amounts?", schema, context, generator, candidates=2, time_budget=30.0
+    )
+
+    assert response.attempts == 2
+    assert "Did you mean: amount?" in response.error_messages[0]
+    assert response.row_count == 3
+
+
+def test_agent_loop_trace_times_each_stage(tmp_path: Path) -> None:
+    from text2sql_agent.tracing import Trace
+
+    path = _prepare_orders(tmp_path)
+    context = load_database(path)
+    schema = extract_schema(context)
+    generator = DummyGenerator(["SELECT missing FROM orders", "SELECT COUNT(*) FROM orders"])
+    trace = Trace()
+
+    response = agent_loop("How many orders?", schema, context, generator, trace=trace)
+
+    assert response.trace is trace
+    assert trace.duration is not None
+    names = [span.name for span in trace.spans]
+    assert names.count("generation") == 2
+    assert names.count("validation") == 2
+    assert names.count("execution") == 1
+    assert names[-1] == "answer"
+    stages = response.to_dict()["trace"]["stages"]
+    assert sum(stages.values()) <= trace.duration
+
+
+def test_agent_loop_without_trace(tmp_path: Path) -> None:
+    path = _prepare_orders(tmp_path)
+    context = load_database(path)
+    schema = extract_schema(context)
+
+    response = agent_loop(
+        "How many orders?", schema, context, DummyGenerator(["SELECT COUNT(*) FROM orders"])
+    )
+
+    assert response.trace is None
+    assert response.to_dict()["trace"] is None
+
+
+def test_agent_loop_runs_duckdb_work_on_query_executor(tmp_path: Path, monkeypatch) -> None:
+    path = _prepare_orders(tmp_path)
+    context = load_database(path)
+    schema = extract_schema(context)
+    threads = {}
+
+    def generator(prompt: str) -> str:
+        threads["generation"] = threading.current_thread().name
+        return "SELECT COUNT(*) AS n FROM orders"
+
+    try_candidate = agent._try_candidate
+
+    def recording_try_candidate(*args, **kwargs):
+        threads["execution"] = threading.current_thread().name
+        return try_candidate(*args, **kwargs)
+
+    monkeypatch.setattr(agent, "_try_candidate", recording_try_candidate)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="duckdb") as pool:
+        response = agent_loop("How many?", schema, context, generator, query_executor=pool)
+
+    assert response.rows == [{"n": 3}]
+    assert threads["execution"].startswith("duckdb")
+    assert not threads["generation"].startswith("duckdb")
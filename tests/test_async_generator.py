@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("openai")
+
+from text2sql_agent.agent import async_agent_loop
+from text2sql_agent.database import load_database
+from text2sql_agent.generator import AsyncOpenAIGenerator
+from text2sql_agent.schema import extract_schema
+
+
+class StubCompletions(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible chat completions endpoint."""
+
+    responses: list = []
+    requests = 0
+    in_flight = 0
+    max_in_flight = 0
+    delay = 0.0
+    lock = threading.Lock()
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        length = int(self.headers["Content-Length"])
+        json.loads(self.rfile.read(length))
+        cls = type(self)
+        with cls.lock:
+            cls.requests += 1
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            status, content = cls.responses.pop(0) if cls.responses else (200, "SELECT 1")
+        time.sleep(cls.delay)
+        with cls.lock:
+            cls.in_flight -= 1
+
+        if status == 200:
+            body = {
+                "id": "cmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "stub",
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+            }
+        else:
+            body = {"error": {"message": content, "type": "rate_limit"}}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    StubCompletions.responses = []
+    StubCompletions.requests = 0
+    StubCompletions.max_in_flight = 0
+    StubCompletions.delay = 0.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCompletions)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def _generator(base_url: str, **options) -> AsyncOpenAIGenerator:
+    return AsyncOpenAIGenerator(api_key="test", base_url=base_url, **options)
+
+
+def test_retries_rate_limits_with_backoff(stub_server: str) -> None:
+    StubCompletions.responses = [(429, "slow down"), (200, "SELECT 42")]
+
+    async def run() -> str:
+        generator = _generator(stub_server, backoff_base=0.01)
+        try:
+            return await generator("prompt")
+        finally:
+            await generator.aclose()
+
+    assert asyncio.run(run()) == "SELECT 42"
+    assert StubCompletions.requests == 2
+
+
+def test_concurrency_limit_and_deadline(stub_server: str) -> None:
+    StubCompletions.delay = 0.1
+
+    async def run() -> None:
+        generator = _generator(stub_server, max_concurrency=2)
+        try:
+            await asyncio.gather(*(generator(f"p{i}") for i in range(6)))
+        finally:
+            await generator.aclose()
+
+        slow = _generator(stub_server, timeout=0.05, max_retries=0)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await slow("p")
+        finally:
+            await slow.aclose()
+
+    asyncio.run(run())
+    assert StubCompletions.max_in_flight == 2
+
+
+def test_async_agent_loop(stub_server: str, tmp_path: Path) -> None:
+    csv_path = tmp_path / "orders.csv"
+    pd.DataFrame({"order_id": [1, 2]}).to_csv(csv_path, index=False)
+    context = load_database(csv_path)
+    schema = extract_schema(context)
+    StubCompletions.responses = [
+        (200, "SELECT FROM"),
+        (200, "```sql\nSELECT COUNT(*) AS n FROM orders\n```"),
+    ]
+
+    async def run():
+        generator = _generator(stub_server)
+        try:
+            return await async_agent_loop("How many orders?", schema, context, generator)
+        finally:
+            await generator.aclose()
+
+    response = asyncio.run(run())
+    assert response.rows == [{"n": 2}]
+    assert response.attempts == 2
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import io
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from text2sql_agent.batch import completed_ids, read_questions, run_questions
+from text2sql_agent.database import load_database
+from text2sql_agent.schema import extract_schema
+
+ANSWERS = {
+    "How many orders?": "SELECT COUNT(*) AS orders FROM orders",
+    "Total amount?": "SELECT SUM(amount) AS total FROM orders",
+    "Broken?": "SELECT nope FROM orders",
+}
+
+
+def _generator(prompt: str) -> str:
+    question = prompt.rsplit("Question:", 1)[1].split("\n", 1)[0].strip()
+    return ANSWERS[question]
+
+
+@pytest.fixture
+def dataset(tmp_path: Path):
+    csv_path = tmp_path / "orders.csv"
+    pd.DataFrame({"order_id": [1, 2, 3], "amount": [10.0, 20.0, 5.0]}).to_csv(
+        csv_path, index=False
+    )
+    context = load_database(csv_path)
+    return context, extract_schema(context)
+
+
+def test_read_questions_from_jsonl_and_csv(tmp_path: Path) -> None:
+    jsonl = tmp_path / "questions.jsonl"
+    jsonl.write_text(
+        '{"id": "q1", "question": "How many orders?", "expected": 3}\n'
+        "\n"
+        '{"question": "Total amount?"}\n'
+    )
+    csv_path = tmp_path / "questions.csv"
+    csv_path.write_text("question\nHow many orders?\n")
+
+    items = list(read_questions(jsonl))
+    assert [(item.id, item.question) for item in items] == [
+        ("q1", "How many orders?"),
+        ("3", "Total amount?"),
+    ]
+    assert items[0].metadata == {"expected": 3}
+    assert [item.id for item in read_questions(csv_path)] == ["2"]
+
+
+def test_run_questions_streams_results_and_summary(dataset, tmp_path: Path) -> None:
+    context, schema = dataset
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text(
+        "".join(json.dumps({"id": i, "question": q}) + "\n" for i, q in enumerate(ANSWERS))
+    )
+    output = io.StringIO()
+
+    summary = run_questions(
+        read_questions(questions), schema, context, _generator, output, workers=3, max_retries=1
+    )
+
+    results = {r["id"]: r for r in map(json.loads, output.getvalue().splitlines())}
+    assert results["0"]["rows"] == [{"orders": 3}]
+    assert results["1"]["rows"] == [{"total": 35.0}]
+    assert results["2"]["error"]
+    assert summary.total == 3
+    assert summary.succeeded == 2
+    assert summary.failed == 1
+    assert summary.to_dict()["mean_attempts"] == 1.0
+    assert summary.questions_per_second > 0
+
+
+def test_resume_skips_checkpointed_questions(dataset, tmp_path: Path) -> None:
+    context, schema = dataset
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text(
+        '{"id": "a", "question": "How many orders?"}\n'
+        '{"id": "b", "question": "Total amount?"}\n'
+    )
+    results = tmp_path / "results.jsonl"
+    # A finished result followed by a line cut off mid-write.
+    results.write_text('{"id": "a", "error": null}\n{"id": "b", "sq')
+
+    done = completed_ids(results)
+    assert done == {"a"}
+    assert results.read_text() == '{"id": "a", "error": null}\n'
+    with results.open("a") as output:
+        summary = run_questions(
+            read_questions(questions), schema, context, _generator, output, skip_ids=done
+        )
+
+    assert summary.skipped == 1
+    assert summary.total == 1
+    assert completed_ids(results) == {"a", "b"}
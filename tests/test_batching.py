@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from text2sql_agent.batching import MicroBatcher, run_batch
+
+
+class RecordingGenerator:
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt: str) -> str:
+        return self.batch([prompt])[0]
+
+    def batch(self, prompts):
+        with self.lock:
+            self.batches.append(list(prompts))
+        return [f"SELECT '{prompt}'" for prompt in prompts]
+
+
+def test_run_batch_falls_back_to_single_calls() -> None:
+    assert run_batch(lambda prompt: prompt.upper(), ["a", "b"]) == ["A", "B"]
+
+
+def test_micro_batcher_groups_concurrent_requests() -> None:
+    generator = RecordingGenerator()
+    batcher = MicroBatcher(generator, max_batch_size=4, max_wait=0.2)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(batcher, [f"q{i}" for i in range(8)]))
+    finally:
+        batcher.close()
+
+    assert results == [f"SELECT 'q{i}'" for i in range(8)]
+    assert all(len(batch) <= 4 for batch in generator.batches)
+    assert len(generator.batches) < 8
+    assert batcher.stats.requests == 8
+    assert batcher.stats.max_batch_size == max(len(batch) for batch in generator.batches)
+    assert batcher.stats.average_queue_wait >= 0
+
+
+def test_micro_batcher_propagates_errors() -> None:
+    def failing(prompt: str) -> str:
+        raise ValueError("model exploded")
+
+    batcher = MicroBatcher(failing, max_wait=0)
+    try:
+        with pytest.raises(ValueError, match="model exploded"):
+            batcher("question")
+    finally:
+        batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher("question")
+
+
+def test_micro_batcher_runs_candidates_on_its_worker() -> None:
+    class CandidateGenerator(RecordingGenerator):
+        def __init__(self) -> None:
+            super().__init__()
+            self.threads: set[str] = set()
+
+        def candidates(self, prompt: str, n: int):
+            self.threads.add(threading.current_thread().name)
+            return [f"SELECT {i}" for i in range(n)]
+
+    generator = CandidateGenerator()
+    batcher = MicroBatcher(generator, max_wait=0.05)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: batcher.candidates("q", 2), range(4)))
+            plain = batcher("q")
+    finally:
+        batcher.close()
+
+    assert results == [["SELECT 0", "SELECT 1"]] * 4
+    assert plain == "SELECT 'q'"
+    assert generator.threads == {"sql-micro-batcher"}
+    with pytest.raises(RuntimeError):
+        batcher.candidates("q", 2)
@@ -0,0 +1,79 @@
+import json
+import sqlite3
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from benchmarks.run_benchmarks import (
+    CANNED_QUERIES,
+    STAGES,
+    ReplayGenerator,
+    main,
+    summarize,
+)
+from tests.create_complex_db import create_complex_db
+from text2sql_agent.prompts import build_prompt
+
+
+def _sqlite_available() -> bool:
+    try:
+        duckdb.connect().execute("LOAD sqlite")
+    except duckdb.Error:
+        return False
+    return True
+
+
+def _table_counts(path: Path) -> dict:
+    with sqlite3.connect(path) as conn:
+        names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        return {name: conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in names}
+
+
+def test_create_complex_db_scales_and_is_deterministic(tmp_path: Path) -> None:
+    first = create_complex_db(str(tmp_path / "a.db"), scale=3, extra_tables=2, seed=7)
+    second = create_complex_db(str(tmp_path / "b.db"), scale=3, extra_tables=2, seed=7)
+
+    counts = _table_counts(Path(first))
+    assert counts["customers"] == 150
+    assert counts["products"] == 60
+    assert counts["orders"] == 300
+    assert counts["metric_1"] == counts["metric_2"] == 100
+    with sqlite3.connect(first) as a, sqlite3.connect(second) as b:
+        query = "SELECT * FROM order_items ORDER BY item_id"
+        assert a.execute(query).fetchall() == b.execute(query).fetchall()
+
+
+def test_replay_generator_answers_from_the_prompt() -> None:
+    generator = ReplayGenerator(dict(CANNED_QUERIES))
+    question, sql = CANNED_QUERIES[0]
+    prompt = build_prompt(question, {}, error="Question: something else")
+
+    assert generator(prompt) == sql
+    with pytest.raises(KeyError):
+        generator(build_prompt("An unknown question?", {}))
+
+
+def test_summarize_reports_percentiles() -> None:
+    stats = summarize([0.1 * i for i in range(1, 21)])
+
+    assert stats["count"] == 20
+    assert stats["min"] == pytest.approx(0.1)
+    assert stats["p50"] == pytest.approx(1.05)
+    assert stats["p95"] == pytest.approx(1.9)
+    assert stats["max"] == pytest.approx(2.0)
+
+
+@pytest.mark.skipif(not _sqlite_available(), reason="DuckDB sqlite extension not available")
+def test_benchmark_writes_json_report(tmp_path: Path) -> None:
+    output = tmp_path / "bench.json"
+
+    exit_code = main(
+        ["--repeats", "1", "--data-dir", str(tmp_path), "--output", str(output)]
+    )
+
+    report = json.loads(output.read_text())
+    assert exit_code == 0
+    assert set(report["stages"]) == set(STAGES)
+    assert report["dataset"]["tables"] == 4
+    assert report["failures"] == []
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+from text2sql_agent.agent import agent_loop
+from text2sql_agent.caches import (
+    InMemoryQuestionCache,
+    LRUCache,
+    ResultCache,
+    SQLiteQuestionCache,
+    canonicalize_sql,
+    normalize_question,
+)
+from text2sql_agent.cursors import CursorRegistry
+from text2sql_agent.database import load_database
+from text2sql_agent.execution import execute_sql
+from text2sql_agent.schema import extract_schema
+from text2sql_agent.streaming import ResultStream
+
+
+class CountingGenerator:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.calls = 0
+
+    def __call__(self, prompt: str) -> str:
+        self.calls += 1
+        return self.sql
+
+
+def test_lru_cache_evicts_and_expires() -> None:
+    cache: LRUCache[int] = LRUCache(max_entries=2, ttl=0.05)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats.hits == 2
+
+
+def test_lru_cache_respects_byte_budget() -> None:
+    cache: LRUCache[str] = LRUCache(max_entries=None, max_bytes=10, sizeof=len)
+    cache.put("a", "12345")
+    cache.put("b", "123456")
+    cache.put("huge", "x" * 11)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "123456"
+    assert cache.get("huge") is None
+    assert cache.total_bytes == 6
+
+
+def test_normalize_question() -> None:
+    assert normalize_question("  How many   Orders? ") == "how many orders"
+
+
+def test_agent_loop_uses_question_cache(tmp_path: Path) -> None:
+    csv_path = tmp_path / "orders.csv"
+    pd.DataFrame({"order_id": [1, 2, 3]}).to_csv(csv_path, index=False)
+    context = load_database(csv_path)
+    schema = extract_schema(context)
+    cache = InMemoryQuestionCache()
+    generator = CountingGenerator("SELECT COUNT(*) AS total FROM orders")
+
+    first = agent_loop("How many orders?", schema, context, generator, question_cache=cache)
+    second = agent_loop("how many orders", schema, context, generator, question_cache=cache)
+
+    assert not first.cache_hit
+    assert second.cache_hit
+    assert second.rows == [{"total": 3}]
+    assert generator.calls == 1
+
+
+def test_agent_loop_does_not_cache_failures(tmp_path: Path) -> None:
+    csv_path = tmp_path / "orders.csv"
+    pd.DataFrame({"order_id": [1]}).to_csv(csv_path, index=False)
+    context = load_database(csv_path)
+    schema = extract_schema(context)
+    cache = InMemoryQuestionCache()
+
+    try:
+        agent_loop(
+            "Broken?", schema, context, CountingGenerator("SELECT FROM"), question_cache=cache
+        )
+    except RuntimeError:
+        pass
+    assert len(cache._cache) == 0
+
+
+def test_sqlite_question_cache_persists(tmp_path: Path) -> None:
+    path = tmp_path / "questions.sqlite"
+    SQLiteQuestionCache(path).put("Top customers?", "v1", "SELECT 1")
+
+    reopened = SQLiteQuestionCache(path)
+    assert reopened.get("top customers", "v1") == "SELECT 1"
+    assert reopened.get("top customers", "v2") is None
+    reopened.invalidate("top customers", "v1")
+    assert reopened.get("top customers", "v1") is None
+
+
+def test_question_caches_migrate_unaffected_entries(tmp_path: Path) -> None:
+    for cache in (InMemoryQuestionCache(), SQLiteQuestionCache(tmp_path / "questions.sqlite")):
+        cache.put("total sales", "v1", "SELECT SUM(amount) FROM sales.orders")
+        cache.put("customer count", "v1", "SELECT COUNT(*) FROM customers")
+        cache.put("other schema", "v9", "SELECT * FROM orders")
+
+        assert cache.migrate("v1", "v2", {"Orders"}) == 1
+        assert cache.get("total sales", "v2") is None
+        assert cache.get("customer count", "v2") == "SELECT COUNT(*) FROM customers"
+        assert cache.get("customer count", "v1") is None
+        assert cache.get("other schema", "v9") == "SELECT * FROM orders"
+
+
+def test_canonicalize_sql_ignores_cosmetic_differences() -> None:
+    first = canonicalize_sql("select o.amount AS total from Orders o where o.id = 1")
+    second = canonicalize_sql("SELECT  x.AMOUNT  FROM orders AS x\nWHERE x.id=1")
+
+    assert first.key == second.key
+    assert first.output_names == ("total",)
+    assert second.output_names == (None,)
+    assert canonicalize_sql("SELECT amount FROM orders WHERE id = 2").key != first.key
+
+
+def test_canonicalize_sql_keeps_aliases_other_clauses_refer_to() -> None:
+    first = "SELECT a AS x, b AS y FROM t ORDER BY x"
+    second = "SELECT a AS y, b AS x FROM t ORDER BY x"
+    assert canonicalize_sql(first).key != canonicalize_sql(second).key
+
+    connection = duckdb.connect()
+    connection.execute("CREATE TABLE t AS SELECT range AS a, 4 - range AS b FROM range(1, 4)")
+    cache = ResultCache()
+    assert list(execute_sql(connection, first, cache, "v1")["x"]) == [1, 2, 3]
+    assert list(execute_sql(connection, second, cache, "v1")["y"]) == [3, 2, 1]
+    assert cache.stats.hits == 0
+
+
+def test_canonicalize_sql_keeps_cte_names() -> None:
+    first = "WITH a AS (SELECT 1 AS x) SELECT * FROM a"
+    second = "WITH b AS (SELECT 1 AS x) SELECT * FROM a"
+    assert canonicalize_sql(first).key != canonicalize_sql(second).key
+
+    connection = duckdb.connect()
+    connection.execute("CREATE TABLE a AS SELECT 42 AS x")
+    cache = ResultCache()
+    assert list(execute_sql(connection, first, cache, "v1")["x"]) == [1]
+    assert list(execute_sql(connection, second, cache, "v1")["x"]) == [42]
+
+
+def test_result_cache_relabels_and_tracks_versions() -> None:
+    connection = duckdb.connect()
+    connection.execute(
+        "CREATE TABLE orders AS SELECT range AS id, range * 2 AS amount FROM range(5)"
+    )
+    cache = ResultCache()
+
+    first = execute_sql(connection, "SELECT SUM(amount) AS total FROM orders", cache, "v1")
+    second = execute_sql(connection, "select sum(AMOUNT) as grand_total from orders", cache, "v1")
+    assert list(second.columns) == ["grand_total"]
+    assert second.iloc[0, 0] == first.iloc[0, 0] == 20
+    assert cache.stats.hits == 1
+
+    # An unaliased query cannot reuse a label DuckDB would choose itself.
+    execute_sql(connection, "SELECT SUM(amount) FROM orders", cache, "v1")
+    assert cache.stats.misses == 2
+
+    connection.execute("INSERT INTO orders VALUES (5, 10)")
+    refreshed = execute_sql(connection, "SELECT SUM(amount) AS total FROM orders", cache, "v2")
+    assert refreshed.iloc[0, 0] == 30
+
+
+def test_result_cache_invalidates_by_table() -> None:
+    connection = duckdb.connect()
+    connection.execute("CREATE TABLE orders AS SELECT range AS id FROM range(5)")
+    connection.execute("CREATE TABLE customers AS SELECT range AS id FROM range(3)")
+    cache = ResultCache()
+    execute_sql(connection, "SELECT COUNT(*) AS n FROM orders", cache, "v1")
+    execute_sql(connection, "SELECT COUNT(*) AS n FROM customers", cache, "v1")
+    execute_sql(connection, "SELECT COUNT(*) AS n FROM orders", cache, "v2")
+
+    assert cache.invalidate_tables("v1", {"main.orders"}) == 1
+    assert len(cache) == 2
+    execute_sql(connection, "SELECT COUNT(*) AS n FROM customers", cache, "v1")
+    assert cache.stats.hits == 1
+
+
+def test_execute_raw_query_uses_context_result_cache(tmp_path: Path) -> None:
+    csv_path = tmp_path / "orders.csv"
+    pd.DataFrame({"order_id": [1, 2, 3]}).to_csv(csv_path, index=False)
+    context = load_database(csv_path)
+    context.result_cache = ResultCache()
+
+    assert context.execute_raw_query("SELECT COUNT(*) AS n FROM orders") == [{"n": 3}]
+    context.connection.execute("DELETE FROM orders")
+    assert context.execute_raw_query("select count(*) as n from orders") == [{"n": 3}]
+    context.bump_data_version()
+    assert context.execute_raw_query("SELECT COUNT(*) AS n FROM orders") == [{"n": 0}]
+    assert len(context.result_cache) == 1
+
+
+def test_statements_that_change_data_invalidate_cached_results(tmp_path: Path) -> None:
+    csv_path = tmp_path / "orders.csv"
+    pd.DataFrame({"order_id": [1, 2, 3]}).to_csv(csv_path, index=False)
+    context = load_database(csv_path)
+    context.result_cache = ResultCache()
+
+    assert context.execute_raw_query("SELECT COUNT(*) AS n FROM orders") == [{"n": 3}]
+    context.execute_raw_query("INSERT INTO orders VALUES (4)")
+    assert context.data_version == 1
+    assert context.execute_raw_query("SELECT COUNT(*) AS n FROM orders") == [{"n": 4}]
+
+    ResultStream(context, "DELETE FROM orders WHERE order_id = 4").close()
+    assert context.execute_raw_query("SELECT COUNT(*) AS n FROM orders") == [{"n": 3}]
+
+    CursorRegistry().open(context, "INSERT INTO orders VALUES (5)")
+    assert context.data_version == 3
+    assert context.execute_raw_query("SELECT COUNT(*) AS n FROM orders") == [{"n": 4}]
+    CursorRegistry().open(context, "DELETE FROM orders WHERE order_id = 5")
+
+    count = "SELECT COUNT(*) AS n FROM orders"
+    cache = context.result_cache
+    assert execute_sql(context.connection, count, cache, "v")["n"][0] == 3
+    execute_sql(context.connection, "DELETE FROM orders", cache, "v")
+    assert execute_sql(context.connection, count, cache, "v")["n"][0] == 0
+
+
+def test_canonicalize_sql_skips_uncacheable_statements() -> None:
+    assert canonicalize_sql("CREATE TABLE t AS SELECT 1") is None
+    assert canonicalize_sql("SELECT random() AS r") is None
+    assert canonicalize_sql("SELECT now()") is None
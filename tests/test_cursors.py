@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import time
+
+import duckdb
+import pytest
+
+from text2sql_agent.cursors import CursorLimitError, CursorRegistry
+from text2sql_agent.database import DatabaseContext
+
+
+def _context() -> DatabaseContext:
+    connection = duckdb.connect()
+    connection.execute("CREATE TABLE items AS SELECT range AS id FROM range(25)")
+    return DatabaseContext(connection=connection, tables=[])
+
+
+def test_pages_through_results_and_closes_when_done() -> None:
+    registry = CursorRegistry()
+    context = _context()
+
+    first = registry.open(context, "SELECT id FROM items ORDER BY id", page_size=10)
+    assert first.columns == ["id"]
+    assert first.column_types == ["BIGINT"]
+    assert [row["id"] for row in first.rows] == list(range(10))
+    assert not first.done
+
+    second = registry.fetch(first.cursor_id, page_size=10)
+    last = registry.fetch(first.cursor_id, page_size=10)
+    assert second.offset == 10
+    assert [row["id"] for row in last.rows] == list(range(20, 25))
+    assert last.done
+    assert last.cursor_id is None
+    assert len(registry) == 0
+    with pytest.raises(KeyError):
+        registry.fetch(first.cursor_id)
+
+
+def test_cursor_cap_and_idle_expiry() -> None:
+    registry = CursorRegistry(max_open=1, idle_timeout=0.05)
+    context = _context()
+
+    page = registry.open(context, "SELECT id FROM items", page_size=5)
+    with pytest.raises(CursorLimitError):
+        registry.open(context, "SELECT id FROM items", page_size=5)
+
+    time.sleep(0.06)
+    assert registry.expire_idle() == 1
+    with pytest.raises(KeyError):
+        registry.fetch(page.cursor_id)
+    registry.open(context, "SELECT id FROM items", page_size=5)
+
+
+def test_failed_query_releases_slot() -> None:
+    registry = CursorRegistry(max_open=1)
+
+    with pytest.raises(duckdb.Error):
+        registry.open(_context(), "SELECT nope FROM items")
+    assert len(registry) == 0
+
+
+def test_page_size_must_be_positive() -> None:
+    registry = CursorRegistry()
+    context = _context()
+
+    with pytest.raises(ValueError):
+        registry.open(context, "SELECT id FROM items", page_size=0)
+    assert len(registry) == 0
+    page = registry.open(context, "SELECT id FROM items", page_size=5)
+    with pytest.raises(ValueError):
+        registry.fetch(page.cursor_id, page_size=0)
+
+
+def test_close_dataset_closes_its_cursors() -> None:
+    registry = CursorRegistry()
+    context = _context()
+    first = registry.open(context, "SELECT id FROM items", page_size=5, dataset_id="a")
+    second = registry.open(context, "SELECT id FROM items", page_size=5, dataset_id="b")
+
+    assert registry.close_dataset("a") == 1
+    with pytest.raises(KeyError):
+        registry.fetch(first.cursor_id)
+    assert registry.fetch(second.cursor_id, page_size=5).offset == 5
@@ -1,11 +1,29 @@
 from __future__ import annotations
 
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import duckdb
 import pandas as pd
+import pytest
 
-from text2sql_agent.database import load_database
+from text2sql_agent import database
+from text2sql_agent import schema as schema_module
+from text2sql_agent.cursors import CursorRegistry
+from text2sql_agent.database import (
+    DatabaseContext,
+    EngineSettings,
+    IngestOptions,
+    ReadWriteLock,
+    ReattachError,
+    TableReference,
+    load_database,
+)
 from text2sql_agent.schema import extract_schema
+from text2sql_agent.streaming import ResultStream
 
 
 def test_load_csv(tmp_path: Path) -> None:
@@ -25,3 +43,209 @@ def test_load_csv(tmp_path: Path) -> None:
     assert "main.customers" in schema
     assert schema["main.customers"].columns == ["customer_id", "name"]
     assert len(schema["main.customers"].sample_rows) == 3
+
+
+@pytest.mark.parametrize("mode", ["view", "table", "pandas"])
+def test_load_csv_ingest_modes(tmp_path: Path, mode: str) -> None:
+    csv_path = tmp_path / "orders.csv"
+    pd.DataFrame({"order_id": [1, 2], "amount": [9.5, 3.0]}).to_csv(csv_path, index=False)
+
+    context = load_database(csv_path, IngestOptions(mode=mode))
+    total = context.connection.execute("SELECT SUM(amount) FROM orders").fetchone()[0]
+    assert total == 12.5
+
+
+def test_auto_mode_uses_view_above_threshold(tmp_path: Path) -> None:
+    json_path = tmp_path / "events.json"
+    json_path.write_text('[{"id": 1, "kind": "click"}, {"id": 2, "kind": "view"}]')
+
+    context = load_database(json_path, IngestOptions(materialize_threshold=0))
+    table_type = context.connection.execute(
+        "SELECT table_type FROM information_schema.tables WHERE table_name = 'events'"
+    ).fetchone()[0]
+    assert table_type == "VIEW"
+    assert extract_schema(context)["main.events"].columns == ["id", "kind"]
+
+
+def test_extract_schema_records_types_and_caches(tmp_path: Path) -> None:
+    pd.DataFrame({"id": [1, 2], "name": ["a", "b"]}).to_csv(tmp_path / "a.csv", index=False)
+    context = load_database(tmp_path / "a.csv")
+
+    schema = extract_schema(context)
+    assert schema["main.a"].column_types == {"id": "BIGINT", "name": "VARCHAR"}
+
+    assert extract_schema(context)["main.a"].sample_rows == schema["main.a"].sample_rows
+    context.execute_raw_query("DELETE FROM a")
+    assert extract_schema(context)["main.a"].sample_rows == []
+
+
+def test_extract_schema_shares_samples_between_copies_with_a_digest(
+    tmp_path: Path, monkeypatch
+) -> None:
+    pd.DataFrame({"id": [1, 2]}).to_csv(tmp_path / "a.csv", index=False)
+    copy = tmp_path / "copy" / "a.csv"
+    copy.parent.mkdir()
+    copy.write_bytes((tmp_path / "a.csv").read_bytes())
+    first = load_database(tmp_path / "a.csv", digest="abc")
+    second = load_database(copy, digest="abc")
+    extract_schema(first)
+
+    sampled = []
+
+    def sample_tables(context, tables, sample_rows, max_workers):
+        sampled.extend(table.fqn for table in tables)
+        return {table.fqn: [] for table in tables}
+
+    monkeypatch.setattr(schema_module, "_sample_tables", sample_tables)
+    assert len(extract_schema(second)["main.a"].sample_rows) == 2
+    assert sampled == []
+    second.execute_raw_query("DELETE FROM a")
+    assert extract_schema(second)["main.a"].sample_rows == []
+    assert sampled == ["main.a"]
+
+
+def test_extract_schema_samples_many_tables_concurrently() -> None:
+    connection = duckdb.connect()
+    tables = []
+    for index in range(6):
+        connection.execute(f"CREATE TABLE t{index} AS SELECT range AS v FROM range({index})")
+        tables.append(TableReference(schema="main", name=f"t{index}"))
+
+    schema = extract_schema(DatabaseContext(connection=connection, tables=tables))
+    assert [len(schema[f"main.t{i}"].sample_rows) for i in range(6)] == [0, 1, 2, 3, 4, 5]
+    assert schema["main.t3"].columns == ["v"]
+
+
+def test_extract_schema_closes_its_sampling_cursors() -> None:
+    connection = duckdb.connect()
+    for index in range(4):
+        connection.execute(f"CREATE TABLE t{index} AS SELECT 1 AS v")
+    context = DatabaseContext(
+        connection=connection,
+        tables=[TableReference(schema="main", name=f"t{index}") for index in range(4)],
+    )
+    opened = []
+
+    def cursor() -> duckdb.DuckDBPyConnection:
+        opened.append(connection.cursor())
+        return opened[-1]
+
+    context.cursor = cursor
+    extract_schema(context, use_cache=False)
+
+    assert opened
+    for sampler in opened:
+        with pytest.raises(duckdb.ConnectionException):
+            sampler.execute("SELECT 1")
+
+
+def test_load_database_applies_engine_settings(tmp_path: Path) -> None:
+    csv_path = tmp_path / "items.csv"
+    pd.DataFrame({"id": [1, 2]}).to_csv(csv_path, index=False)
+
+    context = load_database(csv_path, settings=EngineSettings(threads=2, memory_limit="512MB"))
+
+    cursor = context.cursor()
+    assert cursor.execute("SELECT current_setting('threads')").fetchone()[0] == 2
+    assert cursor.execute("SELECT current_setting('memory_limit')").fetchone()[0] != ""
+    with pytest.raises(ValueError):
+        EngineSettings(threads=0)
+
+
+def test_execute_raw_query_is_safe_across_threads(tmp_path: Path) -> None:
+    csv_path = tmp_path / "numbers.csv"
+    pd.DataFrame({"n": range(1000)}).to_csv(csv_path, index=False)
+    context = load_database(csv_path)
+
+    def total(offset: int) -> int:
+        rows = context.execute_raw_query(f"SELECT SUM(n) + {offset} AS total FROM numbers")
+        return rows[0]["total"]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(total, range(32)))
+    assert results == [499500 + offset for offset in range(32)]
+
+
+def test_read_write_lock_lets_a_waiting_writer_in_before_new_readers() -> None:
+    lock = ReadWriteLock()
+    order = []
+    writer_waiting = threading.Event()
+
+    def write() -> None:
+        writer_waiting.set()
+        with lock.exclusive():
+            order.append("writer")
+
+    def read() -> None:
+        with lock.shared():
+            order.append("late reader")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        with lock.shared():
+            writer = pool.submit(write)
+            writer_waiting.wait()
+            time.sleep(0.05)
+            reader = pool.submit(read)
+            time.sleep(0.05)
+            assert order == []
+        writer.result(timeout=5)
+        reader.result(timeout=5)
+    assert order == ["writer", "late reader"]
+
+
+def test_queries_wait_for_an_exclusive_holder(tmp_path: Path) -> None:
+    csv_path = tmp_path / "numbers.csv"
+    pd.DataFrame({"n": range(10)}).to_csv(csv_path, index=False)
+    context = load_database(csv_path)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        with context.query_lock.exclusive():
+            query = pool.submit(context.execute_raw_query, "SELECT COUNT(*) AS n FROM numbers")
+            time.sleep(0.05)
+            assert not query.done()
+        assert query.result(timeout=5) == [{"n": 10}]
+
+
+def _attached_context() -> DatabaseContext:
+    connection = duckdb.connect()
+    connection.execute("ATTACH ':memory:' AS shop")
+    connection.execute("CREATE TABLE shop.orders AS SELECT range AS id FROM range(100)")
+    return DatabaseContext(
+        connection=connection,
+        tables=[TableReference("shop", "orders")],
+        watchers={"shop": types.SimpleNamespace(path=Path("shop.db"))},
+    )
+
+
+def test_reattach_closes_open_streams_and_cursors(monkeypatch) -> None:
+    def register(connection, path):
+        connection.execute("ATTACH ':memory:' AS shop")
+        connection.execute("CREATE TABLE shop.orders AS SELECT 1 AS id")
+        return [TableReference("shop", "orders")]
+
+    monkeypatch.setattr(database, "_register_sqlite", register)
+    context = _attached_context()
+    stream = ResultStream(context, "SELECT * FROM shop.orders", batch_size=10)
+    registry = CursorRegistry()
+    page = registry.open(context, "SELECT * FROM shop.orders", page_size=10)
+
+    context.reattach_sqlite("shop")
+
+    with pytest.raises(RuntimeError, match="closed"):
+        list(stream.ndjson())
+    with pytest.raises(KeyError):
+        registry.fetch(page.cursor_id)
+    assert len(registry) == 0
+    assert context.execute_raw_query("SELECT COUNT(*) AS n FROM shop.orders") == [{"n": 1}]
+
+
+def test_failed_reattach_raises_and_drops_the_tables(monkeypatch) -> None:
+    def register(connection, path):
+        raise duckdb.IOException("file is locked")
+
+    monkeypatch.setattr(database, "_register_sqlite", register)
+    context = _attached_context()
+
+    with pytest.raises(ReattachError, match="file is locked"):
+        context.reattach_sqlite("shop")
+    assert context.tables == []
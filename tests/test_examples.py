@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+
+from text2sql_agent.agent import agent_loop
+from text2sql_agent.database import load_database
+from text2sql_agent.examples import ExampleStore
+from text2sql_agent.prompts import build_prompt
+from text2sql_agent.schema import extract_schema
+
+
+def test_search_ranks_similar_questions_for_the_same_schema() -> None:
+    store = ExampleStore()
+    store.add("How many orders were placed?", "SELECT COUNT(*) FROM orders", "fp1")
+    store.add("What is the average order amount?", "SELECT AVG(amount) FROM orders", "fp1")
+    store.add("List customers in Canada", "SELECT * FROM customers WHERE country='Canada'", "fp1")
+    store.add("How many orders were placed?", "SELECT 1", "fp2")
+
+    results = store.search("How many orders were shipped?", "fp1", k=2)
+
+    assert [example.sql for example in results][0] == "SELECT COUNT(*) FROM orders"
+    assert all(example.fingerprint == "fp1" for example in results)
+    assert store.search("How many orders were shipped?", "unknown") == []
+    # The identical question is left to the question cache.
+    assert "SELECT COUNT(*) FROM orders" not in [
+        example.sql for example in store.search("how many orders were placed", "fp1")
+    ]
+
+
+def test_examples_persist_and_replace(tmp_path: Path) -> None:
+    path = tmp_path / "examples.sqlite"
+    store = ExampleStore(path)
+    store.add("Total revenue by country", "SELECT 1", "fp")
+    store.add("total revenue by country?", "SELECT 2", "fp")
+    store.close()
+
+    reopened = ExampleStore(path)
+    results = reopened.search("Revenue by country please", "fp")
+
+    assert len(reopened) == 1
+    assert [example.sql for example in results] == ["SELECT 2"]
+
+
+def test_build_prompt_includes_examples() -> None:
+    store = ExampleStore()
+    store.add("How many orders are there?", "SELECT COUNT(*) FROM orders", "fp")
+
+    question = "How many orders are pending?"
+    prompt = build_prompt(question, {}, examples=store.search(question, "fp"))
+
+    expected = "Example question: How many orders are there?\nSQL: SELECT COUNT(*) FROM orders"
+    assert expected in prompt
+    assert prompt.index("Examples:") < prompt.index("Question: How many orders are pending?")
+
+
+def test_agent_loop_stores_and_reuses_examples(tmp_path: Path) -> None:
+    csv_path = tmp_path / "orders.csv"
+    pd.DataFrame({"order_id": [1, 2], "amount": [10.0, 20.0]}).to_csv(csv_path, index=False)
+    context = load_database(csv_path)
+    schema = extract_schema(context)
+    store = ExampleStore()
+    prompts: list[str] = []
+
+    def generator(prompt: str) -> str:
+        prompts.append(prompt)
+        return "SELECT COUNT(*) AS orders FROM orders"
+
+    agent_loop("How many orders are there?", schema, context, generator, example_store=store)
+    agent_loop("How many orders exist?", schema, context, generator, example_store=store)
+
+    assert "Examples:" not in prompts[0]
+    assert "Example question: How many orders are there?" in prompts[1]
+    assert len(store) == 2
+    stats = store.stats.to_dict()
+    assert stats["questions"] == 2
+    assert stats["hit_rate"] == 0.5
+    assert stats["attempts_per_question_with_examples"] == 1.0
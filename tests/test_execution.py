@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import duckdb
+import pytest
+
+from text2sql_agent.cursors import CursorRegistry
+from text2sql_agent.database import DatabaseContext
+from text2sql_agent.execution import (
+    QueryLimits,
+    QueryTimeoutError,
+    execute_preview,
+    execute_sql,
+    limit_query,
+)
+from text2sql_agent.streaming import ResultStream
+
+_SLOW_QUERY = "SELECT COUNT(*) FROM range(100000000) AS a, range(100000) AS b"
+
+
+def test_limit_query_adds_and_lowers_limits() -> None:
+    assert limit_query("SELECT a FROM t", 10) == "SELECT a FROM t LIMIT 10"
+    assert limit_query("SELECT a FROM t LIMIT 500", 10) == "SELECT a FROM t LIMIT 10"
+    assert limit_query("SELECT a FROM t LIMIT 5", 10) == "SELECT a FROM t LIMIT 5"
+    assert limit_query("CREATE TABLE x (a INT)", 10) == "CREATE TABLE x (a INT)"
+
+
+def test_execute_sql_caps_rows() -> None:
+    connection = duckdb.connect()
+    results = execute_sql(
+        connection, "SELECT * FROM range(1000)", limits=QueryLimits(max_rows=25)
+    )
+    assert len(results) == 25
+
+
+def test_percent_limits_are_capped() -> None:
+    connection = duckdb.connect()
+    results = execute_sql(
+        connection, "SELECT * FROM range(1000) LIMIT 50%", limits=QueryLimits(max_rows=25)
+    )
+    assert len(results) == 25
+
+
+def test_streams_and_cursors_are_not_capped_by_max_rows() -> None:
+    context = DatabaseContext(
+        connection=duckdb.connect(), tables=[], limits=QueryLimits(max_rows=25)
+    )
+    stream = ResultStream(context, "SELECT * FROM range(1000)")
+    assert stream.row_limit is None
+    assert sum(chunk.count(b"\n") for chunk in stream.ndjson()) == 1000
+
+    page = CursorRegistry().open(context, "SELECT * FROM range(1000)", page_size=100)
+    assert len(page.rows) == 100
+    assert not page.done
+
+
+def test_streams_and_cursors_report_the_streamed_row_cap() -> None:
+    context = DatabaseContext(
+        connection=duckdb.connect(), tables=[], limits=QueryLimits(max_streamed_rows=25)
+    )
+    stream = ResultStream(context, "SELECT * FROM range(1000)")
+    assert stream.row_limit == 25
+    assert sum(chunk.count(b"\n") for chunk in stream.ndjson()) == 25
+
+    registry = CursorRegistry()
+    page = registry.open(context, "SELECT * FROM range(1000)", page_size=25)
+    assert len(page.rows) == 25 and not page.done
+    page = registry.fetch(page.cursor_id, page_size=25)
+    assert page.rows == [] and page.done and page.truncated
+
+    page = registry.open(context, "SELECT * FROM range(25)", page_size=100)
+    assert len(page.rows) == 25 and page.done and not page.truncated
+
+
+def test_execute_sql_interrupts_slow_queries() -> None:
+    connection = duckdb.connect()
+    with pytest.raises(QueryTimeoutError):
+        execute_sql(connection, _SLOW_QUERY, limits=QueryLimits(timeout=0.2))
+    # The connection stays usable after the interrupt.
+    assert connection.execute("SELECT 1").fetchone() == (1,)
+
+
+def test_wrapped_preview_handles_trailing_comments() -> None:
+    connection = duckdb.connect()
+    preview = execute_preview(
+        connection,
+        "SELECT * FROM range(10) AS r(id) ORDER BY id DESC -- newest first",
+        preview_rows=2,
+        count="wrap",
+    )
+    assert preview.total_rows == 10
+    assert preview.rows["id"].tolist() == [9, 8]
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import sys
+import types
+
+import pytest
+
+from text2sql_agent.generator import TransformersSQLGenerator
+
+
+class FakeTokenizer:
+    def __call__(self, text: str) -> dict:
+        return {"input_ids": text.split()}
+
+
+class FakePipeline:
+    """Stands in for a transformers text2text pipeline and records its calls."""
+
+    def __init__(self, task: str, **kwargs) -> None:
+        self.task = task
+        self.kwargs = kwargs
+        self.calls: list = []
+        self.tokenizer = FakeTokenizer()
+
+    def __call__(self, inputs, **kwargs):
+        self.calls.append((inputs, kwargs))
+        return [{"generated_text": " SELECT 1 "}]
+
+
+@pytest.fixture
+def fake_transformers(monkeypatch):
+    module = types.ModuleType("transformers")
+    module.pipeline = FakePipeline
+    monkeypatch.setitem(sys.modules, "transformers", module)
+    return module
+
+
+def test_unknown_backend_is_rejected(fake_transformers) -> None:
+    with pytest.raises(ValueError, match="Unsupported backend"):
+        TransformersSQLGenerator(backend="tensorrt")
+
+
+def test_warmup_runs_a_generation_and_records_timings(fake_transformers) -> None:
+    generator = TransformersSQLGenerator(model_name="stub", warmup=True)
+
+    assert generator._pipeline.kwargs["model"] == "stub"
+    assert len(generator._pipeline.calls) == 1
+    assert generator.timings.warmup_seconds is not None
+    assert generator.timings.calls == 0
+
+    assert generator("question") == "SELECT 1"
+    assert generator.timings.calls == 1
+    assert generator.timings.first_call_seconds is not None
+
+
+def test_without_warmup_nothing_runs_at_construction(fake_transformers) -> None:
+    generator = TransformersSQLGenerator()
+
+    assert generator._pipeline.calls == []
+    assert generator.timings.warmup_seconds is None
+
+
+def test_num_beams_reaches_generation(fake_transformers) -> None:
+    generator = TransformersSQLGenerator(num_beams=2, warmup=True)
+    generator("question")
+    generator.batch(["a", "b"])
+    generator.candidates("question", 3)
+
+    beams = [kwargs["num_beams"] for _, kwargs in generator._pipeline.calls]
+    # The warm-up, single and batched calls use the setting; candidates need
+    # at least as many beams as sequences returned.
+    assert beams == [2, 2, 2, 3]
+
+
+def test_tokens_are_counted_on_a_separate_tokenizer(fake_transformers) -> None:
+    generator = TransformersSQLGenerator()
+
+    assert generator.count_tokens("how many rows") == 3
+    assert generator._count_tokenizer is not generator._pipeline.tokenizer
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+
+from text2sql_agent.database import IngestOptions, load_database
+from text2sql_agent.ingest_cache import IngestionCache
+from text2sql_agent.schema import extract_schema
+
+
+def _write_orders(path: Path, rows: int = 3) -> Path:
+    pd.DataFrame({"order_id": range(rows), "amount": [10.0] * rows}).to_csv(
+        path, index=False
+    )
+    return path
+
+
+def test_cache_reuses_materialized_database(tmp_path: Path) -> None:
+    cache = IngestionCache(tmp_path / "cache")
+    csv_path = _write_orders(tmp_path / "orders.csv")
+
+    first = load_database(csv_path, cache=cache)
+    second = load_database(csv_path, cache=cache)
+
+    assert len(cache.entries()) == 1
+    assert second.connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 3
+    assert extract_schema(first)["main.orders"].columns == ["order_id", "amount"]
+
+
+def test_cache_key_depends_on_content_and_options(tmp_path: Path) -> None:
+    cache = IngestionCache(tmp_path / "cache")
+    csv_path = _write_orders(tmp_path / "orders.csv")
+
+    load_database(csv_path, cache=cache)
+    load_database(csv_path, IngestOptions(all_varchar=True), cache=cache)
+    _write_orders(csv_path, rows=5)
+    load_database(csv_path, cache=cache)
+
+    assert len(cache.entries()) == 3
+    assert cache.purge() == 3
+    assert cache.entries() == []
+
+
+def test_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = IngestionCache(tmp_path / "cache", max_bytes=0)
+    first = _write_orders(tmp_path / "first.csv")
+    second = _write_orders(tmp_path / "second.csv")
+
+    load_database(first, cache=cache)
+    load_database(second, cache=cache)
+
+    entries = cache.entries()
+    assert len(entries) == 1
+    assert entries[0].key == cache.key_for(second, IngestOptions())
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from text2sql_agent.caches import CacheStats
+from text2sql_agent.metrics import AgentMetrics, Histogram
+from text2sql_agent.tracing import NULL_TRACE, Trace
+
+
+def _sample(text: str, name: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{name} not found in:\n{text}")
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    histogram = Histogram("latency_seconds", "Latency.", labels=("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "execution")
+
+    text = "\n".join(histogram.render())
+
+    assert _sample(text, 'latency_seconds_bucket{stage="execution",le="0.1"}') == 1
+    assert _sample(text, 'latency_seconds_bucket{stage="execution",le="1"}') == 2
+    assert _sample(text, 'latency_seconds_bucket{stage="execution",le="+Inf"}') == 3
+    assert _sample(text, 'latency_seconds_sum{stage="execution"}') == 5.55
+    assert _sample(text, 'latency_seconds_count{stage="execution"}') == 3
+
+
+def test_agent_metrics_render_stages_retries_and_caches() -> None:
+    metrics = AgentMetrics()
+    trace = Trace()
+    with trace.span("generation"):
+        pass
+    with trace.span("execution"):
+        pass
+    trace.finish()
+    metrics.observe(trace, attempts=3, cache_hit=False)
+    metrics.observe(None, attempts=0, cache_hit=True)
+    metrics.observe(None, attempts=0, cache_hit=False, outcome="error")
+    with metrics.in_flight("query"):
+        during = metrics.render()
+
+    text = metrics.render({"results": CacheStats(hits=3, misses=1)})
+
+    assert _sample(during, 'text2sql_in_flight_requests{endpoint="query"}') == 1
+    assert _sample(text, 'text2sql_in_flight_requests{endpoint="query"}') == 0
+    assert _sample(text, 'text2sql_stage_duration_seconds_count{stage="generation"}') == 1
+    assert _sample(text, 'text2sql_request_duration_seconds_count{outcome="success"}') == 1
+    assert _sample(text, 'text2sql_requests_total{outcome="success"}') == 2
+    assert _sample(text, 'text2sql_requests_total{outcome="error"}') == 1
+    assert _sample(text, "text2sql_retries_total") == 2
+    assert _sample(text, "text2sql_question_cache_answers_total") == 1
+    assert _sample(text, 'text2sql_cache_lookups_total{cache="results",result="hit"}') == 3
+    assert _sample(text, 'text2sql_cache_hit_ratio{cache="results"}') == 0.75
+    assert "# TYPE text2sql_stage_duration_seconds histogram" in text
+
+
+def test_null_trace_records_nothing() -> None:
+    with NULL_TRACE.span("generation"):
+        pass
+    NULL_TRACE.finish()
+
+    assert NULL_TRACE.spans == []
+    assert NULL_TRACE.stage_seconds() == {}
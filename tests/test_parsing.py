@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from text2sql_agent.parsing import clear_parse_cache, parse_query
+from text2sql_agent.validation import validate_sql
+
+
+def test_parse_query_is_memoized() -> None:
+    clear_parse_cache()
+    first = parse_query("SELECT id FROM orders")
+    assert parse_query("SELECT id FROM orders") is first
+
+
+def test_tables_skip_ctes_and_table_functions() -> None:
+    parsed = parse_query(
+        "WITH recent AS (SELECT * FROM main.orders) "
+        "SELECT * FROM recent JOIN customers c ON TRUE, range(3)"
+    )
+    assert set(parsed.tables) == {"main.orders", "customers"}
+
+
+def test_limited_rewrites_a_copy() -> None:
+    parsed = parse_query("SELECT id FROM orders")
+    limited = parsed.limited(10)
+
+    assert limited.sql == "SELECT id FROM orders LIMIT 10"
+    assert parse_query(limited.sql) is limited
+    assert parsed.expression.args.get("limit") is None
+
+
+def test_validation_uses_duckdb_dialect() -> None:
+    assert validate_sql("SELECT * FROM orders QUALIFY row_number() OVER () = 1") == (True, None)
+    assert validate_sql("SELECT 1 UNION ALL SELECT 2") == (True, None)
+    assert validate_sql("SELECT 1; DROP TABLE orders")[0] is False
+    assert validate_sql("DELETE FROM orders")[0] is False
+    assert validate_sql("   ") == (False, "The generated SQL query is empty.")
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from text2sql_agent.prompts import PromptTemplate, build_prompt, estimate_tokens
+from text2sql_agent.schema import TableSchema
+
+
+def _schema(extra_column: str | None = None) -> dict[str, TableSchema]:
+    columns = ["order_id", "amount"] + ([extra_column] if extra_column else [])
+    return {
+        "main.orders": TableSchema(
+            columns=columns,
+            sample_rows=[{"order_id": 1, "amount": 9.5}],
+            column_types={"order_id": "BIGINT", "amount": "DOUBLE"},
+        )
+    }
+
+
+class CountingGenerator:
+    def __call__(self, prompt: str) -> str:
+        return "SELECT 1"
+
+    def count_tokens(self, prompt: str) -> int:
+        return len(prompt.split())
+
+
+def test_template_matches_build_prompt_and_reuses_prefix() -> None:
+    schema = _schema()
+    template = PromptTemplate(schema)
+
+    first = template.render("Total amount?", error="Execution failed: boom")
+    assert first == build_prompt("Total amount?", schema, error="Execution failed: boom")
+    assert first.endswith("Previous error: Execution failed: boom\n\nSQL query:")
+    assert template.prefix("Total amount?") is template.prefix("Another question")
+
+
+def test_template_version_tracks_schema() -> None:
+    assert PromptTemplate(_schema()).version == PromptTemplate(_schema()).version
+    assert PromptTemplate(_schema()).version != PromptTemplate(_schema("status")).version
+
+
+def test_token_count_prefers_generator_tokenizer() -> None:
+    prompt = PromptTemplate(_schema()).render("Total amount?")
+
+    assert PromptTemplate.token_count(prompt, CountingGenerator()) == len(prompt.split())
+    assert PromptTemplate.token_count(prompt) == estimate_tokens(prompt)
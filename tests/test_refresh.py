@@ -0,0 +1,126 @@
+import os
+import sqlite3
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from text2sql_agent.caches import InMemoryQuestionCache, ResultCache
+from text2sql_agent.database import load_database
+from text2sql_agent.prompts import PromptTemplate
+from text2sql_agent.refresh import refresh_schema
+from text2sql_agent.retrieval import SchemaIndex
+from text2sql_agent.schema import extract_schema
+from text2sql_agent.sqlite_watch import SQLiteWatcher
+
+
+def _sqlite_available() -> bool:
+    try:
+        duckdb.connect().execute("LOAD sqlite")
+    except duckdb.Error:
+        return False
+    return True
+
+
+def _create_db(path: Path) -> None:
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, amount REAL)")
+        conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.executemany("INSERT INTO orders VALUES (?, ?)", [(1, 10.0), (2, 20.0)])
+        conn.executemany("INSERT INTO customers VALUES (?, ?)", [(1, "Ann"), (2, "Bo")])
+    conn.close()
+
+
+def _write(path: Path, *statements: str) -> None:
+    conn = sqlite3.connect(path)
+    with conn:
+        for statement in statements:
+            conn.execute(statement)
+    conn.close()
+
+
+def test_watcher_reports_changed_tables(tmp_path: Path) -> None:
+    path = tmp_path / "shop.db"
+    _create_db(path)
+    watcher = SQLiteWatcher(path, min_interval=0)
+
+    assert not watcher.check()
+
+    _write(path, "INSERT INTO orders VALUES (3, 30.0)")
+    changes = watcher.check()
+    # Commits are not attributed to tables, so every table is re-sampled.
+    assert changes.modified == {"orders", "customers"}
+    assert not changes.schema_changed
+    assert not watcher.check()
+
+    _write(
+        path,
+        "ALTER TABLE customers ADD COLUMN city TEXT",
+        "CREATE TABLE returns (order_id INTEGER)",
+    )
+    changes = watcher.check()
+    assert changes.altered == {"customers"}
+    assert changes.added == {"returns"}
+    assert changes.modified == {"orders"}
+    assert changes.schema_tables == {"customers", "returns"}
+
+    _write(path, "DROP TABLE returns")
+    assert watcher.check().removed == {"returns"}
+    watcher.close()
+
+
+def test_watcher_checks_at_most_once_per_interval(tmp_path: Path) -> None:
+    path = tmp_path / "shop.db"
+    _create_db(path)
+    watcher = SQLiteWatcher(path, min_interval=60)
+
+    _write(path, "UPDATE customers SET name = 'Cy' WHERE id = 2")
+    assert not watcher.check()
+    assert watcher.check(force=True).modified == {"orders", "customers"}
+    watcher.close()
+
+
+def test_watcher_follows_a_replaced_file(tmp_path: Path) -> None:
+    path = tmp_path / "shop.db"
+    _create_db(path)
+    watcher = SQLiteWatcher(path, min_interval=0)
+
+    replacement = tmp_path / "new.db"
+    _write(replacement, "CREATE TABLE orders (id INTEGER PRIMARY KEY, amount REAL)")
+    os.replace(replacement, path)
+
+    changes = watcher.check()
+    assert changes.removed == {"customers"}
+    assert changes.modified == {"orders"}
+    watcher.close()
+
+
+@pytest.mark.skipif(not _sqlite_available(), reason="DuckDB sqlite extension not available")
+def test_refresh_schema_redescribes_only_changed_tables(tmp_path: Path) -> None:
+    path = tmp_path / "shop.db"
+    _create_db(path)
+    context = load_database(path, watch_interval=60)
+    context.result_cache = ResultCache()
+    schema = extract_schema(context)
+    template = PromptTemplate(schema, index=SchemaIndex.build(schema))
+    question_cache = InMemoryQuestionCache()
+    question_cache.put("order total", template.version, "SELECT SUM(amount) FROM orders")
+    question_cache.put("customer count", template.version, "SELECT COUNT(*) FROM customers")
+    context.execute_raw_query("SELECT COUNT(*) AS n FROM shop.orders")
+    context.execute_raw_query("SELECT COUNT(*) AS n FROM shop.customers")
+
+    assert not refresh_schema(context, schema, template, question_cache, force=True).changed
+
+    _write(path, "ALTER TABLE orders ADD COLUMN status TEXT")
+    assert not refresh_schema(context, schema, template, question_cache).changed
+    refresh = refresh_schema(context, schema, template, question_cache, force=True)
+
+    assert refresh.tables == ["shop.customers", "shop.orders"]
+    assert refresh.changes["shop"].altered == {"orders"}
+    assert refresh.schema["shop.orders"].columns == ["id", "amount", "status"]
+    assert refresh.results_invalidated == 2
+    assert refresh.questions_invalidated == 1
+    new_version = refresh.template.version
+    assert question_cache.get("customer count", new_version) == "SELECT COUNT(*) FROM customers"
+    assert extract_schema(context)["shop.orders"].columns == ["id", "amount", "status"]
+    context.close()
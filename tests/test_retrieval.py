@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from text2sql_agent.generator import build_prompt, estimate_tokens
+from text2sql_agent.retrieval import SchemaIndex, infer_joins, tokenize
+from text2sql_agent.schema import TableSchema
+
+
+def _schema() -> dict[str, TableSchema]:
+    return {
+        "main.customers": TableSchema(
+            columns=["customer_id", "name", "country"],
+            sample_rows=[{"customer_id": 1, "name": "Ann", "country": "USA"}],
+        ),
+        "main.orders": TableSchema(
+            columns=["order_id", "customer_id", "order_date"],
+            sample_rows=[{"order_id": 1, "customer_id": 1, "order_date": "2024-01-01"}],
+        ),
+        "main.products": TableSchema(
+            columns=["product_id", "title", "category"],
+            sample_rows=[{"product_id": 1, "title": "Lamp", "category": "Electronics"}],
+        ),
+        "main.suppliers": TableSchema(
+            columns=["supplier_id", "company"],
+            sample_rows=[{"supplier_id": 1, "company": "Acme"}],
+        ),
+    }
+
+
+def test_tokenize_splits_identifiers() -> None:
+    assert tokenize("customerOrders order_items") == ["customer", "order", "order", "item"]
+
+
+def test_infer_joins_from_key_columns() -> None:
+    joins = infer_joins(_schema())
+    assert joins["main.orders"] == {"main.customers"}
+    assert joins["main.suppliers"] == set()
+
+
+def test_index_ranks_by_names_and_sample_values() -> None:
+    index = SchemaIndex.build(_schema())
+
+    assert index.search("Which products are electronics?", top_k=1) == ["main.products"]
+    assert index.select("How many orders last year?", top_k=1) == [
+        "main.orders",
+        "main.customers",
+    ]
+
+
+def test_build_prompt_prunes_schema_to_relevant_tables() -> None:
+    schema = _schema()
+    index = SchemaIndex.build(schema)
+
+    prompt = build_prompt("List supplier companies", schema, index=index, top_k=1)
+    assert "Table: main.suppliers" in prompt
+    assert "main.orders" not in prompt
+
+    full = build_prompt("List supplier companies", schema)
+    budgeted = build_prompt("List supplier companies", schema, token_budget=40)
+    assert estimate_tokens(budgeted) < estimate_tokens(full)
+    assert "Table: main.customers" in budgeted
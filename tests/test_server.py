@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+from text2sql_agent import server
+
+
+@pytest.fixture
+def client():
+    server.datasets.close_all()
+    server.state.dataset_id = None
+    return TestClient(server.app)
+
+
+def _upload(client: TestClient, name: str, content: bytes, **params):
+    return client.post("/upload", files={"file": (name, content)}, params=params)
+
+
+def test_upload_waits_for_ingestion(client: TestClient) -> None:
+    response = _upload(client, "people.csv", b"id,name\n1,Ann\n2,Bo\n")
+
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["schema"]["main.people"]["columns"] == ["id", "name"]
+    status = client.get(f"/upload/{payload['job_id']}").json()
+    assert status["status"] == "succeeded"
+
+
+def test_background_upload_can_be_polled(client: TestClient) -> None:
+    response = _upload(client, "people.csv", b"id,name\n1,Ann\n", wait="false")
+
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    for _ in range(100):
+        status = client.get(f"/upload/{job_id}").json()
+        if status["status"] in {"succeeded", "failed"}:
+            break
+        time.sleep(0.05)
+    assert status["status"] == "succeeded"
+    rows = client.post("/api/execute_sql", json={"sql": "SELECT name FROM people"})
+    assert rows.json()["rows"] == [{"name": "Ann"}]
+
+
+def test_datasets_are_addressed_by_id(client: TestClient) -> None:
+    first = _upload(client, "people.csv", b"id,name\n1,Ann\n").json()["dataset_id"]
+    second = _upload(client, "pets.csv", b"id,kind\n1,cat\n").json()["dataset_id"]
+
+    rows = client.post(
+        "/api/execute_sql", json={"sql": "SELECT name FROM people", "dataset_id": first}
+    )
+    assert rows.json()["rows"] == [{"name": "Ann"}]
+    # Requests without an id go to the latest upload.
+    rows = client.post("/api/execute_sql", json={"sql": "SELECT kind FROM pets"})
+    assert rows.json()["rows"] == [{"kind": "cat"}]
+
+    listed = client.get("/datasets").json()
+    assert [item["dataset_id"] for item in listed["datasets"]] == [second, first]
+    assert client.delete(f"/datasets/{first}").status_code == 200
+    missing = client.post(
+        "/api/execute_sql", json={"sql": "SELECT 1", "dataset_id": first}
+    )
+    assert missing.status_code == 404
+
+
+def test_upload_directories_are_removed(client: TestClient, tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    failed = _upload(client, "notes.txt", b"hello")
+    assert failed.status_code == 500
+    assert list(tmp_path.iterdir()) == []
+
+    dataset_id = _upload(client, "people.csv", b"id,name\n1,Ann\n").json()["dataset_id"]
+    assert server.datasets.get(dataset_id).source_dir.parent == tmp_path
+    assert client.delete(f"/datasets/{dataset_id}").status_code == 200
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_reports_a_failure_to_create_its_directory(
+    client: TestClient, monkeypatch
+) -> None:
+    def mkdtemp(**kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(tempfile, "mkdtemp", mkdtemp)
+    response = _upload(client, "people.csv", b"id,name\n1,Ann\n")
+    assert response.status_code == 500
+    assert response.json()["detail"] == "disk full"
+
+
+def test_unknown_upload_job(client: TestClient) -> None:
+    assert client.get("/upload/missing").status_code == 404
+
+
+def test_execute_sql_streams_ndjson(client: TestClient) -> None:
+    _upload(client, "people.csv", b"id,name\n1,Ann\n2,Bo\n")
+
+    response = client.post(
+        "/api/execute_sql",
+        json={"sql": "SELECT id, name FROM people ORDER BY id"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [{"id": 1, "name": "Ann"}, {"id": 2, "name": "Bo"}]
+    assert json.loads(response.headers["x-columns"]) == ["id", "name"]
+
+
+def test_execute_sql_streams_arrow(client: TestClient) -> None:
+    pa = pytest.importorskip("pyarrow")
+    _upload(client, "people.csv", b"id,name\n1,Ann\n2,Bo\n")
+
+    response = client.post(
+        "/api/execute_sql",
+        json={"sql": "SELECT id FROM people ORDER BY id"},
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("id").to_pylist() == [1, 2]
+
+
+def test_execute_sql_stream_reports_errors(client: TestClient) -> None:
+    _upload(client, "people.csv", b"id\n1\n")
+
+    response = client.post(
+        "/api/execute_sql",
+        json={"sql": "SELECT missing FROM people"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert "missing" in response.json()["error"]
+
+
+def test_cursor_endpoints_page_results(client: TestClient) -> None:
+    _upload(client, "people.csv", b"id\n1\n2\n3\n")
+
+    first = client.post(
+        "/api/cursors", json={"sql": "SELECT id FROM people ORDER BY id", "page_size": 2}
+    )
+    payload = first.json()
+    assert payload["rows"] == [{"id": 1}, {"id": 2}]
+    assert not payload["done"]
+
+    second = client.get(f"/api/cursors/{payload['cursor_id']}", params={"page_size": 2}).json()
+    assert second["rows"] == [{"id": 3}]
+    assert second["done"]
+    assert second["cursor_id"] is None
+    assert client.delete(f"/api/cursors/{payload['cursor_id']}").status_code == 404
+
+
+def test_cursor_endpoints_validate_page_size_and_follow_datasets(client: TestClient) -> None:
+    dataset_id = _upload(client, "people.csv", b"id\n1\n2\n3\n").json()["dataset_id"]
+
+    rejected = client.post("/api/cursors", json={"sql": "SELECT id FROM people", "page_size": 0})
+    assert rejected.status_code == 422
+    page = client.post(
+        "/api/cursors", json={"sql": "SELECT id FROM people", "page_size": 1}
+    ).json()
+    cursor_url = f"/api/cursors/{page['cursor_id']}"
+    assert client.get(cursor_url, params={"page_size": 0}).status_code == 422
+
+    assert client.delete(f"/datasets/{dataset_id}").status_code == 200
+    assert client.get(cursor_url).status_code == 404
+
+
+def test_query_reports_trace_and_metrics(client: TestClient, monkeypatch) -> None:
+    _upload(client, "people.csv", b"id,name\n1,Ann\n2,Bo\n")
+    batcher = server.MicroBatcher(lambda prompt: "SELECT COUNT(*) AS people FROM people")
+    monkeypatch.setattr(server.state, "local_generator", batcher)
+    monkeypatch.setattr(server.state, "generator", None)
+    monkeypatch.setattr(server, "metrics", server.AgentMetrics())
+
+    response = client.post(
+        "/query", json={"question": "How many people?", "model_type": "local"}
+    ).json()
+
+    assert response["rows"] == [{"people": 2}]
+    assert {"generation", "validation", "execution", "answer"} <= set(
+        response["trace"]["stages"]
+    )
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert 'text2sql_stage_duration_seconds_count{stage="generation"} 1' in metrics.text
+    assert 'text2sql_requests_total{outcome="success"} 1' in metrics.text
+    assert 'text2sql_in_flight_requests{endpoint="query"} 0' in metrics.text
+    batcher.close()
+
+
+def test_failed_queries_report_their_attempts(client: TestClient, monkeypatch) -> None:
+    _upload(client, "people.csv", b"id,name\n1,Ann\n2,Bo\n")
+    batcher = server.MicroBatcher(lambda prompt: "SELECT nope FROM people")
+    monkeypatch.setattr(server.state, "local_generator", batcher)
+    monkeypatch.setattr(server.state, "generator", None)
+    monkeypatch.setattr(server, "metrics", server.AgentMetrics())
+    monkeypatch.setattr(server, "QUERY_CANDIDATES", 1)
+
+    response = client.post(
+        "/query", json={"question": "Who is the oldest person?", "model_type": "local"}
+    ).json()
+
+    assert response["error"]
+    assert response["attempts"] == 3
+    metrics = client.get("/metrics").text
+    assert "text2sql_retries_total 2" in metrics
+    assert 'text2sql_requests_total{outcome="error"} 1' in metrics
+    batcher.close()
+
+
+def test_lifespan_preloads_the_local_model(monkeypatch) -> None:
+    built = []
+
+    class FakeModel:
+        def __init__(self, **kwargs) -> None:
+            built.append(kwargs)
+
+        def __call__(self, prompt: str) -> str:
+            return "SELECT 1"
+
+    monkeypatch.setattr(server, "PRELOAD_LOCAL_MODEL", True)
+    monkeypatch.setattr(server, "TransformersSQLGenerator", FakeModel)
+    monkeypatch.setattr(server.state, "local_generator", None)
+
+    with TestClient(server.app):
+        assert len(built) == 1
+        assert built[0]["warmup"] is True
+        assert built[0]["num_beams"] == server.LOCAL_NUM_BEAMS
+        assert isinstance(server.state.local_generator, server.MicroBatcher)
+    server.state.local_generator.close()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from text2sql_agent.database import IngestOptions, load_database
+from text2sql_agent.schema import extract_schema
+from text2sql_agent.sessions import Dataset, DatasetRegistry
+
+
+def _dataset(tmp_path: Path, name: str, rows: int = 200_000) -> Dataset:
+    csv_path = tmp_path / f"{name}.csv"
+    pd.DataFrame({"id": range(rows), "label": [f"row-{i}" for i in range(rows)]}).to_csv(
+        csv_path, index=False
+    )
+    context = load_database(csv_path, IngestOptions(mode="table"))
+    return Dataset(id=name, name=csv_path.name, context=context, schema=extract_schema(context))
+
+
+def test_registry_spills_least_recently_used(tmp_path: Path) -> None:
+    registry = DatasetRegistry(memory_budget=1, spill_dir=tmp_path / "spill")
+    first = _dataset(tmp_path, "first")
+    registry.add(first)
+
+    released = registry.add(_dataset(tmp_path, "second"))
+
+    assert released == ["first"]
+    assert registry.get("first").spilled
+    assert not registry.get("second").spilled
+    count = first.context.cursor().execute("SELECT COUNT(*) FROM first").fetchone()[0]
+    assert count == 200_000
+    assert (tmp_path / "spill" / "first.duckdb").exists()
+
+    registry.remove("first")
+    assert not (tmp_path / "spill" / "first.duckdb").exists()
+
+
+def test_registry_closes_datasets_without_spill_dir(tmp_path: Path) -> None:
+    registry = DatasetRegistry(memory_budget=1)
+    registry.add(_dataset(tmp_path, "first"))
+    registry.add(_dataset(tmp_path, "second"))
+
+    assert "first" not in registry
+    with pytest.raises(KeyError):
+        registry.get("first")
+    assert registry.get("second").memory_bytes > 0
+
+
+def test_registry_keeps_datasets_within_budget(tmp_path: Path) -> None:
+    registry = DatasetRegistry()
+    registry.add(_dataset(tmp_path, "first", rows=10))
+    registry.add(_dataset(tmp_path, "second", rows=10))
+
+    registry.get("first")
+    assert [dataset.id for dataset in registry.datasets()] == ["second", "first"]
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import json
+
+import duckdb
+import pytest
+
+from text2sql_agent.database import DatabaseContext
+from text2sql_agent.streaming import ResultStream
+
+
+def _context() -> DatabaseContext:
+    connection = duckdb.connect()
+    connection.execute(
+        "CREATE TABLE events AS SELECT range AS id, range / 2 AS half FROM range(2500)"
+    )
+    return DatabaseContext(connection=connection, tables=[])
+
+
+def test_ndjson_is_emitted_in_batches() -> None:
+    stream = ResultStream(_context(), "SELECT id FROM events ORDER BY id", batch_size=1000)
+    chunks = list(stream.ndjson())
+
+    assert len(chunks) == 3
+    rows = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+    assert rows[0] == {"id": 0}
+    assert len(rows) == 2500
+
+
+def test_arrow_ipc_round_trips() -> None:
+    pa = pytest.importorskip("pyarrow")
+    stream = ResultStream(_context(), "SELECT * FROM events", batch_size=1000)
+
+    table = pa.ipc.open_stream(b"".join(stream.arrow_ipc())).read_all()
+    assert table.num_rows == 2500
+    assert table.column_names == ["id", "half"]
+
+
+def test_errors_surface_before_streaming() -> None:
+    with pytest.raises(duckdb.Error):
+        ResultStream(_context(), "SELECT nope FROM events")
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import duckdb
+
+from text2sql_agent.schema import TableSchema
+from text2sql_agent.validation import check_plan, check_schema, validate_sql
+
+SCHEMA = {
+    "main.orders": TableSchema(
+        columns=["order_id", "customer_id", "amount"],
+        sample_rows=[],
+        column_types={"order_id": "INTEGER", "customer_id": "INTEGER", "amount": "DOUBLE"},
+    ),
+    "main.customers": TableSchema(columns=["customer_id", "name"], sample_rows=[]),
+}
+
+
+def test_unknown_table_suggests_close_match() -> None:
+    assert validate_sql("SELECT * FROM ordrs", SCHEMA) == (
+        False,
+        "Unknown table 'ordrs'. Did you mean: orders?",
+    )
+
+
+def test_unknown_column_suggests_close_match_and_other_tables() -> None:
+    [issue] = check_schema(
+        "SELECT o.amout FROM orders o JOIN customers c USING (customer_id)", SCHEMA
+    )
+    assert (issue.kind, issue.suggestions) == ("column", ("amount",))
+
+    [issue] = check_schema("SELECT name FROM orders", SCHEMA)
+    assert issue.elsewhere == ("customers",)
+
+
+def test_ambiguous_column_is_reported() -> None:
+    [issue] = check_schema("SELECT customer_id FROM orders, customers", SCHEMA)
+    assert issue.kind == "ambiguous"
+    assert set(issue.suggestions) == {"orders", "customers"}
+
+
+def test_valid_queries_pass_schema_checks() -> None:
+    for sql in (
+        "SELECT amount AS a FROM orders ORDER BY a",
+        "WITH big AS (SELECT * FROM orders WHERE amount > 10) SELECT customer_id FROM big",
+        "SELECT c.name, SUM(o.amount) FROM orders o JOIN customers c "
+        "ON o.customer_id = c.customer_id GROUP BY c.name",
+        "SELECT * FROM range(3)",
+    ):
+        assert validate_sql(sql, SCHEMA) == (True, None), sql
+
+
+def test_check_plan_rejects_large_cartesian_products() -> None:
+    connection = duckdb.connect()
+    connection.execute("CREATE TABLE events AS SELECT range AS id FROM range(5000)")
+
+    message = check_plan(connection, "SELECT COUNT(*) FROM events a, events b", 1_000_000)
+    assert message is not None and "cartesian" in message
+    assert check_plan(connection, "SELECT * FROM events a JOIN events b USING (id)") is None
+    assert check_plan(
+        connection, "SELECT * FROM events, (SELECT MAX(id) AS top FROM events)", 1_000_000
+    ) is None
+    assert "not found" in check_plan(connection, "SELECT missing FROM events")
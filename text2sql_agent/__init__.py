@@ -5,26 +5,59 @@ extract schemas and generate SQL queries for natural language
 questions.
 """
 
-from .database import DatabaseContext, TableReference, load_database
+from .database import (
+    DatabaseContext,
+    EngineSettings,
+    IngestOptions,
+    TableReference,
+    load_database,
+)
 from .schema import TableSchema, extract_schema
-from .generator import TransformersSQLGenerator, format_schema, generate_sql
+from .retrieval import SchemaIndex
+from .prompts import PromptTemplate, build_prompt
+from .generator import (
+    AsyncOpenAIGenerator,
+    TransformersSQLGenerator,
+    format_schema,
+    generate_sql,
+)
 from .validation import validate_sql
-from .execution import execute_sql
+from .execution import (
+    QueryLimits,
+    QueryPreview,
+    QueryTimeoutError,
+    execute_preview,
+    execute_sql,
+)
 from .answers import answer_from_results
-from .agent import AgentResponse, agent_loop
+from .agent import AgentError, AgentResponse, agent_loop, async_agent_loop
+from .tracing import Trace
 
 __all__ = [
     "DatabaseContext",
+    "EngineSettings",
+    "IngestOptions",
     "TableReference",
     "TableSchema",
+    "SchemaIndex",
+    "PromptTemplate",
     "TransformersSQLGenerator",
+    "AsyncOpenAIGenerator",
     "AgentResponse",
+    "AgentError",
+    "Trace",
     "load_database",
     "extract_schema",
     "format_schema",
+    "build_prompt",
     "generate_sql",
     "validate_sql",
     "execute_sql",
+    "execute_preview",
+    "QueryPreview",
+    "QueryLimits",
+    "QueryTimeoutError",
     "answer_from_results",
     "agent_loop",
+    "async_agent_loop",
 ]
@@ -1,14 +1,59 @@
 from __future__ import annotations
 
+import asyncio
+import dataclasses
+import functools
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
-from typing import Callable, List, Mapping, Optional
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import duckdb
+import pandas as pd
 
 from .answers import answer_from_results
+from .caches import QuestionCache
 from .database import DatabaseContext
-from .execution import execute_sql
-from .generator import generate_sql
+from .examples import Example, ExampleStore
+from .execution import QueryLimits, QueryTimeoutError, execute_preview, execute_sql
+from .generator import complete_candidates, complete_sql
+from .parsing import parse_query
+from .prompts import PromptTemplate, estimate_tokens
+from .retrieval import SchemaIndex
 from .schema import TableSchema
-from .validation import validate_sql
+from .tracing import NULL_TRACE, Trace
+from .validation import check_plan, validate_sql
+
+
+SELECTION_MODES = ("first", "vote")
+
+T = TypeVar("T")
+
+
+class AgentError(RuntimeError):
+    """Raised when no generated query could be executed.
+
+    ``attempts`` is how many attempts (or candidate rounds) were used and
+    ``errors`` holds the error fed back after each of them.
+    """
+
+    def __init__(self, message: str, attempts: int, errors: Sequence[str]) -> None:
+        super().__init__(message)
+        self.attempts = attempts
+        self.errors = list(errors)
 
 
 @dataclass
@@ -20,6 +65,11 @@ class AgentResponse:
     rows: List[dict]
     attempts: int
     error_messages: List[str] = field(default_factory=list)
+    prompt_tokens: int = 0
+    cache_hit: bool = False
+    row_count: Optional[int] = None
+    dataframe: Optional[pd.DataFrame] = field(default=None, repr=False)
+    trace: Optional[Trace] = field(default=None, repr=False)
 
     def to_dict(self) -> dict:
         return {
@@ -28,6 +78,10 @@ class AgentResponse:
             "rows": self.rows,
             "attempts": self.attempts,
             "errors": self.error_messages,
+            "prompt_tokens": self.prompt_tokens,
+            "cache_hit": self.cache_hit,
+            "row_count": self.row_count,
+            "trace": self.trace.to_dict() if self.trace is not None else None,
         }
 
 
@@ -37,35 +91,491 @@ def agent_loop(
     context: DatabaseContext,
     generator: Callable[[str], str],
     max_retries: int = 3,
+    schema_index: Optional[SchemaIndex] = None,
+    top_k: int = 5,
+    token_budget: Optional[int] = None,
+    prompt_template: Optional[PromptTemplate] = None,
+    question_cache: Optional[QuestionCache] = None,
+    materialize: bool = False,
+    candidates: int = 1,
+    time_budget: Optional[float] = None,
+    selection: str = "first",
+    trace: Optional[Trace] = None,
+    example_store: Optional[ExampleStore] = None,
+    num_examples: int = 3,
+    query_executor: Optional[Executor] = None,
 ) -> AgentResponse:
-    """Generate, validate and execute SQL with retry logic."""
+    """Generate, validate and execute SQL with retry logic.
+
+    When a ``schema_index`` is given, prompts only describe the ``top_k``
+    tables relevant to the question (and the tables they join to), capped at
+    ``token_budget`` estimated tokens. A precompiled ``prompt_template``
+    takes precedence over those options and is reused across questions.
+
+    With a ``question_cache``, SQL that previously answered the same
+    (normalized) question against the same schema version is executed
+    without calling the generator; only SQL that validated and executed is
+    stored.
+
+    Only the preview rows and a row count are fetched from DuckDB unless
+    ``materialize`` is set, in which case the full result is returned as
+    ``AgentResponse.dataframe``.
+
+    With ``candidates`` above one, each round asks the generator for that
+    many queries at once, validates them all and executes the valid ones
+    concurrently; ``selection`` is ``"first"`` (first success wins) or
+    ``"vote"`` (the most common result wins). Rounds then continue until
+    ``time_budget`` seconds have passed instead of for ``max_retries``.
+
+    With an ``example_store``, up to ``num_examples`` earlier questions
+    similar to this one are shown in the prompt with their working SQL, and
+    the answered question is added to the store.
+
+    Pass a :class:`~text2sql_agent.tracing.Trace` to time each stage
+    (prompt, generation, validation, execution, answer formatting); it is
+    finished when the loop returns or fails and attached to the response.
+
+    With a ``query_executor``, validation and execution are submitted to it
+    and waited for, so a bounded pool limits concurrent DuckDB work while
+    the calling thread is free to wait on generation.
+    """
+
+    if selection not in SELECTION_MODES:
+        raise ValueError(
+            f"Unsupported selection: {selection!r}. "
+            f"Expected one of {', '.join(SELECTION_MODES)}."
+        )
+
+    template = prompt_template or PromptTemplate(
+        schema, index=schema_index, top_k=top_k, token_budget=token_budget
+    )
+    # A cursor of our own lets concurrent agent loops share the context.
+    connection = context.cursor()
+    try:
+        response = _run_agent(
+            question,
+            context,
+            connection,
+            generator,
+            template,
+            max_retries,
+            question_cache,
+            materialize,
+            candidates,
+            time_budget,
+            selection,
+            trace or NULL_TRACE,
+            example_store,
+            num_examples,
+            query_executor,
+        )
+    finally:
+        connection.close()
+        if trace is not None:
+            trace.finish()
+    response.trace = trace
+    return response
+
+
+class _BlockingGenerator:
+    """Lets synchronous code in a worker thread call an async generator.
+
+    Each call is scheduled on the event loop that owns the generator, so its
+    connection pool and concurrency limits keep working.
+    """
+
+    def __init__(
+        self, generator: Callable[[str], Awaitable[str]], loop: asyncio.AbstractEventLoop
+    ) -> None:
+        self.generator = generator
+        self.loop = loop
+
+    def __call__(self, prompt: str) -> str:
+        return asyncio.run_coroutine_threadsafe(self.generator(prompt), self.loop).result()
+
+    def candidates(self, prompt: str, n: int) -> List[str]:
+        candidates = getattr(self.generator, "candidates", None)
+        if callable(candidates):
+            coroutine = candidates(prompt, n)
+        else:
+            coroutine = asyncio.gather(*(self.generator(prompt) for _ in range(n)))
+        return list(asyncio.run_coroutine_threadsafe(coroutine, self.loop).result())
+
+    def count_tokens(self, prompt: str) -> int:
+        counter = getattr(self.generator, "count_tokens", None)
+        return counter(prompt) if callable(counter) else estimate_tokens(prompt)
+
+
+async def async_agent_loop(
+    question: str,
+    schema: Mapping[str, TableSchema],
+    context: DatabaseContext,
+    generator: Callable[[str], Awaitable[str]],
+    executor: Optional[Executor] = None,
+    **options: Any,
+) -> AgentResponse:
+    """Awaitable counterpart of :func:`agent_loop` for async generators.
+
+    Validation and DuckDB execution run in a worker thread while generation
+    is awaited on the calling event loop, so the loop is never blocked.
+    The worker thread comes from ``executor`` (the loop's default executor
+    when omitted). ``options`` are passed through to :func:`agent_loop`.
+    """
+
+    loop = asyncio.get_running_loop()
+    bridge = _BlockingGenerator(generator, loop)
+    return await loop.run_in_executor(
+        executor,
+        functools.partial(agent_loop, question, schema, context, bridge, **options),
+    )
+
+
+def _run_agent(
+    question: str,
+    context: DatabaseContext,
+    connection: duckdb.DuckDBPyConnection,
+    generator: Callable[[str], str],
+    template: PromptTemplate,
+    max_retries: int,
+    question_cache: Optional[QuestionCache],
+    materialize: bool,
+    candidates: int,
+    time_budget: Optional[float],
+    selection: str,
+    trace: Trace,
+    example_store: Optional[ExampleStore],
+    num_examples: int,
+    query_executor: Optional[Executor],
+) -> AgentResponse:
+    if question_cache is not None:
+        with trace.span("cache_lookup"):
+            cached_sql = question_cache.get(question, template.version)
+        if cached_sql is not None:
+            try:
+                response = _run_on(
+                    query_executor,
+                    functools.partial(
+                        _execute, connection, context, cached_sql, materialize, trace=trace
+                    ),
+                )
+            except Exception:
+                # The data no longer supports the cached query; regenerate.
+                question_cache.invalidate(question, template.version)
+            else:
+                response.attempts = 0
+                response.cache_hit = True
+                return response
+
+    examples: List[Example] = []
+    if example_store is not None:
+        with trace.span("examples"):
+            examples = example_store.search(question, template.fingerprint, num_examples)
+
+    if candidates > 1:
+        response = _run_candidates(
+            question,
+            context,
+            generator,
+            template,
+            max_retries,
+            question_cache,
+            materialize,
+            candidates,
+            time_budget,
+            selection,
+            trace,
+            examples,
+            example_store,
+            query_executor,
+        )
+        _remember_example(example_store, question, template, response, examples)
+        return response
 
     errors: List[str] = []
     last_error: Optional[str] = None
+    prompt_tokens = 0
     for attempt in range(1, max_retries + 1):
-        sql = generate_sql(question, schema, generator, error=last_error)
-        is_valid, validation_error = validate_sql(sql)
-        if not is_valid:
-            last_error = f"Validation failed: {validation_error}"
+        with trace.span("prompt"):
+            prompt = template.render(question, error=last_error, examples=examples)
+            prompt_tokens = template.token_count(prompt, generator)
+        with trace.span("generation"):
+            sql = complete_sql(prompt, generator)
+        response, last_error = _run_on(
+            query_executor,
+            functools.partial(
+                _try_candidate,
+                connection,
+                context,
+                template,
+                sql,
+                materialize,
+                context.limits,
+                trace,
+            ),
+        )
+        if response is None:
             errors.append(last_error)
             continue
-        try:
-            results = execute_sql(context.connection, sql)
-        except Exception as exc:  # pragma: no cover - exercised in integration tests
-            last_error = f"Execution failed: {exc}"
+
+        if question_cache is not None:
+            question_cache.put(question, template.version, sql)
+        response.attempts = attempt
+        response.error_messages = errors
+        response.prompt_tokens = prompt_tokens
+        _remember_example(example_store, question, template, response, examples)
+        return response
+
+    if example_store is not None:
+        example_store.record(max_retries, bool(examples))
+    raise AgentError(
+        "Failed to produce an executable SQL query after "
+        f"{max_retries} attempt{'s' if max_retries != 1 else ''}.",
+        attempts=max_retries,
+        errors=errors,
+    )
+
+
+def _run_on(executor: Optional[Executor], func: Callable[[], T]) -> T:
+    """Call ``func`` on ``executor`` and wait for its result, or inline without one."""
+
+    if executor is None:
+        return func()
+    return executor.submit(func).result()
+
+
+def _remember_example(
+    example_store: Optional[ExampleStore],
+    question: str,
+    template: PromptTemplate,
+    response: AgentResponse,
+    examples: Sequence[Example],
+) -> None:
+    if example_store is not None:
+        example_store.add(question, response.sql, template.fingerprint)
+        example_store.record(response.attempts, bool(examples))
+
+
+def _try_candidate(
+    connection: duckdb.DuckDBPyConnection,
+    context: DatabaseContext,
+    template: PromptTemplate,
+    sql: str,
+    materialize: bool,
+    limits: QueryLimits,
+    trace: Trace = NULL_TRACE,
+) -> Tuple[Optional[AgentResponse], Optional[str]]:
+    """Validate and execute one candidate, returning its response or an error."""
+
+    with trace.span("validation"):
+        # Parsed once here; validation, LIMIT injection and result cache keys
+        # all reuse this tree through the parse cache.
+        is_valid, validation_error = validate_sql(parse_query(sql), template.schema)
+        if is_valid and limits.max_cartesian_rows is not None:
+            with context.query_lock.shared():
+                validation_error = check_plan(connection, sql, limits.max_cartesian_rows)
+            is_valid = validation_error is None
+    if not is_valid:
+        return None, f"Validation failed: {validation_error}"
+    try:
+        return _execute(connection, context, sql, materialize, limits, trace), None
+    except QueryTimeoutError as exc:
+        return None, (
+            f"Execution timed out: {exc} The query is too slow; add filters, "
+            "avoid cross joins and aggregate before joining."
+        )
+    except Exception as exc:  # pragma: no cover - exercised in integration tests
+        return None, f"Execution failed: {exc}"
+
+
+def _result_signature(response: AgentResponse) -> Tuple[Optional[int], str]:
+    return response.row_count, repr([sorted(row.items()) for row in response.rows])
+
+
+def _run_candidates(
+    question: str,
+    context: DatabaseContext,
+    generator: Callable[[str], str],
+    template: PromptTemplate,
+    max_retries: int,
+    question_cache: Optional[QuestionCache],
+    materialize: bool,
+    candidates: int,
+    time_budget: Optional[float],
+    selection: str,
+    trace: Trace = NULL_TRACE,
+    examples: Sequence[Example] = (),
+    example_store: Optional[ExampleStore] = None,
+    query_executor: Optional[Executor] = None,
+) -> AgentResponse:
+    """Generate ``candidates`` queries per round and execute the valid ones in parallel.
+
+    Rounds repeat, with the failures fed back into the prompt, until a
+    candidate succeeds and either ``time_budget`` seconds have passed or,
+    without a budget, ``max_retries`` rounds have run.
+    """
+
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    errors: List[str] = []
+    last_error: Optional[str] = None
+    prompt_tokens = 0
+    attempt = 0
+    while True:
+        attempt += 1
+        if deadline is None and attempt > max_retries:
+            break
+        if deadline is not None and attempt > 1 and time.monotonic() >= deadline:
+            break
+        with trace.span("prompt"):
+            prompt = template.render(question, error=last_error, examples=examples)
+            prompt_tokens = template.token_count(prompt, generator)
+        with trace.span("generation"):
+            sqls = complete_candidates(prompt, generator, candidates)
+
+        limits = context.limits
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0.001)
+            timeout = min(limits.timeout, remaining) if limits.timeout else remaining
+            limits = dataclasses.replace(limits, timeout=timeout)
+        response, round_errors = _race_candidates(
+            context, template, sqls, materialize, limits, selection, trace, query_executor
+        )
+        if response is None:
+            last_error = "; ".join(dict.fromkeys(round_errors)) or "No SQL was generated."
             errors.append(last_error)
             continue
 
-        payload = answer_from_results(sql, results)
-        return AgentResponse(
-            sql=payload["sql"],
-            answer=payload["answer"],
-            rows=payload["rows"],
-            attempts=attempt,
-            error_messages=errors,
-        )
+        if question_cache is not None:
+            question_cache.put(question, template.version, response.sql)
+        response.attempts = attempt
+        response.error_messages = errors
+        response.prompt_tokens = prompt_tokens
+        return response
 
-    raise RuntimeError(
+    if example_store is not None:
+        example_store.record(attempt - 1, bool(examples))
+    raise AgentError(
         "Failed to produce an executable SQL query after "
-        f"{max_retries} attempt{'s' if max_retries != 1 else ''}."
+        f"{attempt - 1} round{'s' if attempt != 2 else ''} of {candidates} candidates.",
+        attempts=attempt - 1,
+        errors=errors,
+    )
+
+
+def _race_candidates(
+    context: DatabaseContext,
+    template: PromptTemplate,
+    sqls: Sequence[str],
+    materialize: bool,
+    limits: QueryLimits,
+    selection: str,
+    trace: Trace = NULL_TRACE,
+    query_executor: Optional[Executor] = None,
+) -> Tuple[Optional[AgentResponse], List[str]]:
+    """Run every candidate on its own cursor and pick the answer.
+
+    With ``selection="first"`` the first successful candidate wins and the
+    others are interrupted; with ``"vote"`` all candidates run and the most
+    common result wins, ties going to the earlier candidate.
+    """
+
+    if not sqls:
+        return None, []
+    running: Dict[int, duckdb.DuckDBPyConnection] = {}
+    lock = threading.Lock()
+    stopped = threading.Event()
+
+    def run(index: int, sql: str) -> Tuple[Optional[AgentResponse], Optional[str]]:
+        if stopped.is_set():
+            return None, None
+        cursor = context.cursor()
+        with lock:
+            running[index] = cursor
+        try:
+            return _run_on(
+                query_executor,
+                functools.partial(
+                    _try_candidate, cursor, context, template, sql, materialize, limits, trace
+                ),
+            )
+        finally:
+            with lock:
+                running.pop(index, None)
+            cursor.close()
+
+    responses: Dict[int, AgentResponse] = {}
+    errors: List[str] = []
+    pool = ThreadPoolExecutor(max_workers=len(sqls), thread_name_prefix="candidate")
+    try:
+        futures = {pool.submit(run, index, sql): index for index, sql in enumerate(sqls)}
+        for future in as_completed(futures):
+            response, error = future.result()
+            if response is None:
+                if error is not None:
+                    errors.append(error)
+                continue
+            responses[futures[future]] = response
+            if selection == "first":
+                # Stop the losing candidates instead of waiting for them.
+                stopped.set()
+                with lock:
+                    for cursor in running.values():
+                        cursor.interrupt()
+                break
+    finally:
+        pool.shutdown(wait=not stopped.is_set(), cancel_futures=True)
+
+    if not responses:
+        return None, errors
+    if selection == "first":
+        return next(iter(responses.values())), errors
+    votes = Counter(_result_signature(response) for response in responses.values())
+    winner = max(
+        sorted(responses),
+        key=lambda index: votes[_result_signature(responses[index])],
+    )
+    return responses[winner], errors
+
+
+def _execute(
+    connection: duckdb.DuckDBPyConnection,
+    context: DatabaseContext,
+    sql: str,
+    materialize: bool,
+    limits: Optional[QueryLimits] = None,
+    trace: Trace = NULL_TRACE,
+) -> AgentResponse:
+    """Run ``sql`` and format the answer, fetching only a preview by default."""
+
+    if materialize:
+        with trace.span("execution"), context.query_lock.shared():
+            results = execute_sql(
+                connection,
+                sql,
+                cache=context.result_cache,
+                data_version=context.data_key,
+                limits=limits or context.limits,
+            )
+        total_rows = len(results)
+        with trace.span("answer"):
+            payload = answer_from_results(sql, results)
+    else:
+        with trace.span("execution"), context.query_lock.shared():
+            preview = execute_preview(
+                connection,
+                sql,
+                cache=context.result_cache,
+                data_version=context.data_key,
+                limits=limits or context.limits,
+            )
+        results = None
+        total_rows = preview.total_rows
+        with trace.span("answer"):
+            payload = answer_from_results(sql, preview.rows, total_rows=total_rows)
+    return AgentResponse(
+        sql=payload["sql"],
+        answer=payload["answer"],
+        rows=payload["rows"],
+        attempts=0,
+        row_count=total_rows,
+        dataframe=results,
     )
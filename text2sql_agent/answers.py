@@ -1,16 +1,24 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import pandas as pd
 
 
 def answer_from_results(
-    query: str, results: pd.DataFrame, preview_rows: int = 5
+    query: str,
+    results: pd.DataFrame,
+    preview_rows: int = 5,
+    total_rows: Optional[int] = None,
 ) -> Dict[str, object]:
-    """Format the SQL query results into a simple natural language answer."""
+    """Format the SQL query results into a simple natural language answer.
 
-    total_rows = len(results)
+    ``results`` may hold only the first rows of the result, in which case
+    ``total_rows`` gives the full row count.
+    """
+
+    if total_rows is None:
+        total_rows = len(results)
     if total_rows == 0:
         summary = "The query returned 0 rows."
         preview_records: List[dict] = []
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import csv
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set
+
+from .agent import agent_loop
+from .database import DatabaseContext
+from .schema import TableSchema
+
+
+@dataclass(frozen=True)
+class BatchQuestion:
+    """One question of a batch; ``metadata`` keeps the other input fields."""
+
+    id: str
+    question: str
+    metadata: Mapping[str, Any] = field(default_factory=dict)
+
+
+def _from_record(record: Mapping[str, Any], line: int) -> BatchQuestion:
+    question = record.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise ValueError(f"Line {line}: missing 'question'")
+    identifier = record.get("id")
+    metadata = {key: value for key, value in record.items() if key not in {"id", "question"}}
+    return BatchQuestion(
+        id=str(identifier) if identifier not in (None, "") else str(line),
+        question=question.strip(),
+        metadata=metadata,
+    )
+
+
+def read_questions(path: str | Path) -> Iterator[BatchQuestion]:
+    """Yield the questions of a JSONL or CSV file.
+
+    Each JSONL line (or CSV row) needs a ``question`` and may carry an
+    ``id``; questions without one are numbered by their line. Other fields,
+    such as a reference SQL query, are passed through as metadata.
+    """
+
+    path = Path(path)
+    with path.open(newline="", encoding="utf-8") as handle:
+        if path.suffix.lower() == ".csv":
+            # Line 1 is the header.
+            for line, record in enumerate(csv.DictReader(handle), start=2):
+                yield _from_record(record, line)
+            return
+        for line, text in enumerate(handle, start=1):
+            if text.strip():
+                yield _from_record(json.loads(text), line)
+
+
+def completed_ids(path: str | Path) -> Set[str]:
+    """Return the ids already written to a results file, for resuming.
+
+    A partial last line left by an interrupted run is cut off so appended
+    results start on a fresh line.
+    """
+
+    path = Path(path)
+    if not path.exists():
+        return set()
+    data = path.read_bytes()
+    complete = data[: data.rfind(b"\n") + 1]
+    if len(complete) != len(data):
+        with path.open("r+b") as handle:
+            handle.truncate(len(complete))
+    ids = set()
+    for line in complete.decode("utf-8").splitlines():
+        if line.strip():
+            ids.add(str(json.loads(line)["id"]))
+    return ids
+
+
+@dataclass
+class BatchSummary:
+    """Throughput and outcome totals of a batch run."""
+
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed_seconds: float = 0.0
+    attempts: List[int] = field(default_factory=list, repr=False)
+    latencies: List[float] = field(default_factory=list, repr=False)
+
+    @property
+    def questions_per_second(self) -> float:
+        return self.total / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_seconds": self.elapsed_seconds,
+            "questions_per_second": self.questions_per_second,
+            "mean_attempts": statistics.fmean(self.attempts) if self.attempts else 0.0,
+            "p50_latency_seconds": statistics.median(latencies) if latencies else 0.0,
+            "p95_latency_seconds": (
+                latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+                if latencies
+                else 0.0
+            ),
+        }
+
+
+def _answer(
+    item: BatchQuestion,
+    schema: Mapping[str, TableSchema],
+    context: DatabaseContext,
+    generator: Callable[[str], str],
+    agent_options: Mapping[str, Any],
+) -> Dict[str, Any]:
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"id": item.id, "question": item.question}
+    try:
+        response = agent_loop(item.question, schema, context, generator, **agent_options)
+    except Exception as exc:
+        record["error"] = str(exc)
+    else:
+        record.update(response.to_dict())
+        record["error"] = None
+    record["latency_seconds"] = time.perf_counter() - start
+    if item.metadata:
+        record["metadata"] = dict(item.metadata)
+    return record
+
+
+def run_questions(
+    questions: Iterable[BatchQuestion],
+    schema: Mapping[str, TableSchema],
+    context: DatabaseContext,
+    generator: Callable[[str], str],
+    output: IO[str],
+    workers: int = 4,
+    skip_ids: Optional[Set[str]] = None,
+    **agent_options: Any,
+) -> BatchSummary:
+    """Answer ``questions`` with a pool of ``workers`` and stream JSONL results.
+
+    All workers share ``context`` (each agent loop takes its own cursor) and
+    ``generator``, which should be thread-safe, e.g. a
+    :class:`~text2sql_agent.batching.MicroBatcher`. Results are written to
+    ``output`` in completion order, one flushed line each, so the file
+    doubles as a checkpoint: ids in ``skip_ids`` are not asked again.
+    Questions are read lazily and at most ``2 * workers`` are in flight.
+    """
+
+    skip_ids = skip_ids or set()
+    summary = BatchSummary()
+    start = time.perf_counter()
+
+    # Only the submitting thread writes, so lines never interleave.
+    def record(future: Future) -> None:
+        result = future.result()
+        output.write(json.dumps(result, default=str) + "\n")
+        output.flush()
+        summary.total += 1
+        summary.latencies.append(result["latency_seconds"])
+        if result["error"] is None:
+            summary.succeeded += 1
+            summary.attempts.append(result["attempts"])
+        else:
+            summary.failed += 1
+
+    pending: Set[Future] = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        for item in questions:
+            if item.id in skip_ids:
+                summary.skipped += 1
+                continue
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(future)
+            pending.add(pool.submit(_answer, item, schema, context, generator, agent_options))
+        for future in as_completed(pending):
+            record(future)
+    summary.elapsed_seconds = time.perf_counter() - start
+    return summary
+
+
+def print_summary(summary: BatchSummary, stream: IO[str] = sys.stderr) -> None:
+    stats = summary.to_dict()
+    print(
+        f"Answered {stats['total']} question(s) in {stats['elapsed_seconds']:.1f}s "
+        f"({stats['questions_per_second']:.2f}/s): {stats['succeeded']} succeeded, "
+        f"{stats['failed']} failed, {stats['skipped']} skipped from checkpoint. "
+        f"Mean attempts {stats['mean_attempts']:.2f}, latency p50 "
+        f"{stats['p50_latency_seconds']:.2f}s / p95 {stats['p95_latency_seconds']:.2f}s.",
+        file=stream,
+    )
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from .prompts import estimate_tokens
+
+# A queued prompt: the prompt, when it was queued, the future for its result
+# and, for candidate requests, how many candidates to return.
+_Request = Tuple[str, float, Future, Optional[int]]
+
+
+@dataclass
+class BatchStats:
+    """Running totals describing how requests were batched."""
+
+    batches: int = 0
+    requests: int = 0
+    last_batch_size: int = 0
+    max_batch_size: int = 0
+    total_queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+    @property
+    def average_queue_wait(self) -> float:
+        return self.total_queue_wait / self.requests if self.requests else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "average_batch_size": self.average_batch_size,
+            "average_queue_wait": self.average_queue_wait,
+            "max_queue_wait": self.max_queue_wait,
+        }
+
+
+def run_batch(generator: Any, prompts: Sequence[str]) -> List[str]:
+    """Run ``prompts`` through ``generator.batch`` or, failing that, one by one."""
+
+    batch = getattr(generator, "batch", None)
+    if callable(batch):
+        return list(batch(prompts))
+    return [generator(prompt) for prompt in prompts]
+
+
+class MicroBatcher:
+    """Collects concurrent prompts and runs them through the generator together.
+
+    Calls block the calling thread until their result is ready. A background
+    worker waits at most ``max_wait`` seconds after the first queued prompt
+    for up to ``max_batch_size`` prompts, then runs them as one batch.
+    Candidate requests go through the same worker, so the generator only
+    generates from one thread; :meth:`count_tokens` is answered on the
+    calling thread and relies on the generator counting on a tokenizer of
+    its own, as :class:`~text2sql_agent.generator.TransformersSQLGenerator`
+    does. The batcher is itself a
+    ``Callable[[str], str]`` so it can be passed anywhere a generator is
+    expected.
+    """
+
+    def __init__(
+        self,
+        generator: Callable[[str], str],
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+    ) -> None:
+        self.generator = generator
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = BatchStats()
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._run, name="sql-micro-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def __call__(self, prompt: str) -> str:
+        return self.submit(prompt).result()
+
+    def _enqueue(self, prompt: str, n: Optional[int]) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed.")
+            self._queue.put((prompt, time.perf_counter(), future, n))
+        return future
+
+    def submit(self, prompt: str) -> "Future[str]":
+        """Queue ``prompt`` and return a future for its generated SQL."""
+
+        return self._enqueue(prompt, None)
+
+    def candidates(self, prompt: str, n: int) -> List[str]:
+        """Return ``n`` candidates, from one generator call when it supports it."""
+
+        if callable(getattr(self.generator, "candidates", None)):
+            return list(self._enqueue(prompt, n).result())
+        futures = [self.submit(prompt) for _ in range(n)]
+        return [future.result() for future in futures]
+
+    def count_tokens(self, prompt: str) -> int:
+        counter = getattr(self.generator, "count_tokens", None)
+        return counter(prompt) if callable(counter) else estimate_tokens(prompt)
+
+    def close(self) -> None:
+        """Stop the worker once the queued prompts have been processed.
+
+        Anything the worker did not get to fails with ``RuntimeError``.
+        """
+
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[2].set_exception(RuntimeError("MicroBatcher is closed."))
+
+    def _collect(self) -> Optional[List["_Request"]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the sentinel back so the loop exits after this batch.
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            waits = [started - queued_at for _, queued_at, _, _ in batch]
+            with self._stats_lock:
+                self.stats.batches += 1
+                self.stats.requests += len(batch)
+                self.stats.last_batch_size = len(batch)
+                self.stats.max_batch_size = max(self.stats.max_batch_size, len(batch))
+                self.stats.total_queue_wait += sum(waits)
+                self.stats.max_queue_wait = max(self.stats.max_queue_wait, *waits)
+
+            for prompt, _, future, n in batch:
+                if n is not None:
+                    try:
+                        future.set_result(self.generator.candidates(prompt, n))
+                    except Exception as exc:
+                        future.set_exception(exc)
+            prompts = [item for item in batch if item[3] is None]
+            if not prompts:
+                continue
+            try:
+                results = run_batch(self.generator, [prompt for prompt, _, _, _ in prompts])
+            except Exception as exc:
+                for _, _, future, _ in prompts:
+                    future.set_exception(exc)
+                continue
+            for (_, _, future, _), result in zip(prompts, results):
+                future.set_result(result)
@@ -0,0 +1,445 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import pandas as pd
+
+from .parsing import canonicalize_sql, reads_any
+
+V = TypeVar("V")
+
+DEFAULT_RESULT_CACHE_BYTES = 256 * 1024 * 1024
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for a cache."""
+
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+
+class LRUCache(Generic[V]):
+    """Thread-safe LRU cache with optional TTL and byte budget.
+
+    Entries are evicted least-recently-used first once there are more than
+    ``max_entries`` of them or, when ``sizeof`` is given, once their combined
+    size exceeds ``max_bytes``. Entries older than ``ttl`` seconds are treated
+    as missing.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = 1024,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[V], int]] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.stats = CacheStats()
+        self.total_bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[V, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None:
+                if time.monotonic() - entry[1] > self.ttl:
+                    self._pop(key)
+                    entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: V) -> None:
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, time.monotonic(), size)
+            self.total_bytes += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._entries))
+                self._pop(oldest)
+
+    def count_as_miss(self) -> None:
+        """Count the last hit as a miss, for callers that could not use the entry."""
+        with self._lock:
+            self.stats.hits -= 1
+            self.stats.misses += 1
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove every entry whose key matches ``predicate``."""
+
+        with self._lock:
+            doomed = [key for key in self._entries if predicate(key)]
+            for key in doomed:
+                self._pop(key)
+            return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def items(self) -> List[Tuple[Hashable, V]]:
+        """Return a snapshot of the cached keys and values, oldest first."""
+
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def _pop(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self.total_bytes -= size
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivially different phrasings share a cache key."""
+
+    normalized = _WHITESPACE_RE.sub(" ", question.strip().lower())
+    return normalized.rstrip("?!. ")
+
+
+class QuestionCache(Protocol):
+    """Maps a (question, schema fingerprint) pair to SQL that executed successfully."""
+
+    def get(self, question: str, fingerprint: str) -> Optional[str]:  # pragma: no cover
+        ...
+
+    def put(self, question: str, fingerprint: str, sql: str) -> None:  # pragma: no cover
+        ...
+
+    def invalidate(self, question: str, fingerprint: str) -> None:  # pragma: no cover
+        ...
+
+    def migrate(
+        self, old_fingerprint: str, new_fingerprint: str, tables: Collection[str]
+    ) -> int:  # pragma: no cover
+        """Move entries to a new schema version, dropping SQL that reads ``tables``.
+
+        Returns the number of entries dropped. Optional: caches without it
+        simply stop matching once the schema version changes.
+        """
+        ...
+
+
+class InMemoryQuestionCache:
+    """Question-to-SQL cache held in process memory."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0) -> None:
+        self._cache: LRUCache[str] = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._cache.stats
+
+    def get(self, question: str, fingerprint: str) -> Optional[str]:
+        return self._cache.get((fingerprint, normalize_question(question)))
+
+    def put(self, question: str, fingerprint: str, sql: str) -> None:
+        self._cache.put((fingerprint, normalize_question(question)), sql)
+
+    def invalidate(self, question: str, fingerprint: str) -> None:
+        self._cache.discard((fingerprint, normalize_question(question)))
+
+    def migrate(self, old_fingerprint: str, new_fingerprint: str, tables: Collection[str]) -> int:
+        dropped = 0
+        for key, sql in self._cache.items():
+            if key[0] != old_fingerprint:
+                continue
+            self._cache.discard(key)
+            if reads_any(sql, tables):
+                dropped += 1
+            else:
+                self._cache.put((new_fingerprint, key[1]), sql)
+        return dropped
+
+
+class SQLiteQuestionCache:
+    """Question-to-SQL cache persisted in a SQLite file so it survives restarts."""
+
+    def __init__(
+        self, path: str | Path, ttl: Optional[float] = None, max_entries: int = 100_000
+    ) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS question_cache ("
+            " fingerprint TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " sql TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (fingerprint, question))"
+        )
+        self._connection.commit()
+
+    def get(self, question: str, fingerprint: str) -> Optional[str]:
+        key = (fingerprint, normalize_question(question))
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT sql, created_at FROM question_cache"
+                " WHERE fingerprint = ? AND question = ?",
+                key,
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._connection.execute(
+                    "DELETE FROM question_cache WHERE fingerprint = ? AND question = ?", key
+                )
+                self._connection.commit()
+                row = None
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE question_cache SET last_used = ?"
+                " WHERE fingerprint = ? AND question = ?",
+                (now, *key),
+            )
+            self._connection.commit()
+            self.stats.hits += 1
+            return row[0]
+
+    def put(self, question: str, fingerprint: str, sql: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO question_cache VALUES (?, ?, ?, ?, ?)",
+                (fingerprint, normalize_question(question), sql, now, now),
+            )
+            self._connection.execute(
+                "DELETE FROM question_cache WHERE rowid IN ("
+                " SELECT rowid FROM question_cache ORDER BY last_used DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._connection.commit()
+
+    def invalidate(self, question: str, fingerprint: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM question_cache WHERE fingerprint = ? AND question = ?",
+                (fingerprint, normalize_question(question)),
+            )
+            self._connection.commit()
+
+    def migrate(self, old_fingerprint: str, new_fingerprint: str, tables: Collection[str]) -> int:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT question, sql FROM question_cache WHERE fingerprint = ?",
+                (old_fingerprint,),
+            ).fetchall()
+            stale = [
+                (old_fingerprint, question) for question, sql in rows if reads_any(sql, tables)
+            ]
+            self._connection.executemany(
+                "DELETE FROM question_cache WHERE fingerprint = ? AND question = ?", stale
+            )
+            self._connection.execute(
+                "UPDATE OR REPLACE question_cache SET fingerprint = ? WHERE fingerprint = ?",
+                (new_fingerprint, old_fingerprint),
+            )
+            self._connection.commit()
+        return len(stale)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def _relabel(
+    cached_names: Sequence[Optional[str]],
+    wanted_names: Sequence[Optional[str]],
+    labels: Sequence[str],
+) -> Optional[List[str]]:
+    """Map cached result labels onto the labels the asking query would produce."""
+
+    if len(labels) != len(wanted_names):
+        return list(labels) if not wanted_names and not cached_names else None
+    relabelled = []
+    for label, cached, wanted in zip(labels, cached_names, wanted_names):
+        if wanted is not None:
+            relabelled.append(wanted)
+        elif cached is None:
+            relabelled.append(label)
+        else:
+            # DuckDB's default label for the unaliased projection is unknown.
+            return None
+    return relabelled
+
+
+def _frame_size(frame: pd.DataFrame) -> int:
+    return int(frame.memory_usage(deep=True, index=True).sum())
+
+
+def _records_size(rows: List[dict]) -> int:
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+    return size
+
+
+def _sizeof_result(entry: Tuple[Any, Tuple[Optional[str], ...]]) -> int:
+    value = entry[0]
+    if isinstance(value, tuple):
+        # Previews are stored as (preview frame, total row count).
+        value = value[0]
+    if isinstance(value, pd.DataFrame):
+        return _frame_size(value)
+    return _records_size(value)
+
+
+class ResultCache:
+    """Caches query results by canonical SQL and dataset version.
+
+    DataFrames (agent execution), previews with their total row count and
+    lists of row dictionaries (the SQL compiler endpoint) can be cached;
+    entries are evicted least-recently-used once their estimated size
+    exceeds ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_RESULT_CACHE_BYTES,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self._cache: LRUCache[Tuple[Any, Tuple[Optional[str], ...]]] = LRUCache(
+            max_entries=max_entries, ttl=ttl, max_bytes=max_bytes, sizeof=_sizeof_result
+        )
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._cache.stats
+
+    @property
+    def total_bytes(self) -> int:
+        return self._cache.total_bytes
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get_frame(self, sql: str, data_version: str) -> Optional[pd.DataFrame]:
+        return self._get("frame", sql, data_version)
+
+    def put_frame(self, sql: str, data_version: str, frame: pd.DataFrame) -> None:
+        self._put("frame", sql, data_version, frame)
+
+    def get_preview(
+        self, sql: str, data_version: str, preview_rows: int
+    ) -> Optional[Tuple[pd.DataFrame, int]]:
+        return self._get(f"preview:{preview_rows}", sql, data_version)
+
+    def put_preview(
+        self, sql: str, data_version: str, preview_rows: int, preview: pd.DataFrame, total: int
+    ) -> None:
+        self._put(f"preview:{preview_rows}", sql, data_version, (preview, total))
+
+    def get_records(self, sql: str, data_version: str) -> Optional[List[dict]]:
+        return self._get("records", sql, data_version)
+
+    def put_records(self, sql: str, data_version: str, rows: List[dict]) -> None:
+        self._put("records", sql, data_version, rows)
+
+    def invalidate(self, data_version: Optional[str] = None) -> int:
+        """Drop all entries, or only those computed for ``data_version``."""
+
+        if data_version is None:
+            count = len(self._cache)
+            self._cache.clear()
+            return count
+        return self._cache.discard_where(lambda key: key[1] == data_version)
+
+    def invalidate_tables(self, data_version: str, tables: Collection[str]) -> int:
+        """Drop the entries for ``data_version`` whose query reads one of ``tables``."""
+
+        return self._cache.discard_where(
+            lambda key: key[1] == data_version and reads_any(key[2], tables)
+        )
+
+    def _get(self, kind: str, sql: str, data_version: str) -> Any:
+        canonical = canonicalize_sql(sql)
+        if canonical is None:
+            return None
+        entry = self._cache.get((kind, data_version, canonical.key))
+        if entry is None:
+            return None
+        value, cached_names = entry
+        if cached_names == canonical.output_names:
+            return value
+
+        frame = value[0] if isinstance(value, tuple) else value
+        if isinstance(frame, pd.DataFrame):
+            labels = list(frame.columns)
+        else:
+            labels = list(frame[0]) if frame else []
+        relabelled = _relabel(cached_names, canonical.output_names, labels)
+        if relabelled is None:
+            self._cache.count_as_miss()
+            return None
+        if isinstance(frame, pd.DataFrame):
+            frame = frame.set_axis(relabelled, axis=1)
+        else:
+            frame = [dict(zip(relabelled, row.values())) for row in frame]
+        return (frame, value[1]) if isinstance(value, tuple) else frame
+
+    def _put(self, kind: str, sql: str, data_version: str, value: Any) -> None:
+        canonical = canonicalize_sql(sql)
+        if canonical is None:
+            return
+        self._cache.put((kind, data_version, canonical.key), (value, canonical.output_names))
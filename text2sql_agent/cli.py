@@ -1,29 +1,184 @@
 from __future__ import annotations
 
 import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
-from .agent import agent_loop
-from .database import load_database
-from .generator import TransformersSQLGenerator
+from .agent import SELECTION_MODES, agent_loop
+from .batch import completed_ids, print_summary, read_questions, run_questions
+from .batching import MicroBatcher
+from .caches import SQLiteQuestionCache
+from .database import INGEST_MODES, EngineSettings, IngestOptions, ReattachError, load_database
+from .examples import ExampleStore
+from .execution import QueryLimits
+from .generator import GENERATOR_BACKENDS, TransformersSQLGenerator
+from .ingest_cache import IngestionCache
+from .prompts import PromptTemplate
+from .refresh import refresh_schema
+from .retrieval import SchemaIndex
 from .schema import extract_schema
 
 
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="SQL Question Answering Agent")
-    parser.add_argument("path", type=Path, help="Path to a .db, .csv or .json file")
+    parser.add_argument(
+        "path", type=Path, nargs="?", help="Path to a .db, .csv or .json file"
+    )
     parser.add_argument("--question", type=str, help="Run a single question and exit")
+    parser.add_argument(
+        "--batch",
+        type=Path,
+        help="Answer every question in a JSONL or CSV file and write JSONL results",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Results file for --batch (defaults to stdout)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Questions answered concurrently in --batch mode",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip questions whose results are already in --output and append the rest",
+    )
     parser.add_argument(
         "--model",
         type=str,
         default="mrm8488/t5-base-finetuned-wikiSQL",
         help="HuggingFace model name to use",
     )
+    parser.add_argument(
+        "--backend",
+        choices=GENERATOR_BACKENDS,
+        default="torch",
+        help="Run the model as published, int8-quantized or through ONNX Runtime",
+    )
+    parser.add_argument(
+        "--num-beams",
+        type=int,
+        default=4,
+        help="Beam width for generation; lower is faster",
+    )
+    parser.add_argument(
+        "--ingest-mode",
+        choices=INGEST_MODES,
+        default="auto",
+        help="How CSV/JSON files are loaded: materialized table, lazy view or pandas",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of DuckDB worker threads (defaults to all cores)",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=str,
+        default=None,
+        help="DuckDB memory limit, e.g. '4GB'",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Cancel queries that run longer than this many seconds",
+    )
+    parser.add_argument(
+        "--max-rows",
+        type=int,
+        default=None,
+        help="Cap fully materialized query results at this many rows",
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=5,
+        help="Number of relevant tables to describe in each prompt",
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        default=None,
+        help="Approximate token limit for the schema section of the prompt",
+    )
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=1,
+        help="SQL candidates to generate and execute in parallel per attempt",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="Seconds to keep generating candidate rounds (with --candidates > 1)",
+    )
+    parser.add_argument(
+        "--selection",
+        choices=SELECTION_MODES,
+        default="first",
+        help="Pick the first successful candidate or the most common result",
+    )
+    parser.add_argument(
+        "--question-cache",
+        type=Path,
+        help="SQLite file that remembers SQL for previously answered questions",
+    )
+    parser.add_argument(
+        "--example-store",
+        type=Path,
+        help="SQLite file of answered questions shown to the model as few-shot examples",
+    )
+    parser.add_argument(
+        "--examples",
+        type=int,
+        default=3,
+        help="Number of similar answered questions to include in each prompt",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        help="Directory for the persistent ingestion cache of CSV/JSON files",
+    )
+    parser.add_argument(
+        "--cache-max-bytes",
+        type=int,
+        default=None,
+        help="Size budget for the ingestion cache before LRU eviction",
+    )
+    parser.add_argument(
+        "--watch",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Pick up edits to a SQLite file between questions, checking at most "
+        "once per SECONDS",
+    )
+    parser.add_argument(
+        "--list-cache", action="store_true", help="List cached datasets and exit"
+    )
+    parser.add_argument(
+        "--purge-cache", action="store_true", help="Remove all cached datasets and exit"
+    )
     return parser
 
 
-def interactive_loop(generator, schema, context) -> None:
+def _build_cache(args: argparse.Namespace) -> Optional[IngestionCache]:
+    if args.cache_dir is None:
+        return None
+    if args.cache_max_bytes is None:
+        return IngestionCache(args.cache_dir)
+    return IngestionCache(args.cache_dir, max_bytes=args.cache_max_bytes)
+
+
+def interactive_loop(generator, schema, context, **agent_options) -> None:
     print("Type 'exit' to stop querying.")
     while True:
         question = input("Ask a question: ").strip()
@@ -31,28 +186,133 @@ def interactive_loop(generator, schema, context) -> None:
             continue
         if question.lower() in {"exit", "quit"}:
             break
-        response = agent_loop(question, schema, context, generator)
+        # Pick up edits made to an attached SQLite file since the last question.
+        try:
+            refresh = refresh_schema(
+                context,
+                schema,
+                agent_options.get("prompt_template"),
+                question_cache=agent_options.get("question_cache"),
+                example_store=agent_options.get("example_store"),
+            )
+        except ReattachError as exc:
+            print(f"{exc}. Restart to load the file again.")
+            break
+        if refresh.changed:
+            print(f"Schema refreshed: {', '.join(refresh.tables)}")
+            schema = refresh.schema
+            agent_options["prompt_template"] = refresh.template
+        response = agent_loop(question, schema, context, generator, **agent_options)
         print("SQL query:\n", response.sql)
         print("\nAnswer:\n", response.answer)
 
 
+def run_batch_file(args: argparse.Namespace, generator, schema, context, **agent_options) -> None:
+    # Concurrent workers share one model; their prompts are batched into
+    # forward passes instead of contending for it.
+    batcher = MicroBatcher(generator, max_batch_size=args.workers)
+    skip_ids = completed_ids(args.output) if args.resume else set()
+    output = (
+        args.output.open("a" if args.resume else "w", encoding="utf-8")
+        if args.output is not None
+        else sys.stdout
+    )
+    try:
+        summary = run_questions(
+            read_questions(args.batch),
+            schema,
+            context,
+            batcher,
+            output,
+            workers=args.workers,
+            skip_ids=skip_ids,
+            **agent_options,
+        )
+    finally:
+        batcher.close()
+        if output is not sys.stdout:
+            output.close()
+    print_summary(summary)
+    example_store = agent_options.get("example_store")
+    if example_store is not None:
+        stats = example_store.stats
+        print(
+            f"Few-shot examples found for {stats.hit_rate:.0%} of questions; "
+            f"attempts per question {stats.attempts_per_question_with_examples:.2f} with "
+            f"examples vs {stats.attempts_per_question_without_examples:.2f} without.",
+            file=sys.stderr,
+        )
+
+
 def main(argv: Optional[list[str]] = None) -> None:
     parser = build_parser()
     args = parser.parse_args(argv)
 
-    context = load_database(args.path)
+    cache = _build_cache(args)
+    if args.list_cache or args.purge_cache:
+        if cache is None:
+            parser.error("--list-cache and --purge-cache require --cache-dir")
+        if args.purge_cache:
+            print(f"Removed {cache.purge()} cached dataset(s).")
+        else:
+            for entry in cache.entries():
+                print(f"{entry.key}\t{entry.size}\t{entry.path}")
+        return
+    if args.path is None:
+        parser.error("the following arguments are required: path")
+    if args.resume and (args.batch is None or args.output is None):
+        parser.error("--resume requires --batch and --output")
+
+    # Load the model while the dataset is ingested; both take seconds. A
+    # single question gains nothing from a warm-up pass, interactive use does.
+    loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-load")
+    generator_future = loader.submit(
+        TransformersSQLGenerator,
+        model_name=args.model,
+        num_beams=args.num_beams,
+        backend=args.backend,
+        warmup=not args.question or args.batch is not None,
+    )
+    loader.shutdown(wait=False)
+
+    context = load_database(
+        args.path,
+        IngestOptions(mode=args.ingest_mode),
+        cache=cache,
+        settings=EngineSettings(threads=args.threads, memory_limit=args.memory_limit),
+        watch_interval=args.watch,
+    )
+    context.limits = QueryLimits(timeout=args.timeout, max_rows=args.max_rows)
     schema = extract_schema(context)
+    agent_options = {
+        "prompt_template": PromptTemplate(
+            schema,
+            index=SchemaIndex.build(schema),
+            top_k=args.top_k,
+            token_budget=args.token_budget,
+        ),
+        "candidates": args.candidates,
+        "time_budget": args.time_budget,
+        "selection": args.selection,
+    }
+    if args.question_cache is not None:
+        agent_options["question_cache"] = SQLiteQuestionCache(args.question_cache)
+    if args.example_store is not None:
+        agent_options["example_store"] = ExampleStore(args.example_store)
+        agent_options["num_examples"] = args.examples
     try:
-        generator = TransformersSQLGenerator(model_name=args.model)
+        generator = generator_future.result()
     except ImportError as exc:
         parser.error(str(exc))
 
-    if args.question:
-        response = agent_loop(args.question, schema, context, generator)
+    if args.batch is not None:
+        run_batch_file(args, generator, schema, context, **agent_options)
+    elif args.question:
+        response = agent_loop(args.question, schema, context, generator, **agent_options)
         print("SQL query:\n", response.sql)
         print("\nAnswer:\n", response.answer)
     else:
-        interactive_loop(generator, schema, context)
+        interactive_loop(generator, schema, context, **agent_options)
 
 
 if __name__ == "__main__":  # pragma: no cover - entry point
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import duckdb
+
+from .database import DatabaseContext
+from .execution import limit_query, run_with_timeout
+from .parsing import parse_query
+
+DEFAULT_PAGE_SIZE = 500
+
+
+class CursorLimitError(RuntimeError):
+    """Raised when opening a cursor would exceed the registry's cap."""
+
+
+def _check_page_size(page_size: int) -> None:
+    if page_size < 1:
+        raise ValueError(f"page_size must be at least 1, got {page_size}.")
+
+
+@dataclass
+class Page:
+    """One page of rows read from a server-side cursor.
+
+    ``cursor_id`` is ``None`` on the last page, once the cursor is closed.
+    ``truncated`` is set on the last page when rows beyond the context's
+    ``max_streamed_rows`` were left out.
+    """
+
+    cursor_id: Optional[str]
+    columns: List[str]
+    column_types: List[str]
+    rows: List[dict]
+    offset: int
+    done: bool
+    truncated: bool = False
+
+    def to_dict(self) -> dict:
+        return {
+            "cursor_id": self.cursor_id,
+            "columns": self.columns,
+            "column_types": self.column_types,
+            "rows": self.rows,
+            "offset": self.offset,
+            "done": self.done,
+            "truncated": self.truncated,
+        }
+
+
+@dataclass
+class ServerCursor:
+    """An open DuckDB result that pages are read from on demand.
+
+    The context's query lock is held only while a page is read: the cursor
+    may sit idle between pages for up to the registry's timeout. Re-attaching
+    the context's SQLite file closes the cursor, after which reading raises
+    ``KeyError`` as for any closed cursor.
+    """
+
+    id: str
+    sql: str
+    connection: duckdb.DuckDBPyConnection
+    columns: List[str]
+    column_types: List[str]
+    context: DatabaseContext = field(repr=False)
+    dataset_id: Optional[str] = None
+    max_rows: Optional[int] = None
+    rows_read: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    closed: bool = False
+
+    def read(self, page_size: int) -> Page:
+        _check_page_size(page_size)
+        offset = self.rows_read
+        with self.context.query_lock.shared():
+            if self.closed:
+                raise KeyError(self.id)
+            rows = self.connection.fetchmany(page_size) if self.columns else []
+        # The query is limited to one row past ``max_rows`` to tell a
+        # truncated result from one that fits exactly.
+        truncated = self.max_rows is not None and offset + len(rows) > self.max_rows
+        if truncated:
+            rows = rows[: self.max_rows - offset]
+        self.rows_read += len(rows)
+        self.last_used = time.monotonic()
+        return Page(
+            cursor_id=self.id,
+            columns=self.columns,
+            column_types=self.column_types,
+            rows=[dict(zip(self.columns, row)) for row in rows],
+            offset=offset,
+            done=truncated or len(rows) < page_size,
+            truncated=truncated,
+        )
+
+    def close(self) -> None:
+        self.closed = True
+        self.context.release_result(self)
+        self.connection.close()
+
+
+class CursorRegistry:
+    """Keeps query results open so clients can page through them.
+
+    Executing a query returns its first page and, if more rows remain, a
+    cursor id for fetching later pages. Cursors idle for longer than
+    ``idle_timeout`` seconds are closed, and at most ``max_open`` may be open
+    at once. Cursors opened for a ``dataset_id`` are closed together with
+    that dataset through :meth:`close_dataset`.
+    """
+
+    def __init__(self, max_open: int = 32, idle_timeout: float = 300.0) -> None:
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        # A ``None`` value reserves a slot for a cursor that is still executing.
+        self._cursors: Dict[str, Optional[ServerCursor]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cursors)
+
+    def open(
+        self,
+        context: DatabaseContext,
+        sql: str,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        dataset_id: Optional[str] = None,
+    ) -> Page:
+        """Execute ``sql`` and return its first page.
+
+        Statements that may change the data bump the context's data version.
+        """
+
+        _check_page_size(page_size)
+        self.expire_idle()
+        with self._lock:
+            if len(self._cursors) >= self.max_open:
+                raise CursorLimitError(
+                    f"Too many open cursors ({self.max_open}). "
+                    "Close or finish reading an existing result first."
+                )
+            cursor_id = uuid.uuid4().hex
+            self._cursors[cursor_id] = None
+
+        modifies = parse_query(sql).modifies_data
+        max_rows = context.limits.max_streamed_rows
+        if max_rows is not None:
+            sql = limit_query(sql, max_rows + 1)
+        connection = context.cursor()
+        try:
+            with context.query_lock.shared():
+                run_with_timeout(
+                    connection, lambda: connection.execute(sql), context.limits.timeout
+                )
+        except Exception:
+            connection.close()
+            with self._lock:
+                self._cursors.pop(cursor_id, None)
+            raise
+        finally:
+            if modifies:
+                context.bump_data_version()
+        description = connection.description or []
+        cursor = ServerCursor(
+            id=cursor_id,
+            sql=sql,
+            connection=connection,
+            columns=[column[0] for column in description],
+            column_types=[str(column[1]) for column in description],
+            context=context,
+            dataset_id=dataset_id,
+            max_rows=max_rows,
+        )
+        context.hold_result(cursor)
+        with self._lock:
+            self._cursors[cursor_id] = cursor
+        return self._read(cursor, page_size)
+
+    def fetch(self, cursor_id: str, page_size: int = DEFAULT_PAGE_SIZE) -> Page:
+        """Return the next page of an open cursor.
+
+        Raises ``KeyError`` for unknown, finished or expired cursors.
+        """
+
+        _check_page_size(page_size)
+        self.expire_idle()
+        with self._lock:
+            cursor = self._cursors.get(cursor_id)
+        if cursor is None:
+            raise KeyError(cursor_id)
+        return self._read(cursor, page_size)
+
+    def close(self, cursor_id: str) -> bool:
+        with self._lock:
+            cursor = self._cursors.pop(cursor_id, None)
+        if cursor is None:
+            return False
+        with cursor.lock:
+            cursor.close()
+        return True
+
+    def expire_idle(self) -> int:
+        """Close cursors that have not been read from within ``idle_timeout``."""
+
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            expired = [
+                cursor_id
+                for cursor_id, cursor in self._cursors.items()
+                if cursor is not None and cursor.last_used < cutoff
+            ]
+        return sum(self.close(cursor_id) for cursor_id in expired)
+
+    def close_dataset(self, dataset_id: str) -> int:
+        """Close every cursor opened for ``dataset_id``."""
+
+        with self._lock:
+            cursor_ids = [
+                key
+                for key, cursor in self._cursors.items()
+                if cursor is not None and cursor.dataset_id == dataset_id
+            ]
+        return sum(self.close(cursor_id) for cursor_id in cursor_ids)
+
+    def close_all(self) -> None:
+        with self._lock:
+            cursor_ids = [key for key, cursor in self._cursors.items() if cursor is not None]
+        for cursor_id in cursor_ids:
+            self.close(cursor_id)
+
+    def _read(self, cursor: ServerCursor, page_size: int) -> Page:
+        try:
+            with cursor.lock:
+                page = cursor.read(page_size)
+        except KeyError:
+            self.close(cursor.id)
+            raise
+        if page.done:
+            self.close(cursor.id)
+            page.cursor_id = None
+        return page
@@ -1,12 +1,28 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
 
 import duckdb
 import pandas as pd
 
+from .execution import QueryLimits, limit_query, run_with_timeout
+from .parsing import parse_query
+from .sqlite_watch import SQLiteWatcher
+
+if TYPE_CHECKING:  # pragma: no cover - import only needed for annotations
+    from .caches import ResultCache
+    from .ingest_cache import IngestionCache
+
+INGEST_MODES = ("auto", "view", "table", "pandas")
+
+# Files up to this size are materialized into DuckDB tables by the "auto"
+# mode; anything larger is exposed as a lazy view over the source file.
+DEFAULT_MATERIALIZE_THRESHOLD = 256 * 1024 * 1024
+
 
 @dataclass(frozen=True)
 class TableReference:
@@ -21,64 +37,369 @@ class TableReference:
         return f"{self.schema}.{self.name}" if self.schema else self.name
 
 
+@dataclass(frozen=True)
+class IngestOptions:
+    """Controls how flat files (CSV/JSON) are ingested into DuckDB.
+
+    ``mode`` is one of ``"auto"``, ``"view"``, ``"table"`` or ``"pandas"``.
+    ``"view"`` keeps the file on disk and lets DuckDB's parallel readers scan
+    it on every query, ``"table"`` materializes it once and ``"auto"`` picks
+    between the two using ``materialize_threshold`` (in bytes). ``"pandas"``
+    keeps the legacy behaviour of parsing the file with pandas first.
+    """
+
+    mode: str = "auto"
+    materialize_threshold: int = DEFAULT_MATERIALIZE_THRESHOLD
+    sample_size: int = 20480
+    all_varchar: bool = False
+
+    def __post_init__(self) -> None:
+        if self.mode not in INGEST_MODES:
+            raise ValueError(
+                f"Unsupported ingest mode: {self.mode!r}. "
+                f"Expected one of {', '.join(INGEST_MODES)}."
+            )
+
+    def resolve_mode(self, path: Path) -> str:
+        """Return the concrete ingest mode for ``path``."""
+        if self.mode != "auto":
+            return self.mode
+        return "table" if path.stat().st_size <= self.materialize_threshold else "view"
+
+
+@dataclass(frozen=True)
+class EngineSettings:
+    """DuckDB engine settings applied to every connection a load opens.
+
+    ``threads`` caps the worker threads a single query may use and
+    ``memory_limit`` (e.g. ``"4GB"``) bounds DuckDB's buffer manager. ``None``
+    leaves DuckDB's default, which uses every core and 80% of RAM.
+    """
+
+    threads: Optional[int] = None
+    memory_limit: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if self.threads is not None and self.threads < 1:
+            raise ValueError(f"threads must be at least 1, got {self.threads}.")
+
+    def to_config(self) -> Dict[str, str]:
+        """Return the settings as a ``duckdb.connect`` config mapping."""
+        config: Dict[str, str] = {}
+        if self.threads is not None:
+            config["threads"] = str(self.threads)
+        if self.memory_limit is not None:
+            config["memory_limit"] = self.memory_limit
+        return config
+
+
+class ReattachError(RuntimeError):
+    """Raised when a SQLite file could not be attached again after a change.
+
+    Its tables are dropped from the context, which should be discarded.
+    """
+
+
+class ReadWriteLock:
+    """A lock held by any number of readers at once or by a single writer.
+
+    Writers waiting for the lock keep new readers out, so a steady stream
+    of queries cannot starve them. It is not re-entrant: a thread holding
+    it must not acquire it again.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._condition:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
 @dataclass
 class DatabaseContext:
-    """Holds the DuckDB connection and the registered tables."""
+    """Holds the DuckDB connection and the registered tables.
+
+    ``fingerprint`` identifies the loaded source data (content hash or file
+    path, size and modification time) and is empty for hand-built contexts.
+    ``source_digest`` is the SHA-256 of the loaded file when it is known and
+    nothing outside the connection can change the data; it lets loads of
+    the same content from different paths share cached schemas.
+    ``data_version`` is bumped whenever the data changes underneath the
+    connection; together they form :attr:`data_key`, which keys cached
+    query results. ``limits`` bounds the runtime and size of queries run
+    against the dataset. ``watchers`` track the attached SQLite files by
+    schema alias so their changes can be picked up without reloading.
+
+    ``connection`` is shared and must not be used from several threads at
+    once; concurrent callers should each take their own :meth:`cursor`.
+    Statements run, and rows are fetched, while holding
+    ``query_lock.shared()``, so that :meth:`reattach_sqlite` can take it
+    exclusively and never change the catalog under a running query.
+    Results read across calls, such as streams and server cursors, are
+    registered through :meth:`hold_result` so a re-attach can close them.
+    """
 
     connection: duckdb.DuckDBPyConnection
     tables: List[TableReference]
+    fingerprint: str = ""
+    source_digest: str = ""
+    data_version: int = 0
+    result_cache: Optional["ResultCache"] = None
+    settings: EngineSettings = field(default_factory=EngineSettings)
+    limits: QueryLimits = field(default_factory=QueryLimits)
+    watchers: Dict[str, SQLiteWatcher] = field(default_factory=dict)
+    query_lock: ReadWriteLock = field(
+        default_factory=ReadWriteLock, init=False, repr=False, compare=False
+    )
+    _open_results: Dict[int, Any] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _results_lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """Return a new cursor over the same database for use by one thread.
+
+        Cursors share the database and its catalog but have their own
+        transaction state, so queries on different cursors run in parallel.
+        """
+        return self.connection.cursor()
+
+    @property
+    def data_key(self) -> str:
+        """Identify the current state of the data for result caching."""
+        return f"{self.fingerprint or id(self)}:{self.data_version}"
+
+    def memory_usage(self) -> int:
+        """Return the bytes DuckDB currently holds in memory for this database."""
+        cursor = self.cursor()
+        try:
+            row = cursor.execute(
+                "SELECT COALESCE(SUM(memory_usage_bytes), 0) FROM duckdb_memory()"
+            ).fetchone()
+        finally:
+            cursor.close()
+        return int(row[0])
+
+    def bump_data_version(self) -> None:
+        """Mark the data as changed so previously cached results are ignored."""
+        if self.result_cache is not None:
+            self.result_cache.invalidate(self.data_key)
+        self.data_version += 1
+
+    def hold_result(self, result: Any) -> None:
+        """Register an open result with a ``close()`` method."""
+        with self._results_lock:
+            self._open_results[id(result)] = result
+
+    def release_result(self, result: Any) -> None:
+        """Forget a result registered with :meth:`hold_result`."""
+        with self._results_lock:
+            self._open_results.pop(id(result), None)
+
+    def _close_results(self) -> None:
+        with self._results_lock:
+            results = list(self._open_results.values())
+        for result in results:
+            result.close()
+
+    def reattach_sqlite(self, alias: str) -> List[TableReference]:
+        """Re-attach the SQLite file behind ``alias`` so DuckDB sees its new tables.
+
+        Returns the tables now registered under ``alias``; ``tables`` is
+        replaced by a new list keeping the order of tables that still exist.
+        Waits for statements in flight to finish and holds new ones off until
+        the file is attached again. Open streams and server cursors still hold
+        the old attachment, so they are closed first. Raises
+        :class:`ReattachError` when the file cannot be attached again.
+        """
+        path = self.watchers[alias].path
+        with self.query_lock.exclusive():
+            self._close_results()
+            self.connection.execute(f"DETACH {alias}")
+            try:
+                fresh = _register_sqlite(self.connection, path)
+            except Exception as exc:
+                self.tables = [t for t in self.tables if t.schema != alias]
+                raise ReattachError(f"Could not attach {path} again as {alias}: {exc}") from exc
+            names = {table.name for table in fresh}
+            kept = [t for t in self.tables if t.schema != alias or t.name in names]
+            known = {t.name for t in kept if t.schema == alias}
+            self.tables = kept + [table for table in fresh if table.name not in known]
+        return fresh
+
+    def close(self) -> None:
+        """Close the DuckDB connection and stop watching attached files."""
+        for watcher in self.watchers.values():
+            watcher.close()
+        self.connection.close()
 
     def execute_raw_query(self, sql: str) -> list[dict]:
-        """Execute a raw SQL query and return results as a list of dictionaries."""
+        """Execute a raw SQL query and return results as a list of dictionaries.
+
+        Raises :class:`~text2sql_agent.execution.QueryTimeoutError` when the
+        query runs past ``limits.timeout``. Statements that may change the
+        data bypass the result cache and bump :attr:`data_version`.
+        """
+        modifies = parse_query(sql).modifies_data
+        if self.limits.max_rows is not None:
+            sql = limit_query(sql, self.limits.max_rows)
+        if self.result_cache is not None and not modifies:
+            cached = self.result_cache.get_records(sql, self.data_key)
+            if cached is not None:
+                return cached
+        # A cursor per call keeps concurrent requests off each other's results.
+        cursor = self.cursor()
         try:
             # DuckDB's execute returns a relation, fetchall returns list of tuples.
             # We want a list of dicts for JSON serialization.
-            # using .df() to get pandas dataframe then to_dict might be easier but let's stick to duckdb api if possible
-            # actually .arrow() or .df() is good.
-            # Let's use fetchall and description to build dicts.
-            cursor = self.connection.execute(sql)
+            try:
+                with self.query_lock.shared():
+                    rows = run_with_timeout(
+                        cursor, lambda: cursor.execute(sql).fetchall(), self.limits.timeout
+                    )
+            finally:
+                if modifies:
+                    self.bump_data_version()
             if not cursor.description:
                 return []
             
             columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
             
             result = []
             for row in rows:
                 result.append(dict(zip(columns, row)))
+            if self.result_cache is not None and not modifies:
+                self.result_cache.put_records(sql, self.data_key, result)
             return result
-        except Exception as e:
-            raise e
+        finally:
+            cursor.close()
 
 
-def _register_csv(connection: duckdb.DuckDBPyConnection, path: Path) -> List[TableReference]:
-    table_name = path.stem
-    df = pd.read_csv(path)
-    connection.register(table_name, df)
-    return [TableReference(schema="main", name=table_name)]
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
 
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
 
-def _register_json(connection: duckdb.DuckDBPyConnection, path: Path) -> List[TableReference]:
+
+def _reader_sql(reader: str, path: Path, options: IngestOptions) -> str:
+    arguments = [_quote_literal(path.as_posix()), f"sample_size={options.sample_size}"]
+    if reader == "read_csv_auto" and options.all_varchar:
+        arguments.append("all_varchar=true")
+    return f"SELECT * FROM {reader}({', '.join(arguments)})"
+
+
+def _register_flat_file(
+    connection: duckdb.DuckDBPyConnection,
+    path: Path,
+    reader: str,
+    options: IngestOptions,
+) -> List[TableReference]:
     table_name = path.stem
-    df = pd.read_json(path)
-    connection.register(table_name, df)
+    mode = options.resolve_mode(path)
+    if mode == "pandas":
+        df = pd.read_csv(path) if reader == "read_csv_auto" else pd.read_json(path)
+        connection.register(table_name, df)
+    else:
+        kind = "TABLE" if mode == "table" else "VIEW"
+        connection.execute(
+            f"CREATE OR REPLACE {kind} {_quote_identifier(table_name)} AS "
+            f"{_reader_sql(reader, path, options)}"
+        )
     return [TableReference(schema="main", name=table_name)]
 
 
+def _register_csv(
+    connection: duckdb.DuckDBPyConnection,
+    path: Path,
+    options: IngestOptions = IngestOptions(),
+) -> List[TableReference]:
+    return _register_flat_file(connection, path, "read_csv_auto", options)
+
+
+def _register_json(
+    connection: duckdb.DuckDBPyConnection,
+    path: Path,
+    options: IngestOptions = IngestOptions(),
+) -> List[TableReference]:
+    return _register_flat_file(connection, path, "read_json_auto", options)
+
+
+def _sqlite_alias(path: Path) -> str:
+    return path.stem.replace("-", "_")
+
+
 def _register_sqlite(connection: duckdb.DuckDBPyConnection, path: Path) -> List[TableReference]:
-    schema_name = path.stem.replace("-", "_")
+    schema_name = _sqlite_alias(path)
     connection.execute(f"ATTACH '{path.as_posix()}' AS {schema_name} (TYPE SQLITE)")
     table_rows = connection.execute(f"SHOW TABLES FROM {schema_name}").fetchall()
     return [TableReference(schema=schema_name, name=row[0]) for row in table_rows]
 
 
-def load_database(file_path: str | Path) -> DatabaseContext:
+def load_database(
+    file_path: str | Path,
+    options: Optional[IngestOptions] = None,
+    cache: Optional["IngestionCache"] = None,
+    digest: Optional[str] = None,
+    settings: Optional[EngineSettings] = None,
+    watch_interval: Optional[float] = None,
+) -> DatabaseContext:
     """Load supported files into DuckDB and return a database context.
 
     Parameters
     ----------
     file_path:
         Path to a SQLite database, CSV or JSON file.
+    options:
+        How CSV and JSON files are ingested. Defaults to DuckDB's native
+        readers, materializing small files and viewing large ones.
+    cache:
+        Optional ingestion cache. CSV and JSON files are materialized once
+        into an on-disk DuckDB database keyed by their content and re-opened
+        from there on later loads.
+    digest:
+        Precomputed SHA-256 of the file contents, used as the cache key
+        instead of re-hashing the file.
+    settings:
+        DuckDB ``threads`` and ``memory_limit`` for the opened connection.
+    watch_interval:
+        Track changes to a SQLite file, looking at most once per this many
+        seconds, so :func:`~text2sql_agent.refresh.refresh_schema` can pick
+        them up. ``None`` leaves the file unwatched.
 
     Returns
     -------
@@ -90,16 +411,48 @@ def load_database(file_path: str | Path) -> DatabaseContext:
     if not path.exists():
         raise FileNotFoundError(path)
 
-    connection = duckdb.connect()
+    options = options or IngestOptions()
+    settings = settings or EngineSettings()
     suffix = path.suffix.lower()
 
+    if cache is not None and suffix in {".csv", ".json"}:
+        cached_path = cache.materialize(path, options, digest=digest)
+        connection = duckdb.connect(
+            str(cached_path), read_only=True, config=settings.to_config()
+        )
+        return DatabaseContext(
+            connection=connection,
+            tables=[TableReference(schema="main", name=path.stem)],
+            fingerprint=cached_path.stem,
+            settings=settings,
+        )
+
+    connection = duckdb.connect(config=settings.to_config())
+    watchers: Dict[str, SQLiteWatcher] = {}
     if suffix in {".db", ".sqlite"}:
-        tables = _register_sqlite(connection, path)
+        # Watch the file before attaching so no change slips in between.
+        if watch_interval is not None:
+            watchers[_sqlite_alias(path)] = SQLiteWatcher(path, watch_interval)
+        try:
+            tables = _register_sqlite(connection, path)
+        except Exception:
+            for watcher in watchers.values():
+                watcher.close()
+            raise
     elif suffix == ".csv":
-        tables = _register_csv(connection, path)
+        tables = _register_csv(connection, path, options)
     elif suffix == ".json":
-        tables = _register_json(connection, path)
+        tables = _register_json(connection, path, options)
     else:
         raise ValueError(f"Unsupported file extension: {suffix}")
 
-    return DatabaseContext(connection=connection, tables=tables)
+    stat = path.stat()
+    fingerprint = f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{options!r}"
+    return DatabaseContext(
+        connection=connection,
+        tables=tables,
+        fingerprint=fingerprint,
+        source_digest=digest if digest and not watchers else "",
+        settings=settings,
+        watchers=watchers,
+    )
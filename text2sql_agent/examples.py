@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Collection, Dict, List, Optional
+
+import numpy as np
+
+from .caches import normalize_question
+from .parsing import reads_any
+from .retrieval import tokenize
+
+# Questions are embedded as hashed term counts; short questions rarely
+# collide at this width and 10,000 examples still fit in 40 MB.
+_HASH_DIMENSIONS = 1024
+
+
+@dataclass(frozen=True)
+class Example:
+    """A question the agent answered, with the SQL that executed successfully."""
+
+    question: str
+    sql: str
+    fingerprint: str
+
+
+@dataclass
+class ExampleStats:
+    """How often retrieved examples were available and how many attempts followed."""
+
+    questions: int = 0
+    attempts: int = 0
+    with_examples: int = 0
+    attempts_with_examples: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.with_examples / self.questions if self.questions else 0.0
+
+    @property
+    def attempts_per_question(self) -> float:
+        return self.attempts / self.questions if self.questions else 0.0
+
+    @property
+    def attempts_per_question_with_examples(self) -> float:
+        return self.attempts_with_examples / self.with_examples if self.with_examples else 0.0
+
+    @property
+    def attempts_per_question_without_examples(self) -> float:
+        without = self.questions - self.with_examples
+        return (self.attempts - self.attempts_with_examples) / without if without else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "questions": self.questions,
+            "hit_rate": self.hit_rate,
+            "attempts_per_question": self.attempts_per_question,
+            "attempts_per_question_with_examples": self.attempts_per_question_with_examples,
+            "attempts_per_question_without_examples": (
+                self.attempts_per_question_without_examples
+            ),
+        }
+
+
+def _term_counts(question: str) -> np.ndarray:
+    vector = np.zeros(_HASH_DIMENSIONS, dtype=np.float32)
+    for token in tokenize(question):
+        vector[zlib.crc32(token.encode("utf-8")) % _HASH_DIMENSIONS] += 1.0
+    return vector
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+@dataclass
+class _Index:
+    """TF-IDF vectors of the examples stored for one schema fingerprint."""
+
+    examples: List[Example] = field(default_factory=list)
+    counts: List[np.ndarray] = field(default_factory=list)
+    matrix: Optional[np.ndarray] = None
+    idf: Optional[np.ndarray] = None
+
+    def build(self) -> None:
+        counts = np.vstack(self.counts)
+        frequencies = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(self.counts)) / (1 + frequencies)) + 1).astype(np.float32)
+        self.matrix = _normalize(counts * self.idf)
+
+
+class ExampleStore:
+    """Previously successful (question, SQL, schema fingerprint) triples.
+
+    Examples are persisted in a SQLite file (in memory when ``path`` is
+    ``None``) and retrieved by cosine similarity between TF-IDF vectors of
+    the questions, computed for all examples of a schema in one NumPy
+    matrix product. Only examples recorded against the same schema
+    fingerprint are returned, so SQL never refers to tables that are gone.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str | Path] = None,
+        max_entries: int = 10_000,
+        min_similarity: float = 0.3,
+    ) -> None:
+        self.path = Path(path) if path is not None else None
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self.stats = ExampleStats()
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, _Index] = {}
+        self._connection = sqlite3.connect(
+            str(self.path) if self.path is not None else ":memory:", check_same_thread=False
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS examples ("
+            " fingerprint TEXT NOT NULL,"
+            " question_key TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " sql TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (fingerprint, question_key))"
+        )
+        self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+
+    def _index(self, fingerprint: str) -> _Index:
+        index = self._indexes.get(fingerprint)
+        if index is None:
+            index = self._indexes[fingerprint] = _Index()
+            rows = self._connection.execute(
+                "SELECT question, sql FROM examples WHERE fingerprint = ? ORDER BY created_at",
+                (fingerprint,),
+            ).fetchall()
+            for question, sql in rows:
+                index.examples.append(Example(question, sql, fingerprint))
+                index.counts.append(_term_counts(question))
+        return index
+
+    def add(self, question: str, sql: str, fingerprint: str) -> None:
+        """Record ``sql`` as the answer to ``question``, replacing an older one."""
+
+        key = normalize_question(question)
+        with self._lock:
+            index = self._index(fingerprint)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO examples VALUES (?, ?, ?, ?, ?)",
+                (fingerprint, key, question.strip(), sql, time.time()),
+            )
+            pruned = self._connection.execute(
+                "DELETE FROM examples WHERE rowid IN ("
+                " SELECT rowid FROM examples ORDER BY created_at DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._connection.commit()
+            if pruned:
+                # Rare; reload affected schemas from the table on next use.
+                self._indexes.clear()
+                return
+            for position, example in enumerate(index.examples):
+                if normalize_question(example.question) == key:
+                    del index.examples[position]
+                    del index.counts[position]
+                    break
+            index.examples.append(Example(question.strip(), sql, fingerprint))
+            index.counts.append(_term_counts(question))
+            index.matrix = None
+
+    def search(self, question: str, fingerprint: str, k: int = 3) -> List[Example]:
+        """Return up to ``k`` stored examples most similar to ``question``, best first.
+
+        Examples below ``min_similarity`` are left out, as is an example
+        for the very same question (the question cache covers that case).
+        """
+
+        if k <= 0:
+            return []
+        key = normalize_question(question)
+        with self._lock:
+            index = self._index(fingerprint)
+            if not index.examples:
+                return []
+            if index.matrix is None:
+                index.build()
+            query = _normalize(_term_counts(question) * index.idf)
+            similarities = index.matrix @ query
+            selected: List[Example] = []
+            for position in np.argsort(-similarities, kind="stable"):
+                if similarities[position] < self.min_similarity or len(selected) == k:
+                    break
+                example = index.examples[position]
+                if normalize_question(example.question) != key:
+                    selected.append(example)
+        return selected
+
+    def migrate(self, old_fingerprint: str, new_fingerprint: str, tables: Collection[str]) -> int:
+        """Move examples to a new schema fingerprint, dropping SQL that reads ``tables``.
+
+        Returns the number of examples dropped.
+        """
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT question_key, sql FROM examples WHERE fingerprint = ?",
+                (old_fingerprint,),
+            ).fetchall()
+            stale = [(old_fingerprint, key) for key, sql in rows if reads_any(sql, tables)]
+            self._connection.executemany(
+                "DELETE FROM examples WHERE fingerprint = ? AND question_key = ?", stale
+            )
+            self._connection.execute(
+                "UPDATE OR REPLACE examples SET fingerprint = ? WHERE fingerprint = ?",
+                (new_fingerprint, old_fingerprint),
+            )
+            self._connection.commit()
+            self._indexes.pop(old_fingerprint, None)
+            self._indexes.pop(new_fingerprint, None)
+        return len(stale)
+
+    def record(self, attempts: int, used_examples: bool) -> None:
+        """Count the attempts one question needed, for :attr:`stats`."""
+
+        with self._lock:
+            self.stats.questions += 1
+            self.stats.attempts += attempts
+            if used_examples:
+                self.stats.with_examples += 1
+                self.stats.attempts_with_examples += attempts
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -1,10 +1,249 @@
 from __future__ import annotations
 
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional, TypeVar
+
 import duckdb
 import pandas as pd
+from sqlglot import exp
+
+from .caches import ResultCache
+from .parsing import DIALECT, parse_query
+
+COUNT_STRATEGIES = ("auto", "stream", "wrap")
+_COUNT_BATCH_SIZE = 65_536
+
+T = TypeVar("T")
+
+# Cartesian products estimated to produce more rows than this are rejected
+# before execution.
+DEFAULT_MAX_CARTESIAN_ROWS = 10_000_000
+
+
+class QueryTimeoutError(RuntimeError):
+    """Raised when a query runs past its deadline and is interrupted."""
+
+    def __init__(self, timeout: float) -> None:
+        super().__init__(f"Query exceeded the {timeout:g}s time limit and was cancelled.")
+        self.timeout = timeout
+
+
+@dataclass(frozen=True)
+class QueryLimits:
+    """Per-query resource limits.
+
+    ``timeout`` is a wall-clock deadline in seconds after which the query is
+    interrupted, and ``max_rows`` caps how many rows a materialized result
+    may hold by injecting a ``LIMIT``. Streamed and paged results are read
+    in bounded batches, so they are only capped by ``max_streamed_rows``,
+    and report when the cap applied.
+    Generated queries whose plan contains a cartesian product estimated
+    above ``max_cartesian_rows`` are rejected before they run. ``None``
+    disables a limit.
+
+    Memory and thread limits are not per query: DuckDB only accepts
+    ``memory_limit`` and ``threads`` for the whole database, so they are
+    set once per dataset through :class:`~text2sql_agent.database.EngineSettings`.
+    """
+
+    timeout: Optional[float] = None
+    max_rows: Optional[int] = None
+    max_streamed_rows: Optional[int] = None
+    max_cartesian_rows: Optional[int] = DEFAULT_MAX_CARTESIAN_ROWS
+
+    def __post_init__(self) -> None:
+        if self.timeout is not None and self.timeout <= 0:
+            raise ValueError(f"timeout must be positive, got {self.timeout}.")
+        if self.max_rows is not None and self.max_rows < 0:
+            raise ValueError(f"max_rows must not be negative, got {self.max_rows}.")
+        if self.max_streamed_rows is not None and self.max_streamed_rows < 0:
+            raise ValueError(
+                f"max_streamed_rows must not be negative, got {self.max_streamed_rows}."
+            )
+
+
+@dataclass
+class QueryPreview:
+    """The first rows of a query result together with its total row count."""
+
+    rows: pd.DataFrame
+    total_rows: int
+
+
+def limit_query(query: str, max_rows: int) -> str:
+    """Return ``query`` with its row count capped at ``max_rows``.
+
+    See :meth:`ParsedQuery.limited`; SQL that does not parse is returned
+    unchanged.
+    """
+
+    return parse_query(query).limited(max_rows).sql
+
+
+def run_with_timeout(
+    connection: duckdb.DuckDBPyConnection,
+    func: Callable[[], T],
+    timeout: Optional[float],
+) -> T:
+    """Call ``func``, interrupting ``connection`` if it runs past ``timeout``.
+
+    ``func`` should run its query on ``connection``; when the deadline
+    passes, DuckDB cancels the query and :class:`QueryTimeoutError` is
+    raised.
+    """
+
+    if timeout is None:
+        return func()
+    fired = threading.Event()
+
+    def interrupt() -> None:
+        fired.set()
+        connection.interrupt()
+
+    timer = threading.Timer(timeout, interrupt)
+    timer.daemon = True
+    timer.start()
+    try:
+        return func()
+    except duckdb.InterruptException as exc:
+        if fired.is_set():
+            raise QueryTimeoutError(timeout) from exc
+        raise
+    finally:
+        timer.cancel()
+
+
+def execute_sql(
+    connection: duckdb.DuckDBPyConnection,
+    query: str,
+    cache: Optional[ResultCache] = None,
+    data_version: str = "",
+    limits: Optional[QueryLimits] = None,
+) -> pd.DataFrame:
+    """Execute the SQL query against DuckDB and return a DataFrame.
+
+    With a result ``cache``, results are looked up by the canonical form of
+    ``query`` and ``data_version`` before running anything. Statements that
+    may change the data skip the cache and drop its entries for
+    ``data_version``. ``limits`` caps the runtime and the number of rows
+    returned.
+    """
+
+    limits = limits or QueryLimits()
+    modifies = parse_query(query).modifies_data
+    if limits.max_rows is not None:
+        query = limit_query(query, limits.max_rows)
+    if cache is not None and not modifies:
+        cached = cache.get_frame(query, data_version)
+        if cached is not None:
+            return cached
+    try:
+        results = run_with_timeout(
+            connection, lambda: connection.execute(query).fetchdf(), limits.timeout
+        )
+    finally:
+        if cache is not None and modifies:
+            cache.invalidate(data_version)
+    if cache is not None and not modifies:
+        cache.put_frame(query, data_version, results)
+    return results
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _stream_preview(
+    connection: duckdb.DuckDBPyConnection, query: str, preview_rows: int
+) -> QueryPreview:
+    """Run ``query`` once, keep the first rows and count the rest batch by batch."""
+
+    result = connection.execute(query)
+    if hasattr(result, "to_arrow_reader"):
+        reader = result.to_arrow_reader(_COUNT_BATCH_SIZE)
+    else:  # pragma: no cover - older DuckDB releases
+        reader = result.fetch_record_batch(_COUNT_BATCH_SIZE)
+    preview_batches = []
+    kept = 0
+    total = 0
+    for batch in reader:
+        total += batch.num_rows
+        if kept < preview_rows:
+            head = batch.slice(0, preview_rows - kept)
+            preview_batches.append(head)
+            kept += head.num_rows
+
+    import pyarrow as pa
+
+    table = pa.Table.from_batches(preview_batches, schema=reader.schema)
+    return QueryPreview(rows=table.to_pandas(), total_rows=total)
+
+
+def _wrapped_preview(
+    connection: duckdb.DuckDBPyConnection, query: str, preview_rows: int
+) -> QueryPreview:
+    """Fetch a LIMITed preview and a ``COUNT(*)`` over the query as a subquery."""
+
+    parsed = parse_query(query)
+    if parsed.is_query:
+        # Built from the syntax tree so trailing comments and semicolons in
+        # the original text cannot swallow the closing parenthesis.
+        subquery = parsed.expression.subquery("_preview")
+        preview_sql = exp.select("*").from_(subquery).limit(int(preview_rows)).sql(DIALECT)
+        count_sql = exp.select("COUNT(*)").from_(subquery).sql(DIALECT)
+    else:
+        wrapped = f"(\n{query.strip().rstrip(';')}\n) AS _preview"
+        preview_sql = f"SELECT * FROM {wrapped} LIMIT {int(preview_rows)}"
+        count_sql = f"SELECT COUNT(*) FROM {wrapped}"
+    preview = connection.execute(preview_sql).fetchdf()
+    total = connection.execute(count_sql).fetchone()[0]
+    return QueryPreview(rows=preview, total_rows=int(total))
+
+
+def execute_preview(
+    connection: duckdb.DuckDBPyConnection,
+    query: str,
+    preview_rows: int = 5,
+    count: str = "auto",
+    cache: Optional[ResultCache] = None,
+    data_version: str = "",
+    limits: Optional[QueryLimits] = None,
+) -> QueryPreview:
+    """Execute ``query`` but only materialize its first ``preview_rows`` rows.
+
+    ``count`` selects how the total row count is obtained: ``"stream"`` runs
+    the query once and counts Arrow record batches without converting them,
+    ``"wrap"`` issues a ``LIMIT`` query plus a wrapping ``COUNT(*)``, and
+    ``"auto"`` streams when pyarrow is installed and wraps otherwise.
+
+    Only the timeout of ``limits`` applies: the preview is already bounded
+    and capping the rows would falsify the count.
+    """
 
+    if count not in COUNT_STRATEGIES:
+        raise ValueError(
+            f"Unsupported count strategy: {count!r}. "
+            f"Expected one of {', '.join(COUNT_STRATEGIES)}."
+        )
+    if cache is not None:
+        cached = cache.get_preview(query, data_version, preview_rows)
+        if cached is not None:
+            return QueryPreview(rows=cached[0], total_rows=cached[1])
 
-def execute_sql(connection: duckdb.DuckDBPyConnection, query: str) -> pd.DataFrame:
-    """Execute the SQL query against DuckDB and return a DataFrame."""
+    if count == "stream" or (count == "auto" and _has_pyarrow()):
+        run = _stream_preview
+    else:
+        run = _wrapped_preview
+    timeout = limits.timeout if limits is not None else None
+    preview = run_with_timeout(
+        connection, lambda: run(connection, query, preview_rows), timeout
+    )
 
-    return connection.execute(query).fetchdf()
+    if cache is not None:
+        cache.put_preview(query, data_version, preview_rows, preview.rows, preview.total_rows)
+    return preview
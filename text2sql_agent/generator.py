@@ -1,27 +1,97 @@
 from __future__ import annotations
 
+import asyncio
+import copy
 import os
+import random
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Callable, Mapping, Optional, Protocol
+from typing import Awaitable, Callable, List, Mapping, Optional, Protocol, Sequence
 
+from .prompts import PromptTemplate, build_prompt, estimate_tokens, format_schema
+from .retrieval import SchemaIndex
 from .schema import TableSchema
 
 
+SYSTEM_PROMPT = (
+    "You are a helpful SQL assistant. Return ONLY the SQL query. "
+    "Do not use markdown formatting like ```sql."
+)
+
+
 class PromptCallable(Protocol):
     def __call__(self, prompt: str) -> str:  # pragma: no cover - protocol definition
         ...
 
 
+GENERATOR_BACKENDS = ("torch", "quantized", "onnx")
+_WARMUP_PROMPT = "translate English to SQL: how many rows are there?"
+
+
+@dataclass
+class GeneratorTimings:
+    """Startup and per-call latency of a local model, in seconds."""
+
+    load_seconds: float = 0.0
+    warmup_seconds: Optional[float] = None
+    first_call_seconds: Optional[float] = None
+    calls: int = 0
+    total_call_seconds: float = 0.0
+
+    @property
+    def average_call_seconds(self) -> float:
+        return self.total_call_seconds / self.calls if self.calls else 0.0
+
+    def record_call(self, seconds: float) -> None:
+        if self.first_call_seconds is None:
+            self.first_call_seconds = seconds
+        self.calls += 1
+        self.total_call_seconds += seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "first_call_seconds": self.first_call_seconds,
+            "calls": self.calls,
+            "average_call_seconds": self.average_call_seconds,
+        }
+
+
 @dataclass
 class TransformersSQLGenerator:
-    """Wrapper around a HuggingFace text2text model for SQL generation."""
+    """Wrapper around a HuggingFace text2text model for SQL generation.
+
+    ``backend`` selects how the model runs: ``"torch"`` as published,
+    ``"quantized"`` with its linear layers dynamically quantized to int8 for
+    faster CPU inference, or ``"onnx"`` exported to ONNX Runtime (requires
+    ``optimum[onnxruntime]``). ``num_beams`` trades accuracy for latency.
+    With ``warmup`` a first generation runs at construction so the first
+    real request does not pay for lazy initialization. Load, warm-up and call
+    latencies are recorded in ``timings``. :meth:`count_tokens` may be called
+    from other threads while the model generates: it uses its own copy of
+    the tokenizer, as fast tokenizers cannot be used concurrently.
+    """
 
     model_name: str = "mrm8488/t5-base-finetuned-wikiSQL"
     max_new_tokens: int = 128
     device: Optional[int] = None
+    batch_size: int = 8
+    num_beams: int = 4
+    backend: str = "torch"
+    warmup: bool = False
+    timings: GeneratorTimings = field(default_factory=GeneratorTimings, init=False)
 
     def __post_init__(self) -> None:
+        if self.backend not in GENERATOR_BACKENDS:
+            raise ValueError(
+                f"Unsupported backend: {self.backend!r}. "
+                f"Expected one of {', '.join(GENERATOR_BACKENDS)}."
+            )
+        started = time.perf_counter()
         try:
             from transformers import pipeline
         except ImportError as exc:  # pragma: no cover - depends on optional dep
@@ -30,20 +100,105 @@ class TransformersSQLGenerator:
                 "Install it with `pip install transformers`."
             ) from exc
 
-        self._pipeline = pipeline(
-            "text2text-generation",
-            model=self.model_name,
-            device=self.device,
+        if self.backend == "torch":
+            self._pipeline = pipeline(
+                "text2text-generation",
+                model=self.model_name,
+                device=self.device,
+            )
+        else:
+            model, tokenizer = self._load_model()
+            self._pipeline = pipeline(
+                "text2text-generation",
+                model=model,
+                tokenizer=tokenizer,
+                device=self.device,
+            )
+        self._count_tokenizer = copy.deepcopy(self._pipeline.tokenizer)
+        self._count_lock = threading.Lock()
+        self.timings.load_seconds = time.perf_counter() - started
+        if self.warmup:
+            self.warm_up()
+
+    def _load_model(self):  # pragma: no cover - depends on optional deps
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        if self.backend == "onnx":
+            try:
+                from optimum.onnxruntime import ORTModelForSeq2SeqLM
+            except ImportError as exc:
+                raise ImportError(
+                    "The 'onnx' backend requires ONNX Runtime support from optimum. "
+                    "Install it with `pip install text2sql-agent[onnx]`."
+                ) from exc
+            return ORTModelForSeq2SeqLM.from_pretrained(self.model_name, export=True), tokenizer
+
+        import torch
+        from transformers import AutoModelForSeq2SeqLM
+
+        model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name)
+        model.eval()
+        quantized = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
         )
+        return quantized, tokenizer
+
+    def warm_up(self) -> float:
+        """Run one short generation so later calls hit a warmed-up model."""
+
+        started = time.perf_counter()
+        self._pipeline(_WARMUP_PROMPT, max_new_tokens=8, num_beams=self.num_beams)
+        self.timings.warmup_seconds = time.perf_counter() - started
+        return self.timings.warmup_seconds
 
     def __call__(self, prompt: str) -> str:
+        started = time.perf_counter()
         result = self._pipeline(
             prompt,
             max_new_tokens=self.max_new_tokens,
-            num_beams=4,
+            num_beams=self.num_beams,
         )[0]["generated_text"]
+        self.timings.record_call(time.perf_counter() - started)
         return result.strip()
 
+    def candidates(self, prompt: str, n: int) -> List[str]:
+        """Return the ``n`` best beams for ``prompt`` from a single beam search."""
+
+        started = time.perf_counter()
+        outputs = self._pipeline(
+            prompt,
+            max_new_tokens=self.max_new_tokens,
+            num_beams=max(self.num_beams, n),
+            num_return_sequences=n,
+        )
+        self.timings.record_call(time.perf_counter() - started)
+        return [output["generated_text"].strip() for output in outputs]
+
+    def batch(self, prompts: Sequence[str]) -> List[str]:
+        """Generate SQL for several prompts with batched forward passes."""
+
+        if not prompts:
+            return []
+        started = time.perf_counter()
+        outputs = self._pipeline(
+            list(prompts),
+            max_new_tokens=self.max_new_tokens,
+            num_beams=self.num_beams,
+            batch_size=self.batch_size,
+        )
+        self.timings.record_call(time.perf_counter() - started)
+        results = []
+        for output in outputs:
+            if isinstance(output, list):
+                output = output[0]
+            results.append(output["generated_text"].strip())
+        return results
+
+    def count_tokens(self, prompt: str) -> int:
+        with self._count_lock:
+            return len(self._count_tokenizer(prompt)["input_ids"])
+
 
 @dataclass
 class OpenAIGenerator:
@@ -52,6 +207,9 @@ class OpenAIGenerator:
     model_name: str = "gpt-3.5-turbo"
     api_key: Optional[str] = None
     temperature: float = 0.0
+    # Used instead of ``temperature`` when several candidates are requested,
+    # so they are not all identical.
+    candidate_temperature: float = 0.7
 
     def __post_init__(self) -> None:
         try:
@@ -68,41 +226,145 @@ class OpenAIGenerator:
         response = self.client.chat.completions.create(
             model=self.model_name,
             messages=[
-                {"role": "system", "content": "You are a helpful SQL assistant. Return ONLY the SQL query. Do not use markdown formatting like ```sql."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
             temperature=self.temperature,
         )
         return response.choices[0].message.content.strip()
-def format_schema(schema: Mapping[str, TableSchema]) -> str:
-    """Convert schema metadata into a textual prompt."""
-
-    sections = ["Schema:"]
-    for table_name, table_schema in schema.items():
-        columns = ", ".join(table_schema.columns)
-        section = [f"Table: {table_name}({columns})"]
-        if table_schema.sample_rows:
-            sample_lines = []
-            for row in table_schema.sample_rows[:3]:
-                formatted = ", ".join(f"{key}={value}" for key, value in row.items())
-                sample_lines.append(f"  - {formatted}")
-            section.append("Sample rows:\n" + "\n".join(sample_lines))
-        sections.append("\n".join(section))
-    return "\n\n".join(sections)
-
-
-def build_prompt(
-    question: str,
-    schema: Mapping[str, TableSchema],
-    error: Optional[str] = None,
-) -> str:
-    """Construct the text prompt for the language model."""
 
-    prompt_parts = [format_schema(schema), f"Question: {question.strip()}".strip()]
-    if error:
-        prompt_parts.append(f"Previous error: {error.strip()}")
-    prompt_parts.append("SQL query:")
-    return "\n\n".join(part for part in prompt_parts if part)
+    def candidates(self, prompt: str, n: int) -> List[str]:
+        """Return ``n`` completions for ``prompt`` from a single request."""
+
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=self.temperature if n == 1 else self.candidate_temperature,
+            n=n,
+        )
+        return [choice.message.content.strip() for choice in response.choices]
+
+    def count_tokens(self, prompt: str) -> int:
+        return _count_openai_tokens(self.model_name, prompt)
+
+
+def _count_openai_tokens(model_name: str, prompt: str) -> int:
+    try:
+        import tiktoken
+    except ImportError:
+        return estimate_tokens(prompt)
+    try:
+        encoding = tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(prompt))
+
+
+@dataclass
+class AsyncOpenAIGenerator:
+    """Non-blocking OpenAI generator for use inside an event loop.
+
+    All calls share one pooled HTTP client. At most ``max_concurrency``
+    completions are in flight at once; rate limits, timeouts, connection
+    errors and 5xx responses are retried up to ``max_retries`` times with
+    full-jitter exponential backoff. ``timeout`` is a deadline in seconds for
+    a whole call, retries included. ``base_url`` points the client at any
+    OpenAI-compatible endpoint.
+    """
+
+    model_name: str = "gpt-3.5-turbo"
+    api_key: Optional[str] = None
+    temperature: float = 0.0
+    base_url: Optional[str] = None
+    max_concurrency: int = 8
+    max_connections: int = 20
+    max_retries: int = 4
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    timeout: float = 60.0
+    candidate_temperature: float = 0.7
+
+    def __post_init__(self) -> None:
+        try:
+            import httpx
+            import openai
+        except ImportError as exc:
+            raise ImportError(
+                "AsyncOpenAIGenerator requires the 'openai' package. "
+                "Install it with `pip install openai`."
+            ) from exc
+
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            timeout=self.timeout,
+        )
+        # Retries are handled here so they share the semaphore and deadline.
+        self.client = openai.AsyncOpenAI(
+            api_key=self.api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=self.base_url,
+            http_client=self._http_client,
+            max_retries=0,
+        )
+        self._retryable = (
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.InternalServerError,
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def __call__(self, prompt: str) -> str:
+        choices = await asyncio.wait_for(self._complete(prompt), timeout=self.timeout)
+        return choices[0]
+
+    async def candidates(self, prompt: str, n: int) -> List[str]:
+        """Return ``n`` completions for ``prompt`` from a single request."""
+
+        return await asyncio.wait_for(self._complete(prompt, n), timeout=self.timeout)
+
+    async def _complete(self, prompt: str, n: int = 1) -> List[str]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    options = {"n": n} if n > 1 else {}
+                    response = await self.client.chat.completions.create(
+                        model=self.model_name,
+                        messages=[
+                            {"role": "system", "content": SYSTEM_PROMPT},
+                            {"role": "user", "content": prompt},
+                        ],
+                        temperature=self.temperature if n == 1 else self.candidate_temperature,
+                        **options,
+                    )
+                return [choice.message.content.strip() for choice in response.choices]
+            except self._retryable as exc:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, exc))
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        response = getattr(exc, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    def count_tokens(self, prompt: str) -> int:
+        return _count_openai_tokens(self.model_name, prompt)
+
+    async def aclose(self) -> None:
+        await self.client.close()
 
 
 def _cleanup_sql(generated: str) -> str:
@@ -117,14 +379,63 @@ def _cleanup_sql(generated: str) -> str:
     return generated.strip()
 
 
+def complete_sql(prompt: str, generator: Callable[[str], str]) -> str:
+    """Run ``generator`` on an already rendered prompt and clean up its SQL."""
+
+    return _cleanup_sql(generator(prompt))
+
+
+def complete_candidates(
+    prompt: str, generator: Callable[[str], str], n: int
+) -> List[str]:
+    """Ask ``generator`` for ``n`` SQL candidates and return the distinct ones.
+
+    Generators with a ``candidates(prompt, n)`` method produce them in one
+    call (beam search or ``n`` completions); others are called ``n`` times
+    concurrently.
+    """
+
+    candidates = getattr(generator, "candidates", None)
+    if callable(candidates):
+        raw = candidates(prompt, n)
+    else:
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            raw = list(pool.map(generator, [prompt] * n))
+    cleaned = (_cleanup_sql(output) for output in raw)
+    return list(dict.fromkeys(sql for sql in cleaned if sql))
+
+
 def generate_sql(
     question: str,
     schema: Mapping[str, TableSchema],
     generator: Callable[[str], str],
     error: Optional[str] = None,
+    index: Optional[SchemaIndex] = None,
+    top_k: int = 5,
+    token_budget: Optional[int] = None,
+    template: Optional[PromptTemplate] = None,
+) -> str:
+    """Generate a SQL query for the provided question and schema.
+
+    Pass a precompiled ``template`` to reuse its rendered schema across calls;
+    otherwise one is compiled from ``schema`` for this call.
+    """
+
+    if template is None:
+        template = PromptTemplate(schema, index=index, top_k=top_k, token_budget=token_budget)
+    return complete_sql(template.render(question, error=error), generator)
+
+
+async def async_generate_sql(
+    question: str,
+    schema: Mapping[str, TableSchema],
+    generator: Callable[[str], Awaitable[str]],
+    error: Optional[str] = None,
+    template: Optional[PromptTemplate] = None,
 ) -> str:
-    """Generate a SQL query for the provided question and schema."""
+    """Awaitable counterpart of :func:`generate_sql` for async generators."""
 
-    prompt = build_prompt(question, schema, error=error)
-    raw_sql = generator(prompt)
+    if template is None:
+        template = PromptTemplate(schema)
+    raw_sql = await generator(template.render(question, error=error))
     return _cleanup_sql(raw_sql)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, List, Optional
+
+import duckdb
+
+from .database import IngestOptions, _register_csv, _register_json
+
+DEFAULT_CACHE_BYTES = 10 * 1024 * 1024 * 1024
+_CHUNK_SIZE = 1024 * 1024
+_SUFFIX = ".duckdb"
+
+
+def hash_stream(stream: BinaryIO, chunk_size: int = _CHUNK_SIZE) -> str:
+    """Return the SHA-256 hex digest of a binary stream read in chunks."""
+
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path: str | Path) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+
+    with open(path, "rb") as handle:
+        return hash_stream(handle)
+
+
+@dataclass
+class CacheEntry:
+    """A materialized dataset stored in the ingestion cache."""
+
+    key: str
+    path: Path
+    size: int
+    last_used: float
+
+
+@dataclass
+class IngestionCache:
+    """Content-addressed store of CSV/JSON files materialized into DuckDB files.
+
+    Each entry is keyed by the source file's content hash, its table name and
+    the loader options, so loading the same data again only needs to open the
+    cached database. Entries are evicted least-recently-used first once the
+    directory grows past ``max_bytes``.
+    """
+
+    directory: Path
+    max_bytes: int = DEFAULT_CACHE_BYTES
+
+    def __post_init__(self) -> None:
+        self.directory = Path(self.directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key_for(
+        self, path: Path, options: IngestOptions, digest: Optional[str] = None
+    ) -> str:
+        """Return the cache key for ``path`` loaded with ``options``."""
+
+        # Cached entries are always materialized, so only the options that
+        # change the parsed result take part in the key.
+        relevant = dataclasses.replace(options, mode="table", materialize_threshold=0)
+        material = "\0".join(
+            [digest or hash_file(path), path.stem, path.suffix.lower(), repr(relevant)]
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}{_SUFFIX}"
+
+    def materialize(
+        self, path: Path, options: IngestOptions, digest: Optional[str] = None
+    ) -> Path:
+        """Return the cached DuckDB file for ``path``, building it if needed."""
+
+        key = self.key_for(path, options, digest)
+        target = self.path_for(key)
+        if target.exists():
+            os.utime(target)
+            return target
+
+        register = _register_csv if path.suffix.lower() == ".csv" else _register_json
+        staging = self.directory / f".{key}.{uuid.uuid4().hex}.tmp"
+        connection = duckdb.connect(str(staging))
+        try:
+            register(connection, path, dataclasses.replace(options, mode="table"))
+            connection.execute("CHECKPOINT")
+        except BaseException:
+            connection.close()
+            staging.unlink(missing_ok=True)
+            raise
+        connection.close()
+        os.replace(staging, target)
+        self.evict(keep=key)
+        return target
+
+    def entries(self) -> List[CacheEntry]:
+        """List cached datasets, most recently used first."""
+
+        entries = []
+        for path in self.directory.glob(f"*{_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append(
+                CacheEntry(
+                    key=path.name[: -len(_SUFFIX)],
+                    path=path,
+                    size=stat.st_size,
+                    last_used=stat.st_mtime,
+                )
+            )
+        entries.sort(key=lambda entry: entry.last_used, reverse=True)
+        return entries
+
+    def total_bytes(self) -> int:
+        return sum(entry.size for entry in self.entries())
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """Drop least-recently-used entries until the cache fits ``max_bytes``."""
+
+        entries = self.entries()
+        total = sum(entry.size for entry in entries)
+        removed: List[str] = []
+        for entry in reversed(entries):
+            if total <= self.max_bytes:
+                break
+            if entry.key == keep:
+                continue
+            self._remove(entry.path)
+            total -= entry.size
+            removed.append(entry.key)
+        return removed
+
+    def purge(self, older_than: Optional[float] = None) -> int:
+        """Remove cached datasets (optionally only those unused for ``older_than`` seconds)."""
+
+        cutoff = time.time() - older_than if older_than is not None else None
+        removed = 0
+        for entry in self.entries():
+            if cutoff is not None and entry.last_used >= cutoff:
+                continue
+            self._remove(entry.path)
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        path.unlink(missing_ok=True)
+        Path(f"{path}.wal").unlink(missing_ok=True)
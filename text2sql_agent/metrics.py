@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import contextlib
+import math
+import threading
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .caches import CacheStats
+from .tracing import Trace
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """A Prometheus histogram with fixed buckets, keyed by label values.
+
+    Not synchronized; :class:`AgentMetrics` guards it with its own lock.
+    """
+
+    def __init__(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets=DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        counts, total, count = self._series.get(label_values) or ([0] * len(self.buckets), 0.0, 0)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        self._series[label_values] = (counts, total + value, count + 1)
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self._series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = _labels(self.labels, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {bucket_count}")
+            le = _labels(self.labels, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {count}")
+        return lines
+
+
+def _render_simple(
+    kind: str, name: str, help: str, labels: Sequence[str], series: Mapping[LabelValues, float]
+) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for values, value in sorted(series.items()):
+        lines.append(f"{name}{_labels(labels, values)} {_format_value(value)}")
+    return lines
+
+
+class AgentMetrics:
+    """Request metrics for the agent pipeline, rendered in Prometheus text format.
+
+    Stage latencies come from the :class:`~text2sql_agent.tracing.Trace` of
+    each answered request. Cache statistics are read when rendering, so the
+    caches keep their own counters and nothing is double counted.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self._lock = threading.Lock()
+        self.stage_seconds = Histogram(
+            "text2sql_stage_duration_seconds",
+            "Time spent in each stage of the agent pipeline.",
+            labels=("stage",),
+            buckets=buckets,
+        )
+        self.request_seconds = Histogram(
+            "text2sql_request_duration_seconds",
+            "End-to-end latency of agent requests.",
+            labels=("outcome",),
+            buckets=buckets,
+        )
+        self._requests: Dict[LabelValues, float] = {}
+        self._retries = 0
+        self._cache_hits = 0
+        self._in_flight: Dict[LabelValues, float] = {}
+
+    def observe(
+        self, trace: Optional[Trace], attempts: int, cache_hit: bool, outcome: str = "success"
+    ) -> None:
+        """Record one finished agent request."""
+
+        with self._lock:
+            self._requests[(outcome,)] = self._requests.get((outcome,), 0) + 1
+            self._retries += max(attempts - 1, 0)
+            self._cache_hits += int(cache_hit)
+            if trace is None:
+                return
+            for span in trace.spans:
+                self.stage_seconds.observe(span.duration, span.name)
+            if trace.duration is not None:
+                self.request_seconds.observe(trace.duration, outcome)
+
+    @contextlib.contextmanager
+    def in_flight(self, endpoint: str) -> Iterator[None]:
+        """Count the enclosed block as an in-flight request to ``endpoint``."""
+
+        key = (endpoint,)
+        with self._lock:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[key] -= 1
+
+    def render(self, caches: Optional[Mapping[str, CacheStats]] = None) -> str:
+        """Return all metrics as a Prometheus text exposition."""
+
+        with self._lock:
+            lines = self.stage_seconds.render() + self.request_seconds.render()
+            lines += _render_simple(
+                "counter",
+                "text2sql_requests_total",
+                "Agent requests by outcome.",
+                ("outcome",),
+                self._requests,
+            )
+            lines += _render_simple(
+                "counter",
+                "text2sql_retries_total",
+                "Extra generation attempts after a failed one.",
+                (),
+                {(): self._retries},
+            )
+            lines += _render_simple(
+                "counter",
+                "text2sql_question_cache_answers_total",
+                "Requests answered from the question cache without generation.",
+                (),
+                {(): self._cache_hits},
+            )
+            lines += _render_simple(
+                "gauge",
+                "text2sql_in_flight_requests",
+                "Requests currently being processed.",
+                ("endpoint",),
+                self._in_flight,
+            )
+        if caches:
+            lookups: Dict[LabelValues, float] = {}
+            ratios: Dict[LabelValues, float] = {}
+            for cache, stats in caches.items():
+                lookups[(cache, "hit")] = stats.hits
+                lookups[(cache, "miss")] = stats.misses
+                ratios[(cache,)] = stats.hit_rate
+            lines += _render_simple(
+                "counter",
+                "text2sql_cache_lookups_total",
+                "Cache lookups by cache and result.",
+                ("cache", "result"),
+                lookups,
+            )
+            lines += _render_simple(
+                "gauge",
+                "text2sql_cache_hit_ratio",
+                "Fraction of cache lookups that hit.",
+                ("cache",),
+                ratios,
+            )
+        return "\n".join(lines) + "\n"
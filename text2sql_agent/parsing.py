@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Collection, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.optimizer.normalize_identifiers import normalize_identifiers
+
+DIALECT = "duckdb"
+_PARSE_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class CanonicalQuery:
+    """A SQL query reduced to a form that ignores cosmetic differences.
+
+    ``key`` is identical for queries that differ only in whitespace, keyword
+    or identifier casing, table alias names and output column aliases that
+    no other part of the query refers to.
+    ``output_names`` holds the alias of each projection (``None`` when it is
+    not aliased) so cached results can be relabelled for the asking query.
+    """
+
+    key: str
+    output_names: Tuple[Optional[str], ...]
+
+
+# Results of queries calling these are never cached.
+_VOLATILE_EXPRESSIONS = (
+    exp.Rand,
+    exp.Uuid,
+    exp.CurrentDate,
+    exp.CurrentTime,
+    exp.CurrentTimestamp,
+)
+_VOLATILE_FUNCTIONS = {"now", "random", "gen_random_uuid", "uuid", "today", "get_current_time"}
+
+
+def _is_volatile(expression: exp.Expression) -> bool:
+    if expression.find(*_VOLATILE_EXPRESSIONS) is not None:
+        return True
+    return any(
+        node.name.lower() in _VOLATILE_FUNCTIONS for node in expression.find_all(exp.Anonymous)
+    )
+
+
+def _is_star(projection: exp.Expression) -> bool:
+    return isinstance(projection, exp.Star) or (
+        isinstance(projection, exp.Column) and isinstance(projection.this, exp.Star)
+    )
+
+
+def _canonicalize(expression: exp.Query) -> CanonicalQuery:
+    output_names: Tuple[Optional[str], ...] = ()
+    expression = expression.copy()
+    if isinstance(expression, exp.Select) and not any(
+        _is_star(projection) for projection in expression.expressions
+    ):
+        output_names = tuple(
+            projection.alias if isinstance(projection, exp.Alias) else None
+            for projection in expression.expressions
+        )
+        # An alias used by ORDER BY, GROUP BY, QUALIFY or another projection
+        # changes what the query means, so it stays part of the key.
+        referenced = {
+            column.name.lower() for column in expression.find_all(exp.Column) if not column.table
+        }
+        expression.set(
+            "expressions",
+            [
+                projection.this
+                if isinstance(projection, exp.Alias)
+                and projection.alias.lower() not in referenced
+                else projection
+                for projection in expression.expressions
+            ],
+        )
+
+    expression = normalize_identifiers(expression, dialect=DIALECT)
+    # CTE names are referenced as tables, so they keep their names.
+    table_aliases = [
+        node for node in expression.find_all(exp.TableAlias) if not isinstance(node.parent, exp.CTE)
+    ]
+    aliases = {}
+    for table_alias in table_aliases:
+        name = table_alias.name
+        if name and name not in aliases:
+            aliases[name] = f"_t{len(aliases)}"
+    if aliases:
+        for node in [*table_aliases, *expression.find_all(exp.Column)]:
+            identifier = node.args.get("this" if isinstance(node, exp.TableAlias) else "table")
+            if isinstance(identifier, exp.Identifier) and identifier.name in aliases:
+                identifier.set("this", aliases[identifier.name])
+
+    return CanonicalQuery(key=expression.sql(dialect=DIALECT), output_names=output_names)
+
+
+# Statements besides queries that only read the database.
+_READ_ONLY_STATEMENTS = (exp.Describe, exp.Show, exp.Summarize)
+
+
+@dataclass
+class ParsedQuery:
+    """A SQL string parsed once with the DuckDB dialect.
+
+    Validation, row limits, cache keys and table extraction all read the
+    same syntax tree, which is treated as immutable: anything that rewrites
+    the query works on a copy. ``error`` holds the parser message when the
+    string does not parse, in which case ``expression`` is ``None``.
+    """
+
+    sql: str
+    expression: Optional[exp.Expression]
+    error: Optional[str] = None
+
+    @property
+    def is_query(self) -> bool:
+        """Whether the SQL is a single read-only query (SELECT, UNION, ...)."""
+        return isinstance(self.expression, exp.Query)
+
+    @property
+    def modifies_data(self) -> bool:
+        """Whether running the SQL may change data or the catalog.
+
+        True for anything other than queries, ``DESCRIBE``, ``SHOW``,
+        ``SUMMARIZE`` and ``EXPLAIN``, including SQL that does not parse.
+        """
+        if self.is_query or isinstance(self.expression, _READ_ONLY_STATEMENTS):
+            return False
+        return not (
+            isinstance(self.expression, exp.Command) and self.expression.name.upper() == "EXPLAIN"
+        )
+
+    @cached_property
+    def tables(self) -> Tuple[str, ...]:
+        """Names of the tables the query reads, qualified as written.
+
+        CTE names and table functions such as ``range()`` are left out.
+        """
+
+        if self.expression is None:
+            return ()
+        ctes = {cte.alias_or_name for cte in self.expression.find_all(exp.CTE)}
+        names = []
+        for table in self.expression.find_all(exp.Table):
+            if not table.name or (table.name in ctes and not table.db):
+                continue
+            name = ".".join(part for part in (table.catalog, table.db, table.name) if part)
+            if name not in names:
+                names.append(name)
+        return tuple(names)
+
+    @cached_property
+    def canonical(self) -> Optional[CanonicalQuery]:
+        """The canonical form used as a result cache key.
+
+        ``None`` for anything whose results must not be cached: unparseable
+        SQL, statements other than queries and queries calling volatile
+        functions such as ``random()`` or ``now()``.
+        """
+
+        if not self.is_query or _is_volatile(self.expression):
+            return None
+        return _canonicalize(self.expression)
+
+    def limited(self, max_rows: int) -> "ParsedQuery":
+        """Return the query with its row count capped at ``max_rows``.
+
+        A ``LIMIT`` is added to queries without one and lowered on queries
+        whose literal limit is larger. A percentage limit does not bound the
+        row count, so such queries are wrapped in a capped subquery. Anything
+        that is not a query is returned unchanged. The rewritten query is
+        memoized like a parse, so later lookups of its SQL do not parse it
+        again.
+        """
+
+        if not self.is_query:
+            return self
+        existing = self.expression.args.get("limit")
+        options = existing.args.get("limit_options") if existing is not None else None
+        if options is not None and options.args.get("percent"):
+            expression = exp.select("*").from_(self.expression.subquery("_limited"))
+            expression = expression.limit(max_rows)
+            return _remember(
+                ParsedQuery(sql=expression.sql(dialect=DIALECT), expression=expression)
+            )
+        if existing is not None:
+            value = existing.expression
+            if isinstance(value, exp.Literal) and value.is_int and int(value.this) <= max_rows:
+                return self
+        expression = self.expression.limit(max_rows)
+        return _remember(ParsedQuery(sql=expression.sql(dialect=DIALECT), expression=expression))
+
+
+_parse_cache: "OrderedDict[str, ParsedQuery]" = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+
+def parse_query(sql: str) -> ParsedQuery:
+    """Parse ``sql`` with the DuckDB dialect, reusing earlier parses of the same string."""
+
+    with _parse_cache_lock:
+        parsed = _parse_cache.get(sql)
+        if parsed is not None:
+            _parse_cache.move_to_end(sql)
+            return parsed
+
+    try:
+        parsed = ParsedQuery(sql=sql, expression=sqlglot.parse_one(sql, read=DIALECT))
+    except Exception as exc:
+        parsed = ParsedQuery(sql=sql, expression=None, error=str(exc))
+    return _remember(parsed)
+
+
+def _remember(parsed: ParsedQuery) -> ParsedQuery:
+    with _parse_cache_lock:
+        _parse_cache[parsed.sql] = parsed
+        _parse_cache.move_to_end(parsed.sql)
+        while len(_parse_cache) > _PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return parsed
+
+
+def clear_parse_cache() -> None:
+    """Forget every memoized parse."""
+
+    with _parse_cache_lock:
+        _parse_cache.clear()
+
+
+def canonicalize_sql(sql: str) -> Optional[CanonicalQuery]:
+    """Return the canonical form of ``sql``; see :attr:`ParsedQuery.canonical`."""
+
+    return parse_query(sql).canonical
+
+
+def reads_any(sql: str, tables: Collection[str]) -> bool:
+    """Whether ``sql`` reads one of ``tables``, compared by unqualified name.
+
+    Names are matched case-insensitively; SQL that cannot be parsed is
+    assumed to read them.
+    """
+
+    parsed = parse_query(sql)
+    if parsed.expression is None:
+        return True
+    wanted = {name.rsplit(".", 1)[-1].lower() for name in tables}
+    return any(name.rsplit(".", 1)[-1].lower() in wanted for name in parsed.tables)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Collection, Dict, Mapping, Optional, Sequence, Tuple
+
+from .retrieval import SchemaIndex
+from .schema import TableSchema, schema_fingerprint
+
+if TYPE_CHECKING:  # pragma: no cover - imported for type hints only
+    from .examples import Example
+
+# Bump whenever the rendered prompt layout changes so cached prompts and
+# anything keyed on the template version are invalidated.
+PROMPT_FORMAT_VERSION = 1
+_PREFIX_CACHE_SIZE = 128
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of model tokens in ``text``."""
+
+    return (len(text) + 3) // 4
+
+
+def _format_table(
+    table_name: str, table_schema: TableSchema, include_samples: bool = True
+) -> str:
+    columns = ", ".join(table_schema.columns)
+    section = [f"Table: {table_name}({columns})"]
+    if include_samples and table_schema.sample_rows:
+        sample_lines = []
+        for row in table_schema.sample_rows[:3]:
+            formatted = ", ".join(f"{key}={value}" for key, value in row.items())
+            sample_lines.append(f"  - {formatted}")
+        section.append("Sample rows:\n" + "\n".join(sample_lines))
+    return "\n".join(section)
+
+
+def format_schema(
+    schema: Mapping[str, TableSchema],
+    tables: Optional[Sequence[str]] = None,
+    token_budget: Optional[int] = None,
+) -> str:
+    """Convert schema metadata into a textual prompt.
+
+    ``tables`` restricts (and orders) the tables that are included. With a
+    ``token_budget`` tables are added in order until the budget is used up,
+    dropping sample rows before dropping a table entirely.
+    """
+
+    return PromptTemplate(schema, token_budget=token_budget).schema_text(tables)
+
+
+@dataclass
+class PromptTemplate:
+    """A prompt compiled once for a given schema.
+
+    Table sections (including the formatted sample rows) are rendered once
+    and the schema prefix is memoized per selected table set, so each call to
+    :meth:`render` only appends the question and the previous error. Keeping
+    the schema first also gives hosted models a stable prefix to cache.
+    """
+
+    schema: Mapping[str, TableSchema]
+    index: Optional[SchemaIndex] = None
+    top_k: int = 5
+    token_budget: Optional[int] = None
+    fingerprint: str = field(init=False)
+    version: str = field(init=False)
+    _sections: Dict[Tuple[str, bool], Tuple[str, int]] = field(
+        init=False, default_factory=dict, repr=False
+    )
+    _prefixes: "OrderedDict[Optional[Tuple[str, ...]], str]" = field(
+        init=False, default_factory=OrderedDict, repr=False
+    )
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self) -> None:
+        self.fingerprint = schema_fingerprint(self.schema)
+        self.version = f"v{PROMPT_FORMAT_VERSION}-{self.fingerprint[:16]}"
+
+    def refreshed(
+        self,
+        schema: Mapping[str, TableSchema],
+        changed: Collection[str],
+        index: Optional[SchemaIndex] = None,
+    ) -> "PromptTemplate":
+        """Return a template for ``schema`` reusing the sections of unchanged tables.
+
+        ``changed`` names the tables whose description or samples differ;
+        ``index`` replaces the current schema index when given.
+        """
+
+        template = PromptTemplate(
+            schema,
+            index=index if index is not None else self.index,
+            top_k=self.top_k,
+            token_budget=self.token_budget,
+        )
+        with self._lock:
+            template._sections = {
+                key: section
+                for key, section in self._sections.items()
+                if key[0] in schema and key[0] not in changed
+            }
+        return template
+
+    def _section(self, table_name: str, include_samples: bool = True) -> Tuple[str, int]:
+        key = (table_name, include_samples)
+        section = self._sections.get(key)
+        if section is None:
+            text = _format_table(table_name, self.schema[table_name], include_samples)
+            section = self._sections[key] = (text, estimate_tokens(text))
+        return section
+
+    def schema_text(self, tables: Optional[Sequence[str]] = None) -> str:
+        """Return the schema section for ``tables`` (all tables by default)."""
+
+        key = tuple(tables) if tables is not None else None
+        with self._lock:
+            cached = self._prefixes.get(key)
+            if cached is not None:
+                self._prefixes.move_to_end(key)
+                return cached
+
+            header = "Schema:"
+            sections = [header]
+            used = estimate_tokens(header)
+            for table_name in tables if tables is not None else self.schema:
+                text, tokens = self._section(table_name)
+                if self.token_budget is not None and len(sections) > 1:
+                    if used + tokens > self.token_budget:
+                        text, tokens = self._section(table_name, include_samples=False)
+                        if used + tokens > self.token_budget:
+                            break
+                sections.append(text)
+                used += tokens
+            rendered = "\n\n".join(sections)
+
+            self._prefixes[key] = rendered
+            while len(self._prefixes) > _PREFIX_CACHE_SIZE:
+                self._prefixes.popitem(last=False)
+            return rendered
+
+    def prefix(self, question: str) -> str:
+        """Return the static schema part of the prompt for ``question``."""
+
+        tables = self.index.select(question, self.top_k) if self.index is not None else None
+        return self.schema_text(tables)
+
+    def render(
+        self,
+        question: str,
+        error: Optional[str] = None,
+        examples: Sequence["Example"] = (),
+    ) -> str:
+        """Return the full prompt for ``question`` and an optional error.
+
+        ``examples`` are earlier questions with their working SQL, shown
+        between the schema and the question as few-shot demonstrations.
+        """
+
+        prompt_parts = [self.prefix(question)]
+        if examples:
+            prompt_parts.append(
+                "Examples:\n"
+                + "\n\n".join(
+                    f"Example question: {example.question}\nSQL: {example.sql}"
+                    for example in examples
+                )
+            )
+        prompt_parts.append(f"Question: {question.strip()}".strip())
+        if error:
+            prompt_parts.append(f"Previous error: {error.strip()}")
+        prompt_parts.append("SQL query:")
+        return "\n\n".join(part for part in prompt_parts if part)
+
+    @staticmethod
+    def token_count(prompt: str, generator: Any = None) -> int:
+        """Count the tokens of ``prompt`` with the generator's own tokenizer.
+
+        Generators without a ``count_tokens`` method fall back to a character
+        based estimate.
+        """
+
+        counter = getattr(generator, "count_tokens", None)
+        if callable(counter):
+            return counter(prompt)
+        return estimate_tokens(prompt)
+
+
+def build_prompt(
+    question: str,
+    schema: Mapping[str, TableSchema],
+    error: Optional[str] = None,
+    index: Optional[SchemaIndex] = None,
+    top_k: int = 5,
+    token_budget: Optional[int] = None,
+    examples: Sequence["Example"] = (),
+) -> str:
+    """Construct the text prompt for the language model.
+
+    With a schema ``index`` only the ``top_k`` tables most relevant to the
+    question, plus the tables they join to, are described. ``examples``
+    are added as few-shot demonstrations.
+    """
+
+    template = PromptTemplate(schema, index=index, top_k=top_k, token_budget=token_budget)
+    return template.render(question, error=error, examples=examples)
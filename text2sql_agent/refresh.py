@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional
+
+from .database import DatabaseContext
+from .examples import ExampleStore
+from .prompts import PromptTemplate
+from .retrieval import SchemaIndex
+from .schema import TableSchema, cache_schema, describe_tables
+from .sqlite_watch import SQLiteChanges
+
+
+@dataclass
+class SchemaRefresh:
+    """What :func:`refresh_schema` found and rebuilt.
+
+    ``schema`` and ``template`` are the objects to use from now on; they are
+    the ones passed in when nothing changed. ``changes`` maps each attached
+    SQLite alias to its :class:`SQLiteChanges`.
+    """
+
+    schema: Dict[str, TableSchema]
+    template: Optional[PromptTemplate]
+    changes: Dict[str, SQLiteChanges] = field(default_factory=dict)
+    results_invalidated: int = 0
+    questions_invalidated: int = 0
+    examples_invalidated: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return any(self.changes.values())
+
+    @property
+    def tables(self) -> List[str]:
+        """Qualified names of the tables that were re-described or removed."""
+        return sorted(
+            f"{alias}.{table}"
+            for alias, changes in self.changes.items()
+            for table in changes.tables
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "changed": self.changed,
+            "tables": self.tables,
+            "changes": {alias: changes.to_dict() for alias, changes in self.changes.items()},
+            "results_invalidated": self.results_invalidated,
+            "questions_invalidated": self.questions_invalidated,
+            "examples_invalidated": self.examples_invalidated,
+        }
+
+
+def refresh_schema(
+    context: DatabaseContext,
+    schema: Mapping[str, TableSchema],
+    template: Optional[PromptTemplate] = None,
+    question_cache: Any = None,
+    example_store: Optional[ExampleStore] = None,
+    sample_rows: int = 5,
+    force: bool = False,
+) -> SchemaRefresh:
+    """Bring ``schema`` up to date with the SQLite files attached to ``context``.
+
+    Only tables whose definition or rows changed are described and sampled
+    again, and only what depends on them is dropped: cached results of
+    queries reading them, and remembered question answers and examples whose
+    SQL reads a table whose definition changed. The rest of the question
+    cache and example store moves over to the new schema fingerprint, and
+    the prompt template keeps the rendered sections of unchanged tables.
+    Watchers are only consulted once per their ``min_interval`` unless
+    ``force`` is set.
+
+    When a table definition changed the file is re-attached, which waits
+    for queries running on ``context``, holds off new ones meanwhile and
+    closes open streams and cursors; it raises
+    :class:`~text2sql_agent.database.ReattachError` if that fails.
+    """
+
+    changes = {alias: watcher.check(force) for alias, watcher in context.watchers.items()}
+    result = SchemaRefresh(schema=dict(schema), template=template, changes=changes)
+    if not result.changed:
+        return result
+
+    stale = set()
+    for alias, change in changes.items():
+        if change.schema_changed:
+            context.reattach_sqlite(alias)
+        stale.update(f"{alias}.{table}" for table in change.tables)
+    described = describe_tables(
+        context, [table for table in context.tables if table.fqn in stale], sample_rows
+    )
+    result.schema = {
+        table.fqn: described.get(table.fqn) or schema[table.fqn]
+        for table in context.tables
+        if table.fqn in described or table.fqn in schema
+    }
+
+    changed_names = {table for change in changes.values() for table in change.tables}
+    altered_names = {table for change in changes.values() for table in change.schema_tables}
+    if context.result_cache is not None:
+        result.results_invalidated = context.result_cache.invalidate_tables(
+            context.data_key, changed_names
+        )
+    cache_schema(context, result.schema, sample_rows)
+
+    if template is not None:
+        index = SchemaIndex.build(result.schema) if template.index is not None else None
+        result.template = template.refreshed(result.schema, stale, index=index)
+        if result.template.fingerprint != template.fingerprint:
+            migrate = getattr(question_cache, "migrate", None)
+            if migrate is not None:
+                result.questions_invalidated = migrate(
+                    template.version, result.template.version, altered_names
+                )
+            if example_store is not None:
+                result.examples_invalidated = example_store.migrate(
+                    template.fingerprint, result.template.fingerprint, altered_names
+                )
+    return result
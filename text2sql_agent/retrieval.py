@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set
+
+from .schema import TableSchema
+
+_WORD_RE = re.compile(r"[A-Za-z][a-z]*|[A-Z]+(?![a-z])|\d+")
+# Table names are repeated so that matching a table counts more than matching
+# one of its sample values.
+_TABLE_NAME_WEIGHT = 3
+_COLUMN_WEIGHT = 2
+
+
+def tokenize(text: str) -> List[str]:
+    """Split identifiers and prose into lowercase, lightly stemmed terms."""
+
+    tokens = []
+    for word in _WORD_RE.findall(str(text).replace("_", " ")):
+        token = word.lower()
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _short_name(table_name: str) -> str:
+    return table_name.rsplit(".", 1)[-1]
+
+
+def _table_terms(table_name: str, table: TableSchema, include_samples: bool) -> List[str]:
+    terms = tokenize(_short_name(table_name)) * _TABLE_NAME_WEIGHT
+    for column in table.columns:
+        terms.extend(tokenize(column) * _COLUMN_WEIGHT)
+    if include_samples:
+        for row in table.sample_rows:
+            for value in row.values():
+                if isinstance(value, str):
+                    terms.extend(tokenize(value))
+    return terms
+
+
+def infer_joins(schema: Mapping[str, TableSchema]) -> Dict[str, Set[str]]:
+    """Guess which tables join to each other from shared key columns.
+
+    Two tables are related when they share an ``*_id`` column, or when one has
+    a ``<name>_id`` column and the other table is called ``<name>``.
+    """
+
+    joins: Dict[str, Set[str]] = {name: set() for name in schema}
+    key_columns = {
+        name: {column.lower() for column in table.columns if column.lower().endswith("id")}
+        for name, table in schema.items()
+    }
+    stems = {name: tokenize(_short_name(name)) for name in schema}
+    for left in schema:
+        for right in schema:
+            if left >= right:
+                continue
+            shared = {
+                column
+                for column in key_columns[left] & key_columns[right]
+                if column.endswith("_id")
+            }
+            references = any(
+                tokenize(column)[:-1] == stems[other]
+                for table, other in ((left, right), (right, left))
+                for column in key_columns[table]
+                if column.endswith("_id")
+            )
+            if shared or references:
+                joins[left].add(right)
+                joins[right].add(left)
+    return joins
+
+
+@dataclass
+class SchemaIndex:
+    """Ranks tables by their relevance to a question.
+
+    Scores are BM25 over table names, column names and sample values. When an
+    ``embedding_model`` from the ``embeddings`` extra is given, cosine
+    similarity between sentence embeddings is blended into the score.
+    """
+
+    tables: List[str]
+    documents: List[Counter]
+    joins: Dict[str, Set[str]]
+    k1: float = 1.5
+    b: float = 0.75
+    embedder: Optional[object] = None
+    embeddings: Optional[object] = None
+    _idf: Dict[str, float] = field(init=False, repr=False)
+    _lengths: List[int] = field(init=False, repr=False)
+    _average_length: float = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        count = len(self.documents)
+        frequencies: Counter = Counter()
+        for document in self.documents:
+            frequencies.update(document.keys())
+        self._idf = {
+            term: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in frequencies.items()
+        }
+        self._lengths = [sum(document.values()) for document in self.documents]
+        self._average_length = (sum(self._lengths) / count) if count else 0.0
+
+    @classmethod
+    def build(
+        cls,
+        schema: Mapping[str, TableSchema],
+        include_samples: bool = True,
+        embedding_model: Optional[str] = None,
+    ) -> "SchemaIndex":
+        """Index ``schema`` once so questions can be matched against it."""
+
+        tables = list(schema)
+        documents = [
+            Counter(_table_terms(name, schema[name], include_samples)) for name in tables
+        ]
+        embedder = embeddings = None
+        if embedding_model:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as exc:  # pragma: no cover - depends on optional dep
+                raise ImportError(
+                    "Embedding-based schema retrieval requires the "
+                    "'sentence-transformers' package. Install it with "
+                    "`pip install text2sql-agent[embeddings]`."
+                ) from exc
+            embedder = SentenceTransformer(embedding_model)
+            texts = [
+                f"{_short_name(name)}: {', '.join(schema[name].columns)}" for name in tables
+            ]
+            embeddings = embedder.encode(texts, normalize_embeddings=True)
+        return cls(
+            tables=tables,
+            documents=documents,
+            joins=infer_joins(schema),
+            embedder=embedder,
+            embeddings=embeddings,
+        )
+
+    def scores(self, question: str) -> Dict[str, float]:
+        """Return a relevance score for every indexed table."""
+
+        terms = tokenize(question)
+        scores: Dict[str, float] = {}
+        for name, document, length in zip(self.tables, self.documents, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self._average_length or 1))
+            for term in terms:
+                frequency = document.get(term)
+                if frequency:
+                    score += self._idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores[name] = score
+
+        if self.embedder is not None and self.embeddings is not None:
+            best = max(scores.values(), default=0.0) or 1.0
+            query = self.embedder.encode([question], normalize_embeddings=True)[0]
+            similarities = self.embeddings @ query
+            for name, similarity in zip(self.tables, similarities):
+                scores[name] = 0.5 * scores[name] / best + 0.5 * float(similarity)
+        return scores
+
+    def search(self, question: str, top_k: int = 5) -> List[str]:
+        """Return the ``top_k`` most relevant tables, best first."""
+
+        scores = self.scores(question)
+        ranked = sorted(self.tables, key=lambda name: scores[name], reverse=True)
+        return ranked[:top_k]
+
+    def select(self, question: str, top_k: int = 5) -> List[str]:
+        """Return the top tables followed by the tables they join to."""
+
+        selected = self.search(question, top_k)
+        return _with_joins(selected, self.joins)
+
+
+def _with_joins(tables: Sequence[str], joins: Mapping[str, Iterable[str]]) -> List[str]:
+    selected = list(tables)
+    seen = set(selected)
+    for table in tables:
+        for related in sorted(joins.get(table, ())):
+            if related not in seen:
+                seen.add(related)
+                selected.append(related)
+    return selected
@@ -1,44 +1,240 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, List, Mapping
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
 
 import duckdb
 
 from .database import DatabaseContext, TableReference
 
+_CATALOG_QUERY = """
+SELECT database_name, schema_name, table_name, column_name, data_type
+FROM duckdb_columns()
+WHERE NOT internal
+ORDER BY database_name, schema_name, table_name, column_index
+"""
+
+_SCHEMA_CACHE_SIZE = 32
+_schema_cache: "OrderedDict[Tuple[str, str, int], Dict[str, TableSchema]]" = OrderedDict()
+_schema_cache_lock = threading.Lock()
+
 
 @dataclass
 class TableSchema:
-    """Describes a table including column names and sample rows."""
+    """Describes a table including column names, types and sample rows."""
 
     columns: List[str]
     sample_rows: List[Mapping[str, object]]
+    column_types: Dict[str, str] = field(default_factory=dict)
 
 
 def _information_schema_columns(
     connection: duckdb.DuckDBPyConnection, table: TableReference
-) -> List[str]:
+) -> List[Tuple[str, str]]:
     # Use DESCRIBE as it works reliably for both native and attached (SQLite) tables
     rows = connection.execute(f"DESCRIBE {table.fqn}").fetchall()
-    # row[0] is column_name
-    return [row[0] for row in rows]
+    # row[0] is column_name, row[1] is column_type
+    return [(row[0], row[1]) for row in rows]
+
+
+def _catalog_columns(
+    connection: duckdb.DuckDBPyConnection, tables: Sequence[TableReference]
+) -> Dict[str, List[Tuple[str, str]]]:
+    """Read the columns of every registered table with a single catalog query."""
+
+    current_database = connection.execute("SELECT current_database()").fetchone()[0]
+    wanted = {(table.schema, table.name): table.fqn for table in tables}
+    columns: Dict[str, List[Tuple[str, str]]] = {}
+    for database, schema, name, column, data_type in connection.execute(
+        _CATALOG_QUERY
+    ).fetchall():
+        if database in (current_database, "temp"):
+            key = (schema, name)
+        elif schema == "main":
+            # Attached databases (e.g. SQLite files) are referenced by alias.
+            key = (database, name)
+        else:
+            continue
+        fqn = wanted.get(key)
+        if fqn is not None:
+            columns.setdefault(fqn, []).append((column, data_type))
+
+    # Anything the catalog did not describe falls back to DESCRIBE.
+    for table in tables:
+        if table.fqn not in columns:
+            columns[table.fqn] = _information_schema_columns(connection, table)
+    return columns
+
+
+def _catalog_fingerprint(columns: Mapping[str, List[Tuple[str, str]]]) -> str:
+    digest = hashlib.sha256()
+    for fqn in sorted(columns):
+        digest.update(fqn.encode("utf-8"))
+        for column, data_type in columns[fqn]:
+            digest.update(f"\0{column}\0{data_type}".encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def _sample_table(
+    connection: duckdb.DuckDBPyConnection, table: TableReference, sample_rows: int
+) -> List[Mapping[str, object]]:
+    preview_df = connection.execute(
+        f"SELECT * FROM {table.fqn} LIMIT {sample_rows}"
+    ).fetchdf()
+    return preview_df.to_dict(orient="records")
+
+
+def _sample_tables(
+    context: DatabaseContext,
+    tables: Sequence[TableReference],
+    sample_rows: int,
+    max_workers: int,
+) -> Dict[str, List[Mapping[str, object]]]:
+    if sample_rows <= 0:
+        return {table.fqn: [] for table in tables}
+    if max_workers <= 1 or len(tables) <= 1:
+        return {
+            table.fqn: _sample_table(context.connection, table, sample_rows)
+            for table in tables
+        }
+
+    local = threading.local()
+    cursors: List[duckdb.DuckDBPyConnection] = []
+    cursors_lock = threading.Lock()
+
+    def sample(table: TableReference) -> List[Mapping[str, object]]:
+        # DuckDB connections are not safe to share across threads; each
+        # worker gets its own cursor on the same database.
+        cursor = getattr(local, "cursor", None)
+        if cursor is None:
+            cursor = local.cursor = context.cursor()
+            with cursors_lock:
+                cursors.append(cursor)
+        return _sample_table(cursor, table, sample_rows)
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(tables))) as pool:
+            samples = list(pool.map(sample, tables))
+    finally:
+        for cursor in cursors:
+            cursor.close()
+    return {table.fqn: rows for table, rows in zip(tables, samples)}
+
+
+def schema_fingerprint(schema: Mapping[str, TableSchema]) -> str:
+    """Return a stable hash of the table names, columns and column types."""
+
+    return _catalog_fingerprint(
+        {
+            name: [(column, table.column_types.get(column, "")) for column in table.columns]
+            for name, table in schema.items()
+        }
+    )
+
+
+def _data_key(context: DatabaseContext) -> str:
+    # Unchanged data is exactly the loaded file, wherever it was loaded from.
+    if context.source_digest and context.data_version == 0:
+        return f"sha256:{context.source_digest}"
+    return context.data_key
+
+
+def clear_schema_cache() -> None:
+    """Forget every cached schema extraction."""
+
+    with _schema_cache_lock:
+        _schema_cache.clear()
 
 
 def extract_schema(
-    context: DatabaseContext, sample_rows: int = 5
+    context: DatabaseContext,
+    sample_rows: int = 5,
+    max_workers: int = 4,
+    use_cache: bool = True,
 ) -> Dict[str, TableSchema]:
-    """Return column metadata and example rows for the registered tables."""
+    """Return column metadata and example rows for the registered tables.
+
+    Columns and types for all tables are read in one catalog query and the
+    sample rows are fetched concurrently. Results are cached against a
+    fingerprint of the catalog and the state of the data, so re-loading the
+    same dataset skips the sampling entirely while a bumped data version
+    samples again. Until the data is first changed that state is the
+    file's content when ``source_digest`` is known, as for server uploads,
+    and otherwise its path, size and modification time.
+    """
+
+    columns = _catalog_columns(context.connection, context.tables)
+    cache_key: Optional[Tuple[str, str, int]] = None
+    if use_cache and context.fingerprint:
+        cache_key = (_catalog_fingerprint(columns), _data_key(context), sample_rows)
+        with _schema_cache_lock:
+            cached = _schema_cache.get(cache_key)
+            if cached is not None:
+                _schema_cache.move_to_end(cache_key)
+                return dict(cached)
 
+    schema = _describe(context, context.tables, columns, sample_rows, max_workers)
+    if cache_key is not None:
+        _remember_schema(cache_key, schema)
+    return schema
+
+
+def _describe(
+    context: DatabaseContext,
+    tables: Sequence[TableReference],
+    columns: Mapping[str, List[Tuple[str, str]]],
+    sample_rows: int,
+    max_workers: int,
+) -> Dict[str, TableSchema]:
+    samples = _sample_tables(context, tables, sample_rows, max_workers)
     schema: Dict[str, TableSchema] = {}
-    for table in context.tables:
+    for table in tables:
         qualified_name = table.fqn
-        columns = _information_schema_columns(context.connection, table)
-        preview_df = context.connection.execute(
-            f"SELECT * FROM {qualified_name} LIMIT {sample_rows}"
-        ).fetchdf()
+        table_columns = columns[qualified_name]
         schema[qualified_name] = TableSchema(
-            columns=columns,
-            sample_rows=preview_df.to_dict(orient="records"),
+            columns=[name for name, _ in table_columns],
+            sample_rows=samples[qualified_name],
+            column_types=dict(table_columns),
         )
     return schema
+
+
+def _remember_schema(cache_key: Tuple[str, str, int], schema: Dict[str, TableSchema]) -> None:
+    with _schema_cache_lock:
+        _schema_cache[cache_key] = dict(schema)
+        _schema_cache.move_to_end(cache_key)
+        while len(_schema_cache) > _SCHEMA_CACHE_SIZE:
+            _schema_cache.popitem(last=False)
+
+
+def describe_tables(
+    context: DatabaseContext,
+    tables: Sequence[TableReference],
+    sample_rows: int = 5,
+    max_workers: int = 4,
+) -> Dict[str, TableSchema]:
+    """Describe and sample only ``tables``, bypassing the schema cache."""
+
+    if not tables:
+        return {}
+    columns = _catalog_columns(context.connection, tables)
+    return _describe(context, tables, columns, sample_rows, max_workers)
+
+
+def cache_schema(
+    context: DatabaseContext, schema: Mapping[str, TableSchema], sample_rows: int = 5
+) -> None:
+    """Store ``schema`` as what :func:`extract_schema` returns for ``context``.
+
+    Used after an incremental refresh so a later full extraction does not
+    return the snapshot taken before the data changed.
+    """
+
+    if context.fingerprint:
+        key = (schema_fingerprint(schema), _data_key(context), sample_rows)
+        _remember_schema(key, dict(schema))
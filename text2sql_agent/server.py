@@ -1,18 +1,62 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
+import json
 import os
 import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
 from typing import Dict, Any, Optional
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
-from .agent import agent_loop
-from .database import load_database, DatabaseContext
+from .agent import AgentError, agent_loop, async_agent_loop
+from .cursors import DEFAULT_PAGE_SIZE, CursorLimitError, CursorRegistry
+from .batching import MicroBatcher
+from .caches import (
+    DEFAULT_RESULT_CACHE_BYTES,
+    InMemoryQuestionCache,
+    ResultCache,
+    SQLiteQuestionCache,
+)
+from .database import load_database, DatabaseContext, EngineSettings, ReattachError
+from .execution import QueryLimits
 from .schema import extract_schema
-from .generator import OpenAIGenerator, TransformersSQLGenerator
+from .sessions import DEFAULT_MEMORY_BUDGET, Dataset, DatasetRegistry
+from .examples import ExampleStore
+from .generator import (
+    AsyncOpenAIGenerator,
+    TransformersSQLGenerator,
+    async_generate_sql,
+)
+from .ingest_cache import IngestionCache
+from .metrics import PROMETHEUS_CONTENT_TYPE, AgentMetrics
+from .prompts import PromptTemplate
+from .refresh import SchemaRefresh, refresh_schema
+from .retrieval import SchemaIndex
+from .streaming import ARROW_STREAM_MEDIA_TYPE, NDJSON_MEDIA_TYPE, ResultStream
+from .tracing import Trace
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PRELOAD_LOCAL_MODEL:
+        # Load and warm up the model before accepting requests.
+        await _local_generator()
+    yield
 
-app = FastAPI(title="Text2SQL Agent API")
+app = FastAPI(title="Text2SQL Agent API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,57 +68,405 @@ app.add_middleware(
 
 # Global state for the demo
 class AgentState:
-    context: Optional[DatabaseContext] = None
-    schema: Optional[Dict] = None
+    # The most recently uploaded dataset answers requests without a dataset_id.
+    dataset_id: Optional[str] = None
     generator: Any = None
+    # Kept across switches between model types so the model loads only once.
+    local_generator: Optional[MicroBatcher] = None
 
 state = AgentState()
 
+# Open compiler results that clients page through by cursor id.
+cursors = CursorRegistry(
+    max_open=int(os.getenv("TEXT2SQL_MAX_CURSORS", "32")),
+    idle_timeout=float(os.getenv("TEXT2SQL_CURSOR_IDLE_SECONDS", "300")),
+)
+
+# Every uploaded dataset stays loaded, addressed by its id, until the DuckDB
+# memory they hold exceeds the budget; then the least recently used ones are
+# spilled to TEXT2SQL_SPILL_DIR (or closed when it is unset).
+datasets = DatasetRegistry(
+    memory_budget=int(os.getenv("TEXT2SQL_MEMORY_BUDGET", str(DEFAULT_MEMORY_BUDGET))),
+    spill_dir=os.getenv("TEXT2SQL_SPILL_DIR") or None,
+    cursors=cursors,
+)
+
+# Uploaded CSV/JSON files are materialized into this directory once and
+# re-opened on later uploads of the same content.
+_cache_dir = os.getenv("TEXT2SQL_CACHE_DIR")
+ingest_cache: Optional[IngestionCache] = IngestionCache(_cache_dir) if _cache_dir else None
+
+# Prompts only describe the tables most relevant to each question.
+SCHEMA_TOP_K = int(os.getenv("TEXT2SQL_TOP_K", "5"))
+_token_budget = os.getenv("TEXT2SQL_TOKEN_BUDGET")
+SCHEMA_TOKEN_BUDGET: Optional[int] = int(_token_budget) if _token_budget else None
+
+# Successful question -> SQL pairs, keyed by the schema version, optionally
+# persisted to a SQLite file so they survive restarts.
+_question_cache_path = os.getenv("TEXT2SQL_QUESTION_CACHE")
+question_cache = (
+    SQLiteQuestionCache(_question_cache_path)
+    if _question_cache_path
+    else InMemoryQuestionCache()
+)
+
+# Answered questions with their SQL, shown to the model as few-shot examples
+# for similar later questions; persisted when TEXT2SQL_EXAMPLE_STORE names a
+# SQLite file. TEXT2SQL_NUM_EXAMPLES=0 turns retrieval off.
+_example_store_path = os.getenv("TEXT2SQL_EXAMPLE_STORE")
+example_store = ExampleStore(_example_store_path or None)
+NUM_EXAMPLES = int(os.getenv("TEXT2SQL_NUM_EXAMPLES", "3"))
+
+# Concurrent requests for the local model are grouped into batched
+# forward passes.
+BATCH_MAX_SIZE = int(os.getenv("TEXT2SQL_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT = float(os.getenv("TEXT2SQL_BATCH_MAX_WAIT_MS", "10")) / 1000
+
+# The local model. With TEXT2SQL_PRELOAD_LOCAL_MODEL it is loaded and warmed
+# up at startup instead of on the first local request.
+LOCAL_MODEL_NAME = os.getenv("TEXT2SQL_LOCAL_MODEL", "mrm8488/t5-base-finetuned-wikiSQL")
+LOCAL_MODEL_BACKEND = os.getenv("TEXT2SQL_LOCAL_BACKEND", "torch")
+LOCAL_NUM_BEAMS = int(os.getenv("TEXT2SQL_NUM_BEAMS", "4"))
+PRELOAD_LOCAL_MODEL = os.getenv("TEXT2SQL_PRELOAD_LOCAL_MODEL", "").lower() in {"1", "true", "yes"}
+
+# Completions in flight at once against the OpenAI API.
+OPENAI_CONCURRENCY = int(os.getenv("TEXT2SQL_OPENAI_CONCURRENCY", "8"))
+
+# With more than one candidate, each /query round generates that many SQL
+# queries and executes the valid ones in parallel, retrying until the time
+# budget (in seconds) is spent.
+QUERY_CANDIDATES = int(os.getenv("TEXT2SQL_CANDIDATES", "1"))
+_time_budget = os.getenv("TEXT2SQL_TIME_BUDGET")
+QUERY_TIME_BUDGET: Optional[float] = float(_time_budget) if _time_budget else None
+QUERY_SELECTION = os.getenv("TEXT2SQL_SELECTION", "first")
+
+# Query results keyed by canonical SQL and the loaded dataset's version.
+result_cache = ResultCache(
+    max_bytes=int(os.getenv("TEXT2SQL_RESULT_CACHE_BYTES", str(DEFAULT_RESULT_CACHE_BYTES)))
+)
+
+# DuckDB resources for each loaded dataset. Queries run on per-request
+# cursors in a bounded pool so independent requests execute in parallel
+# without oversubscribing the cores DuckDB itself parallelizes over.
+_duckdb_threads = os.getenv("TEXT2SQL_DUCKDB_THREADS")
+engine_settings = EngineSettings(
+    threads=int(_duckdb_threads) if _duckdb_threads else None,
+    memory_limit=os.getenv("TEXT2SQL_DUCKDB_MEMORY_LIMIT") or None,
+)
+# Every query against an uploaded dataset is cancelled after
+# TEXT2SQL_QUERY_TIMEOUT seconds, and full results are capped at
+# TEXT2SQL_MAX_ROWS rows. Streamed and paged results are only capped when
+# TEXT2SQL_MAX_STREAMED_ROWS is set; streams then carry an X-Row-Limit
+# header and the last page of a cut-off cursor has "truncated" set.
+_query_timeout = os.getenv("TEXT2SQL_QUERY_TIMEOUT", "30")
+_max_rows = os.getenv("TEXT2SQL_MAX_ROWS", "100000")
+_max_streamed_rows = os.getenv("TEXT2SQL_MAX_STREAMED_ROWS")
+query_limits = QueryLimits(
+    timeout=float(_query_timeout) if _query_timeout else None,
+    max_rows=int(_max_rows) if _max_rows else None,
+    max_streamed_rows=int(_max_streamed_rows) if _max_streamed_rows else None,
+)
+query_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TEXT2SQL_QUERY_WORKERS", str(min(32, (os.cpu_count() or 1) + 4)))),
+    thread_name_prefix="query",
+)
+# /query agent loops run here and spend most of their time waiting on the
+# model; only their DuckDB work is handed to query_executor, so slow
+# generations never hold query workers.
+agent_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TEXT2SQL_AGENT_WORKERS", "64")),
+    thread_name_prefix="agent",
+)
+
+# Per-stage timings of every /query request are returned in the response and
+# aggregated into the Prometheus histograms served at /metrics. With
+# TEXT2SQL_METRICS=0 requests are not traced and /metrics is disabled.
+METRICS_ENABLED = os.getenv("TEXT2SQL_METRICS", "1").lower() not in {"0", "false", "no"}
+metrics = AgentMetrics()
+
+# With TEXT2SQL_WATCH_SQLITE=1, uploaded SQLite files are watched for
+# changes: /query, /api/generate_sql and /api/execute_sql look for them at
+# most once every TEXT2SQL_REFRESH_INTERVAL seconds and describe only the
+# changed tables again; POST /datasets/{id}/refresh looks immediately.
+WATCH_SQLITE = os.getenv("TEXT2SQL_WATCH_SQLITE", "").lower() in {"1", "true", "yes"}
+REFRESH_INTERVAL = float(os.getenv("TEXT2SQL_REFRESH_INTERVAL", "5"))
+
+async def _run_query(func, *args, **kwargs):
+    """Run blocking DuckDB work in the query pool and await its result."""
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(query_executor, functools.partial(func, *args, **kwargs))
+
+_local_generator_lock = threading.Lock()
+
+def _load_local_generator() -> MicroBatcher:
+    with _local_generator_lock:
+        if state.local_generator is None:
+            model = TransformersSQLGenerator(
+                model_name=LOCAL_MODEL_NAME,
+                num_beams=LOCAL_NUM_BEAMS,
+                backend=LOCAL_MODEL_BACKEND,
+                warmup=True,
+            )
+            state.local_generator = MicroBatcher(
+                model, max_batch_size=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT
+            )
+    return state.local_generator
+
+async def _local_generator() -> MicroBatcher:
+    """Return the local model, loading it off the event loop on first use."""
+
+    if state.local_generator is not None:
+        return state.local_generator
+    return await run_in_threadpool(_load_local_generator)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_TRACKED_JOBS = 100
+
+# Ingestion and schema extraction run here so the event loop keeps serving
+# the currently loaded dataset while a large upload is processed.
+ingest_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TEXT2SQL_INGEST_WORKERS", "2")),
+    thread_name_prefix="ingest",
+)
+
+@dataclass
+class IngestJob:
+    """Tracks a background ingestion started by an upload."""
+
+    id: str
+    filename: str
+    digest: str
+    size: int
+    status: str = "pending"  # 'pending', 'running', 'succeeded' or 'failed'
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    schema: Optional[Dict] = None
+    dataset_id: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "dataset_id": self.dataset_id,
+            "filename": self.filename,
+            "digest": self.digest,
+            "size": self.size,
+            "status": self.status,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+
+jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+
+def _track_job(job: IngestJob) -> None:
+    jobs[job.id] = job
+    while len(jobs) > MAX_TRACKED_JOBS:
+        jobs.popitem(last=False)
+
+def _run_ingest_job(job: IngestJob, file_location: Path) -> None:
+    job.status = "running"
+    upload_dir = file_location.parent
+    context: Optional[DatabaseContext] = None
+    try:
+        context = load_database(
+            file_location,
+            cache=ingest_cache,
+            digest=job.digest,
+            settings=engine_settings,
+            watch_interval=REFRESH_INTERVAL if WATCH_SQLITE else None,
+        )
+        context.result_cache = result_cache
+        context.limits = query_limits
+        schema = extract_schema(context)
+        index = SchemaIndex.build(schema)
+        template = PromptTemplate(
+            schema, index=index, top_k=SCHEMA_TOP_K, token_budget=SCHEMA_TOKEN_BUDGET
+        )
+    except Exception as exc:
+        job.status = "failed"
+        job.error = str(exc)
+        if context is not None:
+            context.close()
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
+    finally:
+        job.finished_at = time.time()
+    # CSV/JSON uploads opened from the ingestion cache no longer read the
+    # uploaded copy; anything else keeps it until the dataset is closed.
+    source_dir: Optional[Path] = upload_dir
+    if ingest_cache is not None and file_location.suffix.lower() in {".csv", ".json"}:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        source_dir = None
+    # Register the dataset only once it is fully loaded.
+    dataset = Dataset(
+        id=job.id,
+        name=job.filename,
+        context=context,
+        schema=schema,
+        index=index,
+        template=template,
+        source_dir=source_dir,
+    )
+    datasets.add(dataset)
+    state.dataset_id = dataset.id
+    job.schema = schema
+    job.dataset_id = dataset.id
+    job.status = "succeeded"
+
+def _get_dataset(dataset_id: Optional[str]) -> Dataset:
+    """Return the requested dataset, or the latest upload when no id is given."""
+
+    if dataset_id is None:
+        dataset_id = state.dataset_id
+        if dataset_id is None:
+            raise HTTPException(status_code=400, detail="No database loaded. Please upload a file first.")
+    try:
+        return datasets.get(dataset_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown or evicted dataset: {dataset_id}")
+
+def _refresh_dataset(dataset: Dataset, force: bool = False) -> SchemaRefresh:
+    """Pick up changes to the dataset's SQLite file and swap in the new schema."""
+
+    with dataset.refresh_lock:
+        refresh = refresh_schema(
+            dataset.context,
+            dataset.schema,
+            dataset.template,
+            question_cache=question_cache,
+            example_store=example_store,
+            force=force,
+        )
+        if refresh.changed:
+            dataset.schema = refresh.schema
+            dataset.template = refresh.template
+            if refresh.template is not None:
+                dataset.index = refresh.template.index
+    return refresh
+
+async def _refresh(dataset: Dataset, force: bool = False) -> SchemaRefresh:
+    try:
+        return await _run_query(_refresh_dataset, dataset, force=force)
+    except ReattachError as exc:
+        # The changed file is no longer attached; nothing on it can be served.
+        datasets.remove(dataset.id)
+        if state.dataset_id == dataset.id:
+            state.dataset_id = None
+        raise HTTPException(
+            status_code=409, detail=f"{exc}. The dataset was unloaded; upload it again."
+        )
+
+async def _auto_refresh(dataset: Dataset) -> None:
+    if dataset.context.watchers:
+        await _refresh(dataset)
+
+async def _save_upload(file: UploadFile, destination: Path) -> tuple[str, int]:
+    """Stream the upload to disk in chunks, hashing it on the way."""
+
+    digest = hashlib.sha256()
+    size = 0
+    handle = await run_in_threadpool(open, destination, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+            await run_in_threadpool(handle.write, chunk)
+    finally:
+        await run_in_threadpool(handle.close)
+    return digest.hexdigest(), size
+
 class QueryRequest(BaseModel):
     question: str
     model_type: str = "openai"  # 'openai' or 'local'
+    dataset_id: Optional[str] = None
 
 class QueryResponse(BaseModel):
     sql: str
     answer: str
     rows: list[dict]
     attempts: int
+    prompt_tokens: int = 0
+    cache_hit: bool = False
+    row_count: Optional[int] = None
+    trace: Optional[dict] = None
     error: Optional[str] = None
 
 class ExecuteSQLRequest(BaseModel):
     sql: str
+    dataset_id: Optional[str] = None
 
 class ExecuteSQLResponse(BaseModel):
     rows: list[dict]
     error: Optional[str] = None
 
+class OpenCursorRequest(BaseModel):
+    sql: str
+    page_size: int = Field(DEFAULT_PAGE_SIZE, ge=1)
+    dataset_id: Optional[str] = None
+
 class GenerateSQLRequest(BaseModel):
     question: str
     model_type: str = "openai"
+    dataset_id: Optional[str] = None
 
 class GenerateSQLResponse(BaseModel):
     sql: str
     error: Optional[str] = None
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), wait: bool = True):
+    upload_dir: Optional[Path] = None
     try:
-        # Save file to temp location
-        file_location = f"/tmp/{file.filename}"
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
-        
-        state.context = load_database(file_location)
-        state.schema = extract_schema(state.context)
-        
-        return {"message": "File uploaded and processed successfully", "schema": state.schema}
+        # Save file to a per-upload temp directory, keeping its name so the
+        # table name is derived from it.
+        upload_dir = Path(tempfile.mkdtemp(prefix="text2sql-upload-"))
+        file_location = upload_dir / Path(file.filename or "upload").name
+        digest, size = await _save_upload(file, file_location)
     except Exception as e:
+        if upload_dir is not None:
+            shutil.rmtree(upload_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+    job = IngestJob(id=uuid.uuid4().hex, filename=file_location.name, digest=digest, size=size)
+    _track_job(job)
+    future = ingest_executor.submit(_run_ingest_job, job, file_location)
+    if not wait:
+        return JSONResponse(status_code=202, content=job.to_dict())
+
+    try:
+        await asyncio.wrap_future(future)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "message": "File uploaded and processed successfully",
+        "schema": job.schema,
+        "job_id": job.id,
+        "dataset_id": job.dataset_id,
+    }
+
+@app.get("/upload/{job_id}")
+def upload_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown upload job: {job_id}")
+    payload = job.to_dict()
+    if job.status == "succeeded":
+        payload["schema"] = job.schema
+    return payload
+
 @app.post("/query", response_model=QueryResponse)
 async def query_agent(request: QueryRequest):
-    if not state.context or not state.schema:
-        raise HTTPException(status_code=400, detail="No database loaded. Please upload a file first.")
+    with metrics.in_flight("query"):
+        return await _answer_query(request)
+
+async def _answer_query(request: QueryRequest) -> QueryResponse:
+    dataset = _get_dataset(request.dataset_id)
+    await _auto_refresh(dataset)
 
     # Initialize generator if needed or changed
     if request.model_type == "openai":
@@ -83,64 +475,262 @@ async def query_agent(request: QueryRequest):
              # Or just raise the error. The user needs to know.
              # Let's keep raising the error but make it very clear.
              raise HTTPException(status_code=400, detail="OPENAI_API_KEY not found. Please switch to 'Local' model in the dropdown or set the environment variable.")
-        if not isinstance(state.generator, OpenAIGenerator):
-            state.generator = OpenAIGenerator()
+        if not isinstance(state.generator, AsyncOpenAIGenerator):
+            state.generator = AsyncOpenAIGenerator(max_concurrency=OPENAI_CONCURRENCY)
     else:
-        if not isinstance(state.generator, TransformersSQLGenerator):
-            state.generator = TransformersSQLGenerator()
+        if not isinstance(state.generator, MicroBatcher):
+            state.generator = await _local_generator()
 
+    trace = Trace() if METRICS_ENABLED else None
     try:
-        response = agent_loop(request.question, state.schema, state.context, state.generator)
-        return QueryResponse(
-            sql=response.sql,
-            answer=response.answer,
-            rows=response.rows,
-            attempts=response.attempts
-        )
+        agent_options = {
+            "prompt_template": dataset.template,
+            "question_cache": question_cache,
+            "candidates": QUERY_CANDIDATES,
+            "time_budget": QUERY_TIME_BUDGET,
+            "selection": QUERY_SELECTION,
+            "trace": trace,
+            "example_store": example_store if NUM_EXAMPLES > 0 else None,
+            "num_examples": NUM_EXAMPLES,
+        }
+        if isinstance(state.generator, AsyncOpenAIGenerator):
+            response = await async_agent_loop(
+                request.question,
+                dataset.schema,
+                dataset.context,
+                state.generator,
+                executor=agent_executor,
+                query_executor=query_executor,
+                **agent_options,
+            )
+        else:
+            # Run off the event loop so concurrent requests can be batched.
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                agent_executor,
+                functools.partial(
+                    agent_loop,
+                    request.question,
+                    dataset.schema,
+                    dataset.context,
+                    state.generator,
+                    query_executor=query_executor,
+                    **agent_options,
+                ),
+            )
     except Exception as e:
         # If the agent loop fails completely (e.g. max retries)
+        attempts = e.attempts if isinstance(e, AgentError) else 0
+        if METRICS_ENABLED:
+            metrics.observe(trace, attempts=attempts, cache_hit=False, outcome="error")
         return QueryResponse(
             sql="",
             answer="Failed to generate a valid query.",
             rows=[],
-            attempts=0,
+            attempts=attempts,
+            trace=trace.to_dict() if trace is not None else None,
             error=str(e)
         )
+    if METRICS_ENABLED:
+        metrics.observe(trace, attempts=response.attempts, cache_hit=response.cache_hit)
+    return QueryResponse(
+        sql=response.sql,
+        answer=response.answer,
+        rows=response.rows,
+        attempts=response.attempts,
+        prompt_tokens=response.prompt_tokens,
+        cache_hit=response.cache_hit,
+        row_count=response.row_count,
+        trace=trace.to_dict() if trace is not None else None,
+    )
+
+def _streaming_media_type(accept: Optional[str]) -> Optional[str]:
+    """Pick a streaming format from the Accept header, if the client asked for one."""
+
+    if not accept:
+        return None
+    for media_type in (ARROW_STREAM_MEDIA_TYPE, NDJSON_MEDIA_TYPE):
+        if media_type in accept:
+            return media_type
+    return None
 
 @app.post("/api/execute_sql", response_model=ExecuteSQLResponse)
-async def execute_sql(request: ExecuteSQLRequest):
-    if not state.context:
-        raise HTTPException(status_code=400, detail="No database loaded. Please upload a file first.")
-    
+async def execute_sql(request: ExecuteSQLRequest, accept: Optional[str] = Header(None)):
+    with metrics.in_flight("execute_sql"):
+        return await _execute_sql(request, accept)
+
+async def _execute_sql(request: ExecuteSQLRequest, accept: Optional[str]):
+    dataset = _get_dataset(request.dataset_id)
+    await _auto_refresh(dataset)
+
+    # Clients that accept NDJSON or Arrow IPC get rows streamed batch by batch
+    # instead of one JSON document holding the whole result.
+    media_type = _streaming_media_type(accept)
+    if media_type is not None:
+        try:
+            stream = await _run_query(ResultStream, dataset.context, request.sql)
+        except Exception as e:
+            return ExecuteSQLResponse(rows=[], error=str(e))
+        body = stream.arrow_ipc() if media_type == ARROW_STREAM_MEDIA_TYPE else stream.ndjson()
+        headers = {"X-Columns": json.dumps(stream.columns)}
+        if stream.row_limit is not None:
+            headers["X-Row-Limit"] = str(stream.row_limit)
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+
     try:
-        rows = state.context.execute_raw_query(request.sql)
+        rows = await _run_query(dataset.context.execute_raw_query, request.sql)
         return ExecuteSQLResponse(rows=rows)
     except Exception as e:
         return ExecuteSQLResponse(rows=[], error=str(e))
 
+@app.post("/api/cursors")
+async def open_cursor(request: OpenCursorRequest):
+    dataset = _get_dataset(request.dataset_id)
+    try:
+        page = await _run_query(
+            cursors.open, dataset.context, request.sql, request.page_size, dataset.id
+        )
+    except CursorLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        return {"cursor_id": None, "columns": [], "column_types": [], "rows": [], "error": str(e)}
+    return page.to_dict()
+
+@app.get("/api/cursors/{cursor_id}")
+async def fetch_cursor(cursor_id: str, page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1)):
+    try:
+        page = await _run_query(cursors.fetch, cursor_id, page_size)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired cursor: {cursor_id}")
+    return page.to_dict()
+
+@app.delete("/api/cursors/{cursor_id}")
+def close_cursor(cursor_id: str):
+    if not cursors.close(cursor_id):
+        raise HTTPException(status_code=404, detail=f"Unknown or expired cursor: {cursor_id}")
+    return {"closed": True}
+
 @app.post("/api/generate_sql", response_model=GenerateSQLResponse)
 async def generate_sql(request: GenerateSQLRequest):
-    if not state.context or not state.schema:
-        raise HTTPException(status_code=400, detail="No database loaded. Please upload a file first.")
+    dataset = _get_dataset(request.dataset_id)
+    await _auto_refresh(dataset)
 
     # Initialize generator if needed
     if request.model_type == "openai":
         if not os.getenv("OPENAI_API_KEY"):
              raise HTTPException(status_code=400, detail="OPENAI_API_KEY not found.")
-        if not isinstance(state.generator, OpenAIGenerator):
-            state.generator = OpenAIGenerator()
+        if not isinstance(state.generator, AsyncOpenAIGenerator):
+            state.generator = AsyncOpenAIGenerator(max_concurrency=OPENAI_CONCURRENCY)
     else:
-        if not isinstance(state.generator, TransformersSQLGenerator):
-            state.generator = TransformersSQLGenerator()
+        if not isinstance(state.generator, MicroBatcher):
+            state.generator = await _local_generator()
 
     try:
-        # Use the generate_sql function from generator module
-        from .generator import generate_sql as gen_sql
-        sql = gen_sql(request.question, state.schema, state.generator)
+        if isinstance(state.generator, AsyncOpenAIGenerator):
+            sql = await async_generate_sql(
+                request.question, dataset.schema, state.generator, template=dataset.template
+            )
+        else:
+            # Use the generate_sql function from generator module
+            from .generator import generate_sql as gen_sql
+            sql = await run_in_threadpool(
+                gen_sql,
+                request.question,
+                dataset.schema,
+                state.generator,
+                template=dataset.template,
+            )
         return GenerateSQLResponse(sql=sql)
     except Exception as e:
         return GenerateSQLResponse(sql="", error=str(e))
 
+@app.get("/datasets")
+def list_datasets():
+    return {
+        "default": state.dataset_id,
+        "memory_budget": datasets.memory_budget,
+        "memory_bytes": datasets.memory_usage(),
+        "datasets": [dataset.to_dict() for dataset in reversed(datasets.datasets())],
+    }
+
+@app.delete("/datasets/{dataset_id}")
+def remove_dataset(dataset_id: str):
+    if not datasets.remove(dataset_id):
+        raise HTTPException(status_code=404, detail=f"Unknown or evicted dataset: {dataset_id}")
+    if state.dataset_id == dataset_id:
+        state.dataset_id = None
+    return {"removed": True}
+
+@app.post("/datasets/{dataset_id}/refresh")
+async def refresh_dataset(dataset_id: str):
+    dataset = _get_dataset(dataset_id)
+    refresh = await _refresh(dataset, force=True)
+    return refresh.to_dict()
+
+@app.get("/cache")
+def list_cache():
+    results = {
+        **result_cache.stats.to_dict(),
+        "entries": len(result_cache),
+        "bytes": result_cache.total_bytes,
+    }
+    if ingest_cache is None:
+        return {"enabled": False, "entries": [], "results": results}
+    entries = [
+        {"key": entry.key, "size": entry.size, "last_used": entry.last_used}
+        for entry in ingest_cache.entries()
+    ]
+    return {
+        "enabled": True,
+        "max_bytes": ingest_cache.max_bytes,
+        "entries": entries,
+        "results": results,
+    }
+
+@app.delete("/cache")
+def purge_cache():
+    cleared = result_cache.invalidate()
+    if ingest_cache is None:
+        return {"removed": 0, "results_cleared": cleared}
+    return {"removed": ingest_cache.purge(), "results_cleared": cleared}
+
+@app.get("/api/batch_stats")
+def batch_stats():
+    if not isinstance(state.generator, MicroBatcher):
+        return {"enabled": False}
+    return {"enabled": True, **state.generator.stats.to_dict()}
+
+@app.get("/api/example_stats")
+def example_stats():
+    return {
+        "enabled": NUM_EXAMPLES > 0,
+        "examples": len(example_store),
+        **example_store.stats.to_dict(),
+    }
+
+@app.get("/api/model_stats")
+def model_stats():
+    if state.local_generator is None:
+        return {"loaded": False}
+    model = state.local_generator.generator
+    return {
+        "loaded": True,
+        "model": model.model_name,
+        "backend": model.backend,
+        "num_beams": model.num_beams,
+        **model.timings.to_dict(),
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (TEXT2SQL_METRICS=0).")
+    caches = {"results": result_cache.stats}
+    question_stats = getattr(question_cache, "stats", None)
+    if question_stats is not None:
+        caches["questions"] = question_stats
+    return PlainTextResponse(metrics.render(caches), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
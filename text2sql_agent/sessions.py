@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import duckdb
+
+from .cursors import CursorRegistry
+from .database import DatabaseContext, _quote_identifier, _quote_literal
+from .prompts import PromptTemplate
+from .retrieval import SchemaIndex
+from .schema import TableSchema
+
+DEFAULT_MEMORY_BUDGET = 2 * 1024 * 1024 * 1024
+_SPILL_ALIAS = "_spill"
+
+
+@dataclass
+class Dataset:
+    """A loaded dataset with everything needed to answer questions about it."""
+
+    id: str
+    name: str
+    context: DatabaseContext
+    schema: Dict[str, TableSchema]
+    index: Optional[SchemaIndex] = None
+    template: Optional[PromptTemplate] = None
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    memory_bytes: int = 0
+    spilled: bool = False
+    # Directory holding the uploaded source file, removed with the dataset.
+    source_dir: Optional[Path] = None
+    # Serializes schema refreshes of this dataset.
+    refresh_lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "dataset_id": self.id,
+            "name": self.name,
+            "tables": sorted(self.schema),
+            "created_at": self.created_at,
+            "last_used": self.last_used,
+            "memory_bytes": self.memory_bytes,
+            "spilled": self.spilled,
+        }
+
+
+class DatasetRegistry:
+    """Keeps several datasets loaded at once within a shared memory budget.
+
+    Datasets are addressed by id. Whenever the DuckDB memory held by all
+    datasets exceeds ``memory_budget`` bytes, the least recently used ones
+    are released: in-memory databases are copied to ``spill_dir`` and
+    re-opened from disk when one is configured, anything else is closed and
+    dropped from the registry. Server-side ``cursors`` opened for a dataset
+    are closed with it.
+    """
+
+    def __init__(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        spill_dir: Optional[Path] = None,
+        cursors: Optional[CursorRegistry] = None,
+    ) -> None:
+        self.memory_budget = memory_budget
+        self.cursors = cursors
+        self.spill_dir = Path(spill_dir) if spill_dir is not None else None
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._datasets: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._datasets)
+
+    def __contains__(self, dataset_id: object) -> bool:
+        return dataset_id in self._datasets
+
+    def add(self, dataset: Dataset) -> List[str]:
+        """Register ``dataset`` and return the ids of datasets released to fit it."""
+
+        dataset.memory_bytes = dataset.context.memory_usage()
+        with self._lock:
+            previous = self._datasets.pop(dataset.id, None)
+            self._datasets[dataset.id] = dataset
+        if previous is not None and previous is not dataset:
+            self._close(previous)
+        return self.enforce_budget(keep=dataset.id)
+
+    def get(self, dataset_id: str) -> Dataset:
+        """Return the dataset and mark it as recently used.
+
+        Raises ``KeyError`` for unknown or closed datasets.
+        """
+
+        with self._lock:
+            dataset = self._datasets[dataset_id]
+            self._datasets.move_to_end(dataset_id)
+        dataset.last_used = time.time()
+        return dataset
+
+    def datasets(self) -> List[Dataset]:
+        """Return the registered datasets, least recently used first."""
+
+        with self._lock:
+            return list(self._datasets.values())
+
+    def remove(self, dataset_id: str) -> bool:
+        with self._lock:
+            dataset = self._datasets.pop(dataset_id, None)
+        if dataset is None:
+            return False
+        self._close(dataset)
+        return True
+
+    def memory_usage(self) -> int:
+        """Refresh and return the DuckDB memory held by all datasets."""
+
+        total = 0
+        for dataset in self.datasets():
+            dataset.memory_bytes = dataset.context.memory_usage()
+            total += dataset.memory_bytes
+        return total
+
+    def enforce_budget(self, keep: Optional[str] = None) -> List[str]:
+        """Release least recently used datasets until memory fits the budget."""
+
+        total = self.memory_usage()
+        released: List[str] = []
+        for dataset in self.datasets():
+            if total <= self.memory_budget:
+                break
+            # Datasets backed by files or attached databases hold no
+            # releasable memory of their own.
+            if dataset.id == keep or dataset.memory_bytes == 0:
+                continue
+            freed = dataset.memory_bytes
+            if self.spill_dir is not None and self._can_spill(dataset):
+                self._spill(dataset)
+            else:
+                self.remove(dataset.id)
+            total -= freed
+            released.append(dataset.id)
+        return released
+
+    def close_all(self) -> None:
+        with self._lock:
+            datasets = list(self._datasets.values())
+            self._datasets.clear()
+        for dataset in datasets:
+            self._close(dataset)
+
+    def _spill_path(self, dataset: Dataset) -> Path:
+        assert self.spill_dir is not None
+        return self.spill_dir / f"{dataset.id}.duckdb"
+
+    @staticmethod
+    def _can_spill(dataset: Dataset) -> bool:
+        if dataset.spilled:
+            return False
+        # Attached SQLite schemas are not part of the in-memory catalog and
+        # would be lost by copying it.
+        if any(table.schema != "main" for table in dataset.context.tables):
+            return False
+        cursor = dataset.context.cursor()
+        try:
+            row = cursor.execute(
+                "SELECT path FROM duckdb_databases() WHERE database_name = current_database()"
+            ).fetchone()
+        finally:
+            cursor.close()
+        return row is not None and row[0] is None
+
+    def _spill(self, dataset: Dataset) -> None:
+        path = self._spill_path(dataset)
+        path.unlink(missing_ok=True)
+        context = dataset.context
+        cursor = context.cursor()
+        try:
+            source = cursor.execute("SELECT current_database()").fetchone()[0]
+            cursor.execute(f"ATTACH {_quote_literal(path.as_posix())} AS {_SPILL_ALIAS}")
+            cursor.execute(f"COPY FROM DATABASE {_quote_identifier(source)} TO {_SPILL_ALIAS}")
+            cursor.execute(f"DETACH {_SPILL_ALIAS}")
+        finally:
+            cursor.close()
+        # In-flight cursors keep the in-memory database alive until they finish;
+        # new queries read the spilled copy. The data is unchanged, so cached
+        # results keyed by ``data_key`` stay valid.
+        context.connection = duckdb.connect(
+            str(path), read_only=True, config=context.settings.to_config()
+        )
+        dataset.spilled = True
+        dataset.memory_bytes = context.memory_usage()
+
+    def _close(self, dataset: Dataset) -> None:
+        if self.cursors is not None:
+            self.cursors.close_dataset(dataset.id)
+        context = dataset.context
+        if context.result_cache is not None:
+            context.result_cache.invalidate(context.data_key)
+        context.close()
+        if dataset.spilled and self.spill_dir is not None:
+            self._spill_path(dataset).unlink(missing_ok=True)
+        if dataset.source_dir is not None:
+            shutil.rmtree(dataset.source_dir, ignore_errors=True)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import dataclasses
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Tuple
+
+_TABLES_QUERY = (
+    "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+)
+
+
+@dataclass(frozen=True)
+class SQLiteChanges:
+    """Tables of a SQLite file that changed since the previous check.
+
+    ``altered`` tables have a new definition. ``modified`` tables kept
+    theirs but may hold different rows: commits cannot be attributed to
+    tables without scanning them, so after any commit every table that was
+    not added or altered counts as modified.
+    """
+
+    added: FrozenSet[str] = frozenset()
+    removed: FrozenSet[str] = frozenset()
+    altered: FrozenSet[str] = frozenset()
+    modified: FrozenSet[str] = frozenset()
+
+    @property
+    def schema_changed(self) -> bool:
+        return bool(self.added or self.removed or self.altered)
+
+    @property
+    def schema_tables(self) -> FrozenSet[str]:
+        """Tables whose definition changed, which generated SQL may depend on."""
+        return self.added | self.removed | self.altered
+
+    @property
+    def tables(self) -> FrozenSet[str]:
+        """Every table whose description or sample rows are out of date."""
+        return self.schema_tables | self.modified
+
+    def __bool__(self) -> bool:
+        return bool(self.tables)
+
+    def to_dict(self) -> dict:
+        return {
+            "added": sorted(self.added),
+            "removed": sorted(self.removed),
+            "altered": sorted(self.altered),
+            "modified": sorted(self.modified),
+        }
+
+
+@dataclass(frozen=True)
+class _State:
+    stat: Tuple[int, int, int]
+    data_version: int
+    schema_version: int
+    definitions: Dict[str, Optional[str]]
+
+
+class SQLiteWatcher:
+    """Detects which tables of a SQLite file changed.
+
+    Only cheap signals are read: the file's inode, size and mtime, and
+    ``PRAGMA data_version`` and ``schema_version`` on a read-only connection
+    held open for the purpose; ``data_version`` also catches commits that
+    only touched the WAL. Table definitions are re-read from
+    ``sqlite_master`` when the schema version moves. Checks closer together
+    than ``min_interval`` seconds report nothing unless forced.
+    """
+
+    def __init__(self, path: str | Path, min_interval: float = 1.0) -> None:
+        self.path = Path(path)
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._connection = self._connect()
+        self._state = self._read_state()
+        self._checked = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(
+            f"file:{self.path.resolve().as_posix()}?mode=ro", uri=True, check_same_thread=False
+        )
+
+    def _stat(self) -> Tuple[int, int, int]:
+        stat = self.path.stat()
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _pragma(self, name: str) -> int:
+        return self._connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+    def _read_state(self, previous: Optional[_State] = None) -> _State:
+        schema_version = self._pragma("schema_version")
+        if previous is not None and previous.schema_version == schema_version:
+            definitions = previous.definitions
+        else:
+            definitions = dict(self._connection.execute(_TABLES_QUERY).fetchall())
+        return _State(
+            stat=self._stat(),
+            data_version=self._pragma("data_version"),
+            schema_version=schema_version,
+            definitions=definitions,
+        )
+
+    def check(self, force: bool = False) -> SQLiteChanges:
+        """Return the changes since the last check (or since construction)."""
+
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._checked < self.min_interval:
+                return SQLiteChanges()
+            self._checked = now
+            previous = self._state
+            stat = self._stat()
+            replaced = stat[0] != previous.stat[0]
+            if replaced:
+                # A new file at the same path; the open connection still
+                # reads the old one.
+                self._connection.close()
+                self._connection = self._connect()
+                current = self._read_state()
+            elif self._pragma("data_version") == previous.data_version:
+                # Nothing was committed; a new mtime alone (e.g. from a WAL
+                # checkpoint) does not change the contents.
+                self._state = dataclasses.replace(previous, stat=stat)
+                return SQLiteChanges()
+            else:
+                current = self._read_state(previous)
+            self._state = current
+
+        old, new = previous.definitions, current.definitions
+        added = frozenset(new.keys() - old.keys())
+        removed = frozenset(old.keys() - new.keys())
+        kept = old.keys() & new.keys()
+        altered = frozenset(table for table in kept if old[table] != new[table])
+        return SQLiteChanges(
+            added=added, removed=removed, altered=altered, modified=frozenset(kept) - altered
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import datetime
+import decimal
+import io
+import json
+import math
+import uuid
+from typing import Callable, Iterator, List, TypeVar
+
+from .database import DatabaseContext
+from .execution import limit_query, run_with_timeout
+from .parsing import parse_query
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+DEFAULT_BATCH_SIZE = 10_000
+
+T = TypeVar("T")
+
+
+def _json_default(value: object) -> object:
+    if isinstance(value, (datetime.date, datetime.time, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return str(value)
+
+
+def _clean(value: object) -> object:
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    return value
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back whatever was written since last drained."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ResultStream:
+    """A query result read incrementally from its own DuckDB cursor.
+
+    The query is executed on construction so errors surface before any
+    response is started; rows are then pulled ``batch_size`` at a time,
+    keeping memory flat regardless of the result size. The context's query
+    lock is held while executing and while producing each batch, not while
+    the client reads them. ``row_limit`` is the context's
+    ``max_streamed_rows`` when one capped the query, and ``None`` otherwise.
+    Re-attaching the context's SQLite file closes the stream, and reading
+    on then raises ``RuntimeError``.
+    """
+
+    def __init__(
+        self, context: DatabaseContext, sql: str, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> None:
+        self.batch_size = batch_size
+        modifies = parse_query(sql).modifies_data
+        self.row_limit = context.limits.max_streamed_rows
+        if self.row_limit is not None:
+            sql = limit_query(sql, self.row_limit)
+        self._context = context
+        self._lock = context.query_lock
+        self._closed = False
+        self._cursor = context.cursor()
+        try:
+            with self._lock.shared():
+                self._result = run_with_timeout(
+                    self._cursor, lambda: self._cursor.execute(sql), context.limits.timeout
+                )
+        except Exception:
+            self._cursor.close()
+            raise
+        finally:
+            if modifies:
+                context.bump_data_version()
+        description = self._result.description or []
+        self.columns = [column[0] for column in description]
+        context.hold_result(self)
+
+    def _fetch(self, func: Callable[[], T]) -> T:
+        with self._lock.shared():
+            if self._closed:
+                raise RuntimeError("The result was closed before it was read to the end.")
+            return func()
+
+    def ndjson(self) -> Iterator[bytes]:
+        """Yield the rows as newline-delimited JSON, one chunk per batch."""
+
+        try:
+            if not self.columns:
+                return
+            while True:
+                rows = self._fetch(lambda: self._result.fetchmany(self.batch_size))
+                if not rows:
+                    break
+                lines = [
+                    json.dumps(
+                        {column: _clean(value) for column, value in zip(self.columns, row)},
+                        default=_json_default,
+                    )
+                    for row in rows
+                ]
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+        finally:
+            self.close()
+
+    def arrow_ipc(self) -> Iterator[bytes]:
+        """Yield the result as an Arrow IPC stream, one chunk per record batch."""
+
+        try:
+            import pyarrow as pa
+        except ImportError as exc:  # pragma: no cover - depends on optional dep
+            self.close()
+            raise ImportError(
+                "Arrow streaming requires the 'pyarrow' package. "
+                "Install it with `pip install text2sql-agent[arrow]`."
+            ) from exc
+
+        try:
+            if hasattr(self._result, "to_arrow_reader"):
+                reader = self._fetch(lambda: self._result.to_arrow_reader(self.batch_size))
+            else:  # pragma: no cover - older DuckDB releases
+                reader = self._fetch(lambda: self._result.fetch_record_batch(self.batch_size))
+            batches = iter(reader)
+            sink = _ChunkSink()
+            with pa.ipc.new_stream(sink, reader.schema) as writer:
+                while True:
+                    batch = self._fetch(lambda: next(batches, None))
+                    if batch is None:
+                        break
+                    writer.write_batch(batch)
+                    yield sink.drain()
+            yield sink.drain()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._closed = True
+        self._context.release_result(self)
+        self._cursor.close()
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import ContextManager, Dict, Iterator, List, Optional
+
+# Stages of the agent pipeline, in the order a request passes through them.
+STAGES = (
+    "cache_lookup",
+    "examples",
+    "prompt",
+    "generation",
+    "validation",
+    "execution",
+    "answer",
+)
+
+
+@dataclass(frozen=True)
+class Span:
+    """One timed stage of a request, relative to the start of its trace."""
+
+    name: str
+    start: float
+    duration: float
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "start": self.start, "duration": self.duration}
+
+
+class Trace:
+    """Collects the spans of one agent request.
+
+    Spans may be recorded from several threads at once, as happens when
+    candidates are executed in parallel; their per-stage totals can then
+    exceed the wall-clock time of the request.
+    """
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as a span called ``name``."""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append(Span(name, start - self.started, end - start))
+
+    def finish(self) -> None:
+        """Record the total duration; later calls keep the first value."""
+
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+
+    def stage_seconds(self) -> Dict[str, float]:
+        """Total seconds spent in each stage that ran."""
+
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return totals
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {
+            "total_seconds": self.duration,
+            "stages": self.stage_seconds(),
+            "spans": spans,
+        }
+
+
+class _NullTrace:
+    """Stands in for a :class:`Trace` when tracing is off; records nothing."""
+
+    enabled = False
+    duration = None
+    spans: List[Span] = []
+    _span = contextlib.nullcontext()
+
+    def span(self, name: str) -> ContextManager[None]:
+        return self._span
+
+    def finish(self) -> None:
+        pass
+
+    def stage_seconds(self) -> Dict[str, float]:
+        return {}
+
+
+NULL_TRACE = _NullTrace()
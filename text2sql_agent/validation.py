@@ -1,21 +1,252 @@
 from __future__ import annotations
 
-from typing import Tuple
+import difflib
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
 
-import sqlglot
+import duckdb
+from sqlglot import exp
+from sqlglot.errors import OptimizeError
+from sqlglot.optimizer.qualify import qualify
 
+from .execution import DEFAULT_MAX_CARTESIAN_ROWS
+from .parsing import DIALECT, ParsedQuery, parse_query
+from .schema import TableSchema
 
-def validate_sql(query: str) -> Tuple[bool, str | None]:
-    """Validate SQL syntax using sqlglot."""
+_SYSTEM_SCHEMAS = {"information_schema", "pg_catalog"}
+_UNRESOLVED_COLUMN_RES = (
+    re.compile(r"Column '(?P<name>[^']+)' could not be resolved"),
+    re.compile(r"Unknown column: (?P<name>\S+)"),
+)
 
-    stripped = query.strip()
-    if not stripped:
-        return False, "The generated SQL query is empty."
+
+@dataclass(frozen=True)
+class SchemaIssue:
+    """A reference in a query that does not match the extracted schema.
+
+    ``kind`` is ``"table"``, ``"column"`` or ``"ambiguous"``.
+    ``suggestions`` lists close matches from the schema; for a column,
+    ``elsewhere`` names tables the query does not use that have it.
+    """
+
+    kind: str
+    name: str
+    suggestions: Tuple[str, ...] = ()
+    elsewhere: Tuple[str, ...] = ()
+
+    @property
+    def message(self) -> str:
+        if self.kind == "ambiguous":
+            return (
+                f"Column '{self.name}' is ambiguous; qualify it with one of: "
+                f"{', '.join(self.suggestions)}."
+            )
+        message = f"Unknown {self.kind} '{self.name}'."
+        if self.suggestions:
+            message += f" Did you mean: {', '.join(self.suggestions)}?"
+        if self.elsewhere:
+            message += (
+                f" It exists in {', '.join(self.elsewhere)}, which the query does not use."
+            )
+        return message
+
+
+def _split_name(qualified_name: str) -> Tuple[str, str]:
+    db, _, name = qualified_name.rpartition(".")
+    return db, name
+
+
+def _close_matches(name: str, candidates: Sequence[str]) -> Tuple[str, ...]:
+    by_lower = {candidate.lower(): candidate for candidate in candidates}
+    matches = difflib.get_close_matches(name.lower(), list(by_lower), n=3, cutoff=0.6)
+    return tuple(by_lower[match] for match in matches)
+
+
+def _resolve_tables(
+    parsed: ParsedQuery, schema: Mapping[str, TableSchema]
+) -> Tuple[List[str], List[SchemaIssue], bool]:
+    """Match the query's tables to schema keys.
+
+    Returns the matched keys, issues for unknown tables and whether every
+    table resolved to the ``main`` schema or was qualified as written, which
+    is what column qualification needs.
+    """
+
+    keys = {name.lower(): name for name in schema}
+    ctes = {cte.alias_or_name.lower() for cte in parsed.expression.find_all(exp.CTE)}
+    matched: List[str] = []
+    issues: List[SchemaIssue] = []
+    qualifiable = True
+    for table in parsed.expression.find_all(exp.Table):
+        name = table.name.lower()
+        db = table.db.lower()
+        if not name or (name in ctes and not db) or db in _SYSTEM_SCHEMAS:
+            continue
+        if db:
+            key = keys.get(f"{db}.{name}") or keys.get(f"{table.catalog.lower()}.{name}")
+        else:
+            key = keys.get(f"main.{name}")
+            if key is None:
+                # Tables of attached databases may be referenced unqualified.
+                candidates = [key for lower, key in keys.items() if _split_name(lower)[1] == name]
+                key = candidates[0] if len(candidates) == 1 else None
+                qualifiable = False
+        if key is None:
+            issues.append(
+                SchemaIssue(
+                    kind="table",
+                    name=".".join(part for part in (table.db, table.name) if part),
+                    suggestions=_close_matches(
+                        table.name, sorted({_split_name(key)[1] for key in schema})
+                    ),
+                )
+            )
+        elif key not in matched:
+            matched.append(key)
+    return matched, issues, qualifiable
+
+
+def _schema_mapping(schema: Mapping[str, TableSchema]) -> Dict[str, Dict[str, Dict[str, str]]]:
+    mapping: Dict[str, Dict[str, Dict[str, str]]] = {}
+    for qualified_name, table in schema.items():
+        db, name = _split_name(qualified_name)
+        mapping.setdefault(db or "main", {})[name] = {
+            column: table.column_types.get(column) or "VARCHAR" for column in table.columns
+        }
+    return mapping
+
+
+def _column_issue(
+    column: str, tables: Sequence[str], schema: Mapping[str, TableSchema]
+) -> SchemaIssue:
+    owners = [
+        name
+        for name in tables
+        if column.lower() in {candidate.lower() for candidate in schema[name].columns}
+    ]
+    if len(owners) > 1:
+        return SchemaIssue(
+            kind="ambiguous", name=column, suggestions=tuple(_split_name(o)[1] for o in owners)
+        )
+    candidates = [candidate for name in tables for candidate in schema[name].columns]
+    elsewhere = tuple(
+        _split_name(name)[1]
+        for name, table in schema.items()
+        if name not in tables
+        and column.lower() in {candidate.lower() for candidate in table.columns}
+    )
+    return SchemaIssue(
+        kind="column",
+        name=column,
+        suggestions=_close_matches(column, candidates),
+        elsewhere=elsewhere,
+    )
+
+
+def check_schema(
+    query: Union[str, ParsedQuery], schema: Mapping[str, TableSchema]
+) -> List[SchemaIssue]:
+    """Resolve the tables and columns of ``query`` against ``schema``.
+
+    Columns are resolved with sqlglot's ``qualify`` optimizer, so aliases,
+    CTEs, subqueries and ``USING`` joins are understood. Constructs sqlglot
+    cannot qualify are not reported; DuckDB remains the final judge.
+    """
+
+    parsed = query if isinstance(query, ParsedQuery) else parse_query(query)
+    if not parsed.is_query:
+        return []
+    tables, issues, qualifiable = _resolve_tables(parsed, schema)
+    if issues or not qualifiable:
+        return issues
+    try:
+        qualify(
+            parsed.expression.copy(),
+            schema=_schema_mapping(schema),
+            db="main",
+            dialect=DIALECT,
+            validate_qualify_columns=True,
+        )
+    except OptimizeError as exc:
+        for pattern in _UNRESOLVED_COLUMN_RES:
+            match = pattern.search(str(exc))
+            if match:
+                return [_column_issue(match.group("name").strip('"'), tables, schema)]
+    except Exception:
+        pass
+    return []
+
+
+def _plan_estimate(node: dict, cartesian: List[int]) -> int:
+    """Return the estimated rows ``node`` produces, recording cross products."""
+
+    children = [_plan_estimate(child, cartesian) for child in node.get("children", [])]
+    estimate = node.get("extra_info", {}).get("Estimated Cardinality")
+    if node.get("name") == "CROSS_PRODUCT":
+        rows = 1
+        for child in children:
+            rows *= child
+        cartesian.append(rows)
+        return rows
+    if estimate is not None:
+        return int(estimate)
+    if node.get("name") == "UNGROUPED_AGGREGATE":
+        return 1
+    return max(children, default=1)
+
+
+def check_plan(
+    connection: duckdb.DuckDBPyConnection,
+    query: str,
+    max_cartesian_rows: int = DEFAULT_MAX_CARTESIAN_ROWS,
+) -> Optional[str]:
+    """Plan ``query`` with ``EXPLAIN`` and reject unbounded cartesian joins.
+
+    Returns an error message, or ``None`` when the plan looks reasonable.
+    Binder errors raised while planning are returned as messages too, so
+    they surface without running the query.
+    """
 
     try:
-        parsed = sqlglot.parse_one(stripped)
-        if not isinstance(parsed, sqlglot.exp.Select):
-            return False, "Only SELECT statements are allowed for security reasons."
-        return True, None
-    except Exception as exc:
-        return False, str(exc)
+        rows = connection.execute(f"EXPLAIN (FORMAT json) {query}").fetchall()
+    except duckdb.Error as exc:
+        return str(exc)
+    cartesian: List[int] = []
+    for _, plan in rows:
+        for node in json.loads(plan):
+            _plan_estimate(node, cartesian)
+    worst = max(cartesian, default=0)
+    if worst > max_cartesian_rows:
+        return (
+            f"The query joins tables without a join condition (a cartesian product of "
+            f"about {worst:,} rows). Add ON/USING conditions or WHERE filters that "
+            "relate the tables."
+        )
+    return None
+
+
+def validate_sql(
+    query: Union[str, ParsedQuery],
+    schema: Optional[Mapping[str, TableSchema]] = None,
+) -> Tuple[bool, str | None]:
+    """Validate SQL syntax using sqlglot's DuckDB dialect.
+
+    ``query`` may be a raw string or a :class:`ParsedQuery` that was already
+    parsed for this candidate. With a ``schema``, table and column references
+    are also checked and unknown names come back with suggestions.
+    """
+
+    parsed = query if isinstance(query, ParsedQuery) else parse_query(query.strip())
+    if not parsed.sql.strip():
+        return False, "The generated SQL query is empty."
+    if parsed.error is not None:
+        return False, parsed.error
+    if not parsed.is_query:
+        return False, "Only SELECT statements are allowed for security reasons."
+    if schema is not None:
+        issues = check_schema(parsed, schema)
+        if issues:
+            return False, " ".join(issue.message for issue in issues)
+    return True, None